@@ -0,0 +1,44 @@
+-- Server-side aggregates for the admin dashboard (GET /api/admin/stats, /api/admin/users)
+-- Run this SQL command in your Supabase SQL editor or database
+
+-- Dashboard totals, computed in the database instead of shipping every row to the API
+CREATE OR REPLACE FUNCTION admin_document_stats(since timestamptz)
+RETURNS json
+LANGUAGE sql STABLE
+AS $$
+  SELECT json_build_object(
+    'totalUsers', (SELECT COUNT(DISTINCT user_id) FROM documents),
+    'totalDocuments', (SELECT COUNT(*) FROM documents),
+    'totalSize', (SELECT COALESCE(SUM(size_bytes), 0) FROM documents),
+    'statusCounts', COALESCE(
+      (SELECT json_object_agg(status, n)
+         FROM (SELECT COALESCE(status, 'unknown') AS status, COUNT(*) AS n FROM documents GROUP BY 1) s),
+      '{}'::json
+    ),
+    'documentsLastWeek', (SELECT COUNT(*) FROM documents WHERE created_at >= since),
+    'newUsersLastWeek', (SELECT COUNT(DISTINCT user_id) FROM documents WHERE created_at >= since)
+  );
+$$;
+
+-- Only the backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION admin_document_stats(timestamptz) FROM PUBLIC, anon, authenticated;
+
+-- One row per user that has documents, joined with their login activity
+CREATE OR REPLACE VIEW admin_user_summary AS
+SELECT
+  d.user_id,
+  COUNT(*) AS total_documents,
+  COALESCE(SUM(d.size_bytes), 0) AS total_size,
+  MAX(d.created_at) AS last_document_at,
+  a.email,
+  a.last_login,
+  a.login_count
+FROM documents d
+LEFT JOIN user_activity a ON a.user_id = d.user_id
+GROUP BY d.user_id, a.email, a.last_login, a.login_count;
+
+REVOKE ALL ON admin_user_summary FROM anon, authenticated;
+
+-- Lets the aggregates above run as index-only scans over narrow columns
+CREATE INDEX IF NOT EXISTS idx_documents_created_user ON documents (created_at, user_id) INCLUDE (size_bytes, status);
+CREATE INDEX IF NOT EXISTS idx_user_activity_user ON user_activity (user_id);
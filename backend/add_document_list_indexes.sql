@@ -0,0 +1,12 @@
+-- Indexes for the paginated document list (GET /api/documents/)
+-- Run this SQL command in your Supabase SQL editor or database
+
+-- Keyset pagination: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_documents_user_created ON documents (user_id, created_at DESC, id DESC);
+
+-- Status filter within a user's documents
+CREATE INDEX IF NOT EXISTS idx_documents_user_status ON documents (user_id, status, created_at DESC);
+
+-- riskLevel / documentType filters are sent as JSON containment
+-- (document_metadata @> '{"riskLevel": "High"}'), which is served by the
+-- jsonb GIN index idx_documents_metadata from add_document_metadata_column.sql.
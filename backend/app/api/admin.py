@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from app.api.core.firebase_admin import get_current_user_from_auth_header
-from app.api.core.supabase import supabase
+from app.api.core.doc_versions import invalidate_document_version
+from app.api.core.storage_backends import get_document_store
+from app.api.core.admin_stats import admin_stats, get_admin_aggregates, invalidate_admin_aggregates, user_summaries
+from app.api.core.pagination import created_at_cursor, decode_created_at_cursor, decode_cursor, encode_cursor
+from app.api.documents import LIST_COLUMNS
+from app.api.ingest import remove_document_index
 from typing import List, Dict, Any
 from datetime import datetime
 import os
+import json
+
+MAX_USER_PAGE = 500
+MAX_DOCUMENT_PAGE = 500
 
 router = APIRouter()
 
@@ -22,148 +33,206 @@ def test_admin_endpoint():
     """Test endpoint to verify admin API is working"""
     return {"message": "Admin API is working", "timestamp": datetime.utcnow().isoformat()}
 
+def _user_record(summary: Dict[str, Any], documents: list | None = None) -> Dict[str, Any]:
+    user_id = summary["user_id"]
+    record = {
+        "uid": user_id,
+        "email": summary.get("email") or f"user-{user_id[:8]}@example.com",
+        "displayName": f"User {user_id[:8]}",
+        "lastSignInTime": summary.get("last_login") or summary.get("last_document_at"),
+        "loginCount": summary.get("login_count") or 0,
+        "totalDocuments": summary["total_documents"],
+        "totalSize": summary["total_size"],
+    }
+    if documents is not None:
+        record["documents"] = documents
+    return record
+
+async def _documents_by_user(user_ids: list[str], columns: str) -> Dict[str, list]:
+    documents_by_user: Dict[str, list] = {}
+    for doc in await get_document_store().list_for_users(user_ids, columns):
+        documents_by_user.setdefault(doc["user_id"], []).append(doc)
+    return documents_by_user
+
 @router.get("/users")
-def get_all_users(authorization: str | None = Header(None)):
-    """Get all users with their documents - Admin only"""
-    user = get_current_user_from_auth_header(authorization)
+async def get_all_users(
+    include_documents: bool = False,
+    limit: int | None = Query(None, ge=1, le=MAX_USER_PAGE),
+    cursor: str | None = None,
+    authorization: str | None = Header(None),
+):
+    """Get all users with their document totals - Admin only
+
+    Totals come from the admin_user_summary view (cached briefly). Per-user
+    document lists (list columns only, no text) are attached when
+    include_documents=true. Pass limit (and the returned next_cursor) to page
+    through users ordered by uid instead of loading them all.
+    """
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     
     if not is_admin_user(user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
     try:
-        # Get all documents from Supabase
-        res = supabase.table("documents").select("*").order("created_at", desc=True).execute()
-        # Defensive: check for error attribute, otherwise check for 'data'
-        documents = getattr(res, "data", None)
-        if documents is None:
-            print("Supabase error: No data returned")
-            raise HTTPException(status_code=500, detail="Supabase query failed: No data returned")
-        print(f"Found {len(documents)} documents")
-
-        # Group documents by user_id
-        user_documents_map = {}
-        for doc in documents:
-            user_id = doc["user_id"]
-            if user_id not in user_documents_map:
-                user_documents_map[user_id] = []
-            user_documents_map[user_id].append(doc)
-
-        # Try to get user activity data (optional - won't fail if table doesn't exist)
-        activity_map = {}
-        try:
-            activity_res = supabase.table("user_activity").select("*").execute()
-            if hasattr(activity_res, "data") and activity_res.data:
-                for activity in activity_res.data:
-                    activity_map[activity["user_id"]] = activity
-        except Exception as e:
-            print(f"Warning: Could not fetch user activity data: {e}")
-
-        # Create user objects with document data
-        users_with_docs = []
-        for user_id, user_docs in user_documents_map.items():
-            total_documents = len(user_docs)
-            total_size = sum(doc.get("size_bytes", 0) for doc in user_docs)
-
-            # Get user activity data (with fallbacks)
-            user_activity = activity_map.get(user_id, {})
-            last_login = user_activity.get("last_login", user_docs[0]["created_at"] if user_docs else datetime.utcnow().isoformat())
-            login_count = user_activity.get("login_count", 0)
-
-            users_with_docs.append({
-                "uid": user_id,
-                "email": user_activity.get("email", f"user-{user_id[:8]}@example.com"),
-                "displayName": f"User {user_id[:8]}",
-                "lastSignInTime": last_login,
-                "loginCount": login_count,
-                "documents": user_docs,
-                "totalDocuments": total_documents,
-                "totalSize": total_size,
-            })
-
-        return {"users": users_with_docs}
+        next_cursor = None
+        if limit is None:
+            summaries = await run_in_threadpool(user_summaries)
+        else:
+            after = decode_cursor(cursor, 1)[0] if cursor else None
+            summaries = await run_in_threadpool(get_admin_aggregates().user_summaries_page, after, limit + 1)
+            if len(summaries) > limit:
+                summaries = summaries[:limit]
+                next_cursor = encode_cursor([summaries[-1]["user_id"]])
+        print(f"Found {len(summaries)} users with documents")
+
+        documents_by_user = {}
+        if include_documents:
+            documents_by_user = await _documents_by_user([s["user_id"] for s in summaries], f"user_id,{LIST_COLUMNS}")
 
+        users_with_docs = [
+            _user_record(s, documents_by_user.get(s["user_id"], []) if include_documents else None)
+            for s in summaries
+        ]
+        response = {"users": users_with_docs}
+        if limit is not None:
+            response["next_cursor"] = next_cursor
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching users: {str(e)}")
 
+@router.get("/users/export")
+async def export_users(include_text: bool = False, authorization: str | None = Header(None)):
+    """Stream every user with their documents as NDJSON (one user per line) - Admin only
+
+    Users are read ADMIN_EXPORT_PAGE_SIZE at a time, so memory stays flat however
+    many users there are. With include_text=true each user's documents are
+    fetched in full (text included), one user at a time.
+    """
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+    
+    if not is_admin_user(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    page_size = int(os.getenv("ADMIN_EXPORT_PAGE_SIZE", "100"))
+    aggregates = get_admin_aggregates()
+
+    async def lines():
+        after = None
+        while True:
+            try:
+                summaries = await run_in_threadpool(aggregates.user_summaries_page, after, page_size)
+                if not include_text:
+                    documents_by_user = await _documents_by_user([s["user_id"] for s in summaries], f"user_id,{LIST_COLUMNS}")
+            except Exception as e:
+                print(f"User export failed: {e}")
+                yield json.dumps({"error": f"Export failed: {e}"}) + "\n"
+                return
+            for summary in summaries:
+                if include_text:
+                    documents = (await _documents_by_user([summary["user_id"]], "*")).get(summary["user_id"], [])
+                else:
+                    documents = documents_by_user.get(summary["user_id"], [])
+                yield json.dumps(_user_record(summary, documents), default=str) + "\n"
+            if len(summaries) < page_size:
+                return
+            after = summaries[-1]["user_id"]
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="users-{datetime.utcnow().date().isoformat()}.ndjson"'},
+    )
+
+@router.get("/documents")
+async def list_all_documents(
+    limit: int = Query(100, ge=1, le=MAX_DOCUMENT_PAGE),
+    cursor: str | None = None,
+    status: str | None = None,
+    user_id: str | None = None,
+    authorization: str | None = Header(None),
+):
+    """Page through all documents, newest first (list columns only) - Admin only"""
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+    
+    if not is_admin_user(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    after = decode_created_at_cursor(cursor) if cursor else None
+    try:
+        rows = await get_document_store().list_all(
+            f"user_id,{LIST_COLUMNS}", limit + 1, status=status, user_id=user_id, after=after,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching documents: {str(e)}")
+
+    documents = rows[:limit]
+    next_cursor = created_at_cursor(documents[-1]) if len(rows) > limit else None
+    return {"documents": documents, "next_cursor": next_cursor}
+
 @router.get("/stats")
 def get_admin_stats(authorization: str | None = Header(None)):
-    """Get admin dashboard statistics - Admin only"""
+    """Get admin dashboard statistics - Admin only
+
+    Computed by the database (admin_document_stats) and cached for
+    ADMIN_STATS_CACHE_TTL_SECONDS, so dashboard refreshes don't scan documents.
+    """
     user = get_current_user_from_auth_header(authorization)
     
     if not is_admin_user(user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
     try:
-        # Get all documents
-        res = supabase.table("documents").select("*").execute()
-        
-        documents = res.data or []
-        
-        # Calculate stats
-        total_documents = len(documents)
-        total_size = sum(doc.get("size_bytes", 0) for doc in documents)
-        unique_users = len(set(doc["user_id"] for doc in documents))
-        
-        # Status breakdown
-        status_counts = {}
-        for doc in documents:
-            status = doc.get("status", "unknown")
-            status_counts[status] = status_counts.get(status, 0) + 1
-        
-        # Recent activity (last 7 days)
-        from datetime import datetime, timedelta
-        week_ago = (datetime.utcnow() - timedelta(days=7)).isoformat()
-        recent_docs = [doc for doc in documents if doc["created_at"] >= week_ago]
-        
-        return {
-            "totalUsers": unique_users,
-            "totalDocuments": total_documents,
-            "totalSize": total_size,
-            "statusCounts": status_counts,
-            "recentActivity": {
-                "documentsLastWeek": len(recent_docs),
-                "newUsersLastWeek": len(set(doc["user_id"] for doc in recent_docs))
-            }
-        }
-        
+        return admin_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stats: {str(e)}")
 
 @router.get("/user/{user_id}/documents")
-def get_user_documents(user_id: str, authorization: str | None = Header(None)):
+async def get_user_documents(user_id: str, authorization: str | None = Header(None)):
     """Get all documents for a specific user - Admin only"""
-    user = get_current_user_from_auth_header(authorization)
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     
     if not is_admin_user(user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
     try:
-        res = supabase.table("documents").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
-        
-        return {"documents": res.data or []}
+        # List columns only: the full text of every document is not needed to render the list
+        return {"documents": await get_document_store().list_for_user(user_id, f"user_id,{LIST_COLUMNS}")}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching user documents: {str(e)}")
 
 @router.delete("/user/{user_id}/document/{doc_id}")
-def delete_user_document(user_id: str, doc_id: str, authorization: str | None = Header(None)):
+async def delete_user_document(user_id: str, doc_id: str, authorization: str | None = Header(None)):
     """Delete a specific document - Admin only"""
-    user = get_current_user_from_auth_header(authorization)
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     
     if not is_admin_user(user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
     try:
         # First verify the document belongs to the user
-        res = supabase.table("documents").select("*").eq("id", doc_id).eq("user_id", user_id).execute()
+        store = get_document_store()
+        doc = await store.get(doc_id, "id,user_id")
         
-        if not res.data:
+        if doc is None or doc["user_id"] != user_id:
             raise HTTPException(status_code=404, detail="Document not found")
         
         # Delete the document
-        delete_res = supabase.table("documents").delete().eq("id", doc_id).execute()
+        await store.delete(doc_id)
+        invalidate_document_version(doc_id)
+        invalidate_admin_aggregates()
+        try:
+            await remove_document_index(doc_id, user_id)
+        except Exception as e:
+            # The document is gone either way; a stale index entry is filtered out at search time
+            print(f"Failed to remove document {doc_id} from search indexes: {e}")
         
         return {"message": "Document deleted successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
@@ -1,6 +1,5 @@
-from app.api.core.firebase_admin import firebase_admin
+from app.api.core.firebase_admin import firebase_admin, verify_id_token_cached
 from fastapi import Depends, HTTPException, Header
-from firebase_admin import auth as firebase_auth
 
 def get_current_user(authorization: str = Header(None)):
     print("Authorization header received:", authorization)
@@ -8,7 +7,7 @@ def get_current_user(authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Missing Authorization header")
     token = authorization.split(" ").pop()
     try:
-        decoded = firebase_auth.verify_id_token(token)
+        decoded = verify_id_token_cached(token)
         # decoded contains uid, email, name, firebase claims
         return decoded
     except Exception as e:
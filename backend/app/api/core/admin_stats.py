@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from app.api.core.cache import TieredCache
+from app.api.core.storage_backends import get_activity_store, get_document_store, local_database_path, storage_backend
+
+# Summaries requested per page when reading them all; at most PostgREST's max-rows
+SUMMARY_PAGE_ROWS = int(os.getenv("ADMIN_SUMMARY_PAGE_ROWS", "1000"))
+
+
+class SupabaseAdminAggregates:
+    """Admin aggregates computed by Postgres (see add_admin_aggregates.sql)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def document_stats(self, since: str) -> dict:
+        res = self.client.rpc("admin_document_stats", {"since": since}).execute()
+        return res.data
+
+    def user_summaries(self) -> list[dict]:
+        """Every summary, most recently active first.
+
+        Read in keyset pages by user_id: one unbounded select is silently capped
+        at PostgREST's max-rows (1000 by default) and would drop users.
+        """
+        summaries, after = [], None
+        while True:
+            page = self.user_summaries_page(after, SUMMARY_PAGE_ROWS)
+            # Only an empty page ends the scan; a short one may just be the server's cap
+            if not page:
+                break
+            summaries += page
+            after = page[-1]["user_id"]
+        summaries.sort(key=lambda s: s.get("last_document_at") or "", reverse=True)
+        return summaries
+
+    def user_summaries_page(self, after: Optional[str], limit: int) -> list[dict]:
+        query = self.client.table("admin_user_summary").select("*")
+        if after is not None:
+            query = query.gt("user_id", after)
+        res = query.order("user_id").limit(limit).execute()
+        return res.data or []
+
+
+class SQLiteAdminAggregates:
+    """Same aggregates over local `documents` / `user_activity` tables.
+
+    Stand-in for running the admin endpoints offline or against seeded data;
+    the tables only need the columns the queries touch.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def document_stats(self, since: str) -> dict:
+        with self._lock:
+            total, size, users = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), COUNT(DISTINCT user_id) FROM documents"
+            ).fetchone()
+            status_counts = dict(self._conn.execute(
+                "SELECT COALESCE(status, 'unknown'), COUNT(*) FROM documents GROUP BY 1"
+            ).fetchall())
+            recent, recent_users = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT user_id) FROM documents WHERE created_at >= ?", (since,)
+            ).fetchone()
+        return {
+            "totalUsers": users,
+            "totalDocuments": total,
+            "totalSize": size,
+            "statusCounts": status_counts,
+            "documentsLastWeek": recent,
+            "newUsersLastWeek": recent_users,
+        }
+
+    _SUMMARY_SELECT = (
+        "SELECT d.user_id, COUNT(*), COALESCE(SUM(d.size_bytes), 0), MAX(d.created_at), "
+        "a.email, a.last_login, a.login_count "
+        "FROM documents d LEFT JOIN user_activity a ON a.user_id = d.user_id "
+    )
+    _SUMMARY_COLUMNS = ["user_id", "total_documents", "total_size", "last_document_at", "email", "last_login", "login_count"]
+
+    def _summaries(self, sql: str, params: tuple = ()) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(self._SUMMARY_SELECT + sql, params).fetchall()
+        return [dict(zip(self._SUMMARY_COLUMNS, row)) for row in rows]
+
+    def user_summaries(self) -> list[dict]:
+        return self._summaries("GROUP BY d.user_id ORDER BY MAX(d.created_at) DESC")
+
+    def user_summaries_page(self, after: Optional[str], limit: int) -> list[dict]:
+        return self._summaries(
+            "WHERE d.user_id > ? GROUP BY d.user_id ORDER BY d.user_id LIMIT ?", (after or "", limit)
+        )
+
+
+_aggregates = None
+_cache: Optional[TieredCache] = None
+
+
+def get_admin_aggregates():
+    """Aggregate source for admin endpoints (ADMIN_AGGREGATES_BACKEND=supabase|sqlite).
+
+    With STORAGE_BACKEND=local it defaults to sqlite over the local store's own database.
+    """
+    global _aggregates
+    if _aggregates is None:
+        local = storage_backend() == "local"
+        if os.getenv("ADMIN_AGGREGATES_BACKEND", "sqlite" if local else "supabase").lower() == "sqlite":
+            if local:
+                # Creates the documents / user_activity tables the queries join, if nothing has yet
+                get_document_store()
+                get_activity_store()
+            default_path = local_database_path() if local else "/tmp/legal-ai/admin.sqlite3"
+            _aggregates = SQLiteAdminAggregates(os.getenv("ADMIN_AGGREGATES_SQLITE_PATH", default_path))
+        else:
+            from app.api.core.supabase import supabase
+            _aggregates = SupabaseAdminAggregates(supabase)
+    return _aggregates
+
+
+def get_admin_cache() -> TieredCache:
+    """Short-TTL memory cache so dashboard auto-refreshes don't re-run the aggregates"""
+    global _cache
+    if _cache is None:
+        _cache = TieredCache(
+            "admin",
+            None,
+            max_memory_entries=64,
+            ttl_seconds=float(os.getenv("ADMIN_STATS_CACHE_TTL_SECONDS", "30")),
+        )
+    return _cache
+
+
+def cached(key: str, compute):
+    cache = get_admin_cache()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+def invalidate_admin_aggregates() -> None:
+    cache = get_admin_cache()
+    cache.delete("stats")
+    cache.delete("user_summaries")
+
+
+def admin_stats() -> dict:
+    """Dashboard totals in the shape GET /api/admin/stats returns"""
+    def compute():
+        since = (datetime.utcnow() - timedelta(days=7)).isoformat()
+        stats = get_admin_aggregates().document_stats(since)
+        return {
+            "totalUsers": stats["totalUsers"],
+            "totalDocuments": stats["totalDocuments"],
+            "totalSize": stats["totalSize"],
+            "statusCounts": stats["statusCounts"],
+            "recentActivity": {
+                "documentsLastWeek": stats["documentsLastWeek"],
+                "newUsersLastWeek": stats["newUsersLastWeek"],
+            },
+        }
+    return cached("stats", compute)
+
+
+def user_summaries() -> list[dict]:
+    return cached("user_summaries", lambda: get_admin_aggregates().user_summaries())
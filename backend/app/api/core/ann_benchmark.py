@@ -0,0 +1,73 @@
+"""Recall and latency of the HNSW index against exact (brute-force) search.
+
+    python -m app.api.core.ann_benchmark --vectors 20000 --dim 256 --queries 200
+
+Vectors are drawn around random cluster centres, which is closer to real
+chunk embeddings (documents on related topics) than uniform noise. Recall@k
+is the share of the exact top-k the index returns.
+"""
+import time
+import argparse
+
+import numpy as np
+
+from app.api.core.hnsw import HNSWIndex
+
+
+def clustered_unit_vectors(rng: np.random.Generator, n: int, dim: int, clusters: int, spread: float) -> np.ndarray:
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + spread * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _percentiles(seconds: list[float]) -> str:
+    ms = np.array(seconds) * 1000
+    return f"p50 {np.percentile(ms, 50):.2f} ms, p95 {np.percentile(ms, 95):.2f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = clustered_unit_vectors(rng, args.vectors + args.queries, args.dim, args.clusters, args.spread)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+
+    index = HNSWIndex(args.dim, m=args.m, ef_construction=args.ef_construction, seed=args.seed)
+    started = time.perf_counter()
+    for vector in vectors:
+        index.add(vector)
+    build = time.perf_counter() - started
+    print(f"Built HNSW over {args.vectors} x {args.dim} in {build:.1f}s ({args.vectors / build:.0f} inserts/s)")
+
+    exact, exact_times = [], []
+    for query in queries:
+        started = time.perf_counter()
+        scores = vectors @ query
+        top = np.argpartition(-scores, args.k - 1)[:args.k]
+        exact_times.append(time.perf_counter() - started)
+        exact.append(set(top.tolist()))
+    print(f"exact      recall@{args.k} 1.000  {_percentiles(exact_times)}")
+
+    for ef in args.ef:
+        found, times = 0, []
+        for query, truth in zip(queries, exact):
+            started = time.perf_counter()
+            hits = index.search(query, args.k, ef=ef)
+            times.append(time.perf_counter() - started)
+            found += len(truth & {node for _, node in hits})
+        print(f"hnsw ef={ef:<4} recall@{args.k} {found / (args.k * len(queries)):.3f}  {_percentiles(times)}")
+
+
+if __name__ == "__main__":
+    main()
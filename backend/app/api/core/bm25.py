@@ -0,0 +1,113 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+# Lowercased words and numbers; dotted numbers ("12.3") and possessives stay one token
+# so clause references and party names match exactly
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class InvertedIndex:
+    """Okapi BM25 over a fixed list of passages, stored as flat numpy arrays.
+
+    The postings of term t are `postings_doc[offsets[t]:offsets[t + 1]]` (passage
+    ids, ascending) with matching term frequencies in `postings_tf`. Per-passage
+    lengths give the BM25 length normalisation. Scoring a query is one
+    vectorized update per query term.
+    """
+
+    def __init__(self, vocab: dict[str, int], offsets: np.ndarray, postings_doc: np.ndarray,
+                 postings_tf: np.ndarray, doc_len: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings_doc = postings_doc
+        self.postings_tf = postings_tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, passages: list[str], k1: float = 1.2, b: float = 0.75) -> "InvertedIndex":
+        vocab: dict[str, int] = {}
+        term_ids, docs, tfs, doc_len = [], [], [], []
+        for doc, passage in enumerate(passages):
+            counts = Counter(tokenize(passage))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                docs.append(doc)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        # Stable sort keeps each term's passages in ascending order
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+        return cls(
+            vocab,
+            offsets,
+            np.asarray(docs, dtype=np.int32)[order],
+            np.asarray(tfs, dtype=np.int32)[order],
+            np.asarray(doc_len, dtype=np.int32),
+            k1,
+            b,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every passage for query (0 where no query term occurs)"""
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        if not len(self.doc_len):
+            return scores
+        n = len(self.doc_len)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / (self.avg_len or 1.0))
+        for term, repeats in Counter(tokenize(query)).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            df = end - start
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            # Each passage appears once per term's postings, so fancy-index += is safe
+            scores[docs] += repeats * idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def nbytes(self) -> int:
+        """Bytes held by the postings arrays (the vocabulary dict is extra)"""
+        return self.offsets.nbytes + self.postings_doc.nbytes + self.postings_tf.nbytes + self.doc_len.nbytes
+
+    def to_arrays(self) -> dict:
+        terms = sorted(self.vocab, key=self.vocab.get)
+        return {
+            "terms": np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            "offsets": self.offsets,
+            "postings_doc": self.postings_doc,
+            "postings_tf": self.postings_tf,
+            "doc_len": self.doc_len,
+            "params": np.array([self.k1, self.b]),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "InvertedIndex":
+        joined = arrays["terms"].tobytes().decode("utf-8")
+        terms = joined.split("\n") if joined else []
+        k1, b = (float(x) for x in arrays["params"])
+        return cls(
+            {term: i for i, term in enumerate(terms)},
+            arrays["offsets"],
+            arrays["postings_doc"],
+            arrays["postings_tf"],
+            arrays["doc_len"],
+            k1,
+            b,
+        )
@@ -0,0 +1,73 @@
+"""Build time, memory and query latency of the BM25 inverted index.
+
+    python -m app.api.core.bm25_benchmark --tokens 1000000
+
+The corpus is synthetic: words drawn from a Zipf distribution over a fixed
+vocabulary (like natural text, a few terms dominate), broken into lines and
+chunked exactly as ingest chunks extracted text.
+"""
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from app.api.core.bm25 import InvertedIndex, tokenize
+from app.api.core.chunking import split_spans
+
+
+def zipf_text(rng: np.random.Generator, tokens: int, vocabulary: int, exponent: float) -> tuple[str, list[str]]:
+    words = [f"w{i}" for i in range(vocabulary)]
+    ranks = np.minimum(rng.zipf(exponent, tokens), vocabulary) - 1
+    lines = []
+    for start in range(0, tokens, 12):
+        lines.append(" ".join(words[r] for r in ranks[start:start + 12]) + ".")
+    return "\n".join(lines), words
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1_000_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--exponent", type=float, default=1.1)
+    parser.add_argument("--chunk-chars", type=int, default=1500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    text, words = zipf_text(rng, args.tokens, args.vocabulary, args.exponent)
+    chunks = [text[start:end] for start, end in split_spans(text, args.chunk_chars)]
+
+    started = time.perf_counter()
+    index = InvertedIndex.build(chunks)
+    build = time.perf_counter() - started
+    # Separate run: tracing allocations slows the build several-fold
+    tracemalloc.start()
+    InvertedIndex.build(chunks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    counted = sum(len(tokenize(chunk)) for chunk in chunks)
+    per_million = 1_000_000 / counted
+    vocab_bytes = sys.getsizeof(index.vocab) + sum(sys.getsizeof(term) for term in index.vocab)
+    mb = 1024 * 1024
+    print(f"{counted} tokens in {len(chunks)} chunks, {len(index.vocab)} distinct terms, {len(index.postings_doc)} postings")
+    print(f"build {build:.2f}s ({build * per_million:.2f}s per 1M tokens), peak build memory {peak / mb:.1f} MB")
+    print(f"resident: postings arrays {index.nbytes() / mb:.2f} MB + vocabulary {vocab_bytes / mb:.2f} MB "
+          f"= {(index.nbytes() + vocab_bytes) * per_million / mb:.2f} MB per 1M tokens")
+
+    # Mix frequent and rare terms, as real questions do
+    times = []
+    for _ in range(args.queries):
+        query = " ".join(words[r] for r in rng.integers(0, 2000, 3))
+        started = time.perf_counter()
+        index.scores(query)
+        times.append(time.perf_counter() - started)
+    ms = np.array(times) * 1000
+    print(f"3-term query over all chunks: p50 {np.percentile(ms, 50):.2f} ms, p95 {np.percentile(ms, 95):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
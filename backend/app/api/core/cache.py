@@ -0,0 +1,155 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class TieredCache:
+    """Two-tier key/value cache: a bounded in-memory LRU in front of a SQLite file.
+
+    Values must be JSON-serializable. The memory tier is bounded by entry count,
+    the disk tier by total payload bytes (least recently used rows are evicted).
+    Pass path=None to run memory-only. With ttl_seconds set, entries older than
+    the TTL are treated as misses and dropped from both tiers.
+    """
+
+    def __init__(self, name: str, path: Optional[str], max_memory_entries: int = 128,
+                 max_disk_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (created_at, value)
+        self._memory: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "accessed_at REAL NOT NULL, created_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(cache)")]
+            if "created_at" not in columns:
+                # Cache files written before TTL support
+                self._conn.execute("ALTER TABLE cache ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+            self._conn.commit()
+        return self._conn
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: Any, created_at: float) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            expired = False
+            if key in self._memory:
+                created_at, value = self._memory[key]
+                if not self._is_expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+                expired = True
+
+            try:
+                conn = self._get_conn()
+                row = None
+                if conn is not None:
+                    row = conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._is_expired(row[1]):
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    conn.commit()
+                    expired = True
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                    conn.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            except Exception as e:
+                print(f"{self.name} cache read failed: {e}")
+
+            # One lookup counts once, even if both tiers held the stale entry
+            self.expired += expired
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            now = time.time()
+            self._remember(key, value, now)
+            try:
+                conn = self._get_conn()
+                if conn is None:
+                    return
+                payload = json.dumps(value)
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, size, accessed_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now),
+                )
+                self._evict(conn)
+                conn.commit()
+            except Exception as e:
+                print(f"{self.name} cache write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            try:
+                conn = self._get_conn()
+                if conn is not None:
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    conn.commit()
+            except Exception as e:
+                print(f"{self.name} cache delete failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self.ttl_seconds is not None:
+            conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = conn.execute("SELECT key, size FROM cache ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "memoryEntries": len(self._memory),
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -1,14 +1,34 @@
-def split_text(text: str, max_chars: int = 2000):
-    chunks, i = [], 0
+def split_spans(text: str, max_chars: int = 2000):
+    """Split text into (start, end) spans of at most max_chars, breaking on lines/sentences.
+
+    Spans index into the original text (leading/trailing whitespace trimmed),
+    so callers can cite exact character offsets.
+    """
+    spans, i = [], 0
     while i < len(text):
         j = min(i + max_chars, len(text))
-        # try to break on a newline/period
-        k = text.rfind("\n", i, j)
-        if k == -1:
-            k = text.rfind(". ", i, j)
-        if k == -1:
+        if j == len(text):
             k = j
-        chunks.append(text[i:k].strip())
+        else:
+            # try to break on a newline/period (searching past i so we always make progress)
+            k = text.rfind("\n", i + 1, j)
+            if k == -1:
+                k = text.rfind(". ", i + 1, j)
+                if k != -1:
+                    k += 1  # keep the period with its sentence
+            if k == -1:
+                k = j
+        start, end = i, k
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        # remove empties
+        if start < end:
+            spans.append((start, end))
         i = k
-    # remove empties
-    return [c for c in chunks if c]
+    return spans
+
+
+def split_text(text: str, max_chars: int = 2000):
+    return [text[start:end] for start, end in split_spans(text, max_chars)]
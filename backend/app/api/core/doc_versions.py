@@ -0,0 +1,54 @@
+import os
+import hashlib
+from typing import Optional
+from app.api.core.cache import TieredCache
+
+# Columns a document's version is derived from; enough to answer a conditional GET
+VERSION_COLUMNS = "id,user_id,status,processed_at"
+
+_versions: Optional[TieredCache] = None
+
+
+def get_version_cache() -> TieredCache:
+    """Memory-only doc_id -> {user_id, etag} cache for conditional document reads.
+
+    Entries are dropped whenever this process changes a document; the short TTL
+    bounds staleness from changes made by other instances.
+    """
+    global _versions
+    if _versions is None:
+        _versions = TieredCache(
+            "document_versions",
+            None,
+            max_memory_entries=int(os.getenv("DOC_VERSION_CACHE_ENTRIES", "4096")),
+            ttl_seconds=float(os.getenv("DOC_VERSION_CACHE_TTL_SECONDS", "30")),
+        )
+    return _versions
+
+
+def document_etag(row: dict) -> str:
+    """Weak ETag from the fields every content change goes through (status, processed_at)"""
+    version = f"{row['id']}|{row.get('status')}|{row.get('processed_at')}"
+    return f'W/"{hashlib.sha1(version.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def remember_version(row: dict) -> str:
+    etag = document_etag(row)
+    get_version_cache().set(row["id"], {"user_id": row["user_id"], "etag": etag})
+    return etag
+
+
+def invalidate_document_version(doc_id: str) -> None:
+    get_version_cache().delete(doc_id)
+
+
+def _opaque(tag: str) -> str:
+    # Weak comparison: ignore the W/ prefix
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or _opaque(etag) in {_opaque(tag) for tag in candidates}
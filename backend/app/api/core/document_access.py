@@ -0,0 +1,16 @@
+from fastapi import HTTPException
+from app.api.core.storage_backends import get_document_store
+
+
+async def get_owned_document(doc_id: str, uid: str) -> dict:
+    """Fetch a document row and ensure it belongs to uid (404 / 403 otherwise)"""
+    print("Fetching document metadata...")
+    doc = await get_document_store().get(doc_id)
+    if doc is None:
+        print("Document not found in database")
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc["user_id"] != uid:
+        print("User not authorized for this document")
+        raise HTTPException(status_code=403, detail="Not owner")
+    print(f"Document found: {doc['file_name']}")
+    return doc
@@ -0,0 +1,23 @@
+from app.api.core.doc_versions import invalidate_document_version
+from app.api.core.events import get_event_bus, user_channel
+from app.api.core.storage_backends import get_document_store
+
+
+async def publish_status(doc_id: str, uid: str, status: str) -> None:
+    """Push a status change to the owner's event stream; never fails the caller"""
+    try:
+        await get_event_bus().publish(user_channel(uid), {"document_id": doc_id, "status": status})
+    except Exception as e:
+        print(f"Failed to publish status event: {e}")
+
+
+async def set_stage(doc_id: str, uid: str, status: str, **fields) -> None:
+    """Persist a stage transition (and any output it produced) as soon as it happens,
+    then drop the cached ETag and notify the owner's event stream"""
+    print(f"Document {doc_id} -> {status}")
+    await get_document_store().update(doc_id, {
+        "status": status,
+        **fields,
+    })
+    invalidate_document_version(doc_id)
+    await publish_status(doc_id, uid, status)
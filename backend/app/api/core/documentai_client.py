@@ -1,16 +1,41 @@
 import os
 import re
+import io
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import documentai_v1 as documentai
 from google.api_core import exceptions as gcp_exceptions
+from app.api.core.cache import TieredCache
+from app.api.core.text_layer import extract_pdf_pages, page_has_usable_text, text_layer_enabled
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+    PdfReader = None
+    PdfWriter = None
 
 _client = None
 _processor_name = None
+_async_client = None
+_ocr_cache = None
+_ocr_semaphore = None
+_ocr_gate_stats = {
+    "inFlight": 0,
+    "waiting": 0,
+    "requests": 0,
+    "totalWaitSeconds": 0.0,
+    "maxWaitSeconds": 0.0,
+}
 
-def get_documentai_client():
-    """Get or create Document AI client with lazy initialization"""
-    global _client, _processor_name
-    
-    if _client is None:
+def get_processor_name() -> str:
+    """Full processor resource name from the environment; needs no client or credentials"""
+    global _processor_name
+
+    if _processor_name is None:
         project_id = os.getenv("GCP_PROJECT_ID")
         location = os.getenv("GCP_LOCATION", "us")
         processor_id = os.getenv("DOC_AI_PROCESSOR_ID")
@@ -20,11 +45,31 @@ def get_documentai_client():
         if not project_id or not processor_id:
             raise RuntimeError("Missing required Document AI environment variables: GCP_PROJECT_ID, DOC_AI_PROCESSOR_ID")
 
-        _client = documentai.DocumentProcessorServiceClient()
-        _processor_name = _client.processor_path(project_id, location, processor_id)
+        _processor_name = documentai.DocumentProcessorServiceClient.processor_path(project_id, location, processor_id)
         print(f"Processor name: {_processor_name}")
-    
-    return _client, _processor_name
+
+    return _processor_name
+
+def get_documentai_client():
+    """Get or create Document AI client with lazy initialization"""
+    global _client
+
+    processor_name = get_processor_name()
+    if _client is None:
+        _client = documentai.DocumentProcessorServiceClient()
+
+    return _client, processor_name
+
+def get_documentai_async_client():
+    """Get or create the asyncio Document AI client (must be called inside the event loop)"""
+    global _async_client
+
+    processor_name = get_processor_name()
+    if _async_client is None:
+        _async_client = documentai.DocumentProcessorServiceAsyncClient()
+        print(f"Async Document AI client ready for processor: {processor_name}")
+
+    return _async_client, processor_name
 
 class DocumentAIError(Exception):
     """Custom exception for Document AI errors"""
@@ -69,9 +114,48 @@ def _parse_document_ai_error(error_message: str) -> tuple[str, str]:
     # Default case
     return "UNKNOWN_ERROR", "Document processing failed. Please try again or contact support."
 
-def process_document_bytes(file_bytes: bytes, mime_type: str = "application/pdf"):
-    print(f"Processing document with Document AI, file size: {len(file_bytes)} bytes, MIME type: {mime_type}")
-    
+def get_ocr_cache() -> TieredCache:
+    """Get or create the OCR result cache (memory LRU + SQLite file)"""
+    global _ocr_cache
+
+    if _ocr_cache is None:
+        path = os.getenv("OCR_CACHE_PATH", "/tmp/legal-ai/ocr_cache.sqlite3")
+        _ocr_cache = TieredCache(
+            "OCR",
+            path or None,
+            max_memory_entries=int(os.getenv("OCR_CACHE_MEMORY_ENTRIES", "64")),
+            max_disk_bytes=int(os.getenv("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+        )
+    return _ocr_cache
+
+def _ocr_cache_key(file_bytes: bytes, processor_name: str) -> str:
+    return f"{processor_name}:{hashlib.sha256(file_bytes).hexdigest()}"
+
+def _page_offsets(document) -> list[list[int]]:
+    """Return [start, end) character offsets into document.text for each page"""
+    offsets = []
+    for page in document.pages:
+        segments = page.layout.text_anchor.text_segments
+        if segments:
+            offsets.append([int(segments[0].start_index), int(segments[-1].end_index)])
+        else:
+            offsets.append([0, 0])
+    return offsets
+
+def _build_document(text: str, page_offsets: list) -> "documentai.Document":
+    """Rebuild a minimal Document (text + per-page anchors) from cached/stitched data"""
+    pages = []
+    for i, (start, end) in enumerate(page_offsets):
+        anchor = documentai.Document.TextAnchor(
+            text_segments=[documentai.Document.TextAnchor.TextSegment(start_index=start, end_index=end)]
+        )
+        pages.append(documentai.Document.Page(
+            page_number=i + 1,
+            layout=documentai.Document.Page.Layout(text_anchor=anchor),
+        ))
+    return documentai.Document(text=text, pages=pages)
+
+def _validate_input(file_bytes: bytes, mime_type: str) -> None:
     # Pre-validation checks
     if len(file_bytes) == 0:
         raise DocumentAIError("Empty file provided", "EMPTY_FILE", "The uploaded file is empty.")
@@ -92,15 +176,75 @@ def process_document_bytes(file_bytes: bytes, mime_type: str = "application/pdf"
     if mime_type not in supported_types:
         raise DocumentAIError(f"Unsupported MIME type: {mime_type}", "INVALID_DOCUMENT", 
                             "Document format is not supported. Please use PDF or image files (JPEG, PNG, GIF, TIFF, WebP, BMP).")
-    
+
+def _plan_pages(file_bytes: bytes, mime_type: str) -> tuple[int | None, list | None, list[int]]:
+    """Decide which PDF pages need OCR.
+
+    Returns (page_count, page_texts, ocr_pages). page_texts holds the usable
+    text layer per page (None when there is no usable text layer at all) and
+    ocr_pages the indices that still have to go to Document AI.
+    """
+    page_count = _pdf_page_count(file_bytes) if mime_type == "application/pdf" else None
+
+    # Born-digital PDFs already carry text; only pages that fail the quality check go to OCR
+    page_texts = extract_pdf_pages(file_bytes) if page_count and text_layer_enabled() else None
+    if page_texts and len(page_texts) == page_count:
+        ocr_pages = [i for i, text in enumerate(page_texts) if not page_has_usable_text(text)]
+        print(f"Text layer usable on {page_count - len(ocr_pages)}/{page_count} pages")
+        if len(ocr_pages) == page_count:
+            page_texts = None
+    else:
+        page_texts = None
+        ocr_pages = list(range(page_count)) if page_count else []
+    return page_count, page_texts, ocr_pages
+
+def _needs_page_ocr(page_count: int | None, page_texts: list | None, ocr_pages: list[int]) -> bool:
+    """True when OCR must go page-by-page (mixed text layer, or over the page limit)"""
+    if not ocr_pages:
+        return False
+    return page_texts is not None or page_count > _max_pages_per_request()
+
+def _merge_pages(page_count: int, page_texts: list | None, ocr_pages: list[int], ocr_texts: list[str]):
+    merged = list(page_texts) if page_texts is not None else [""] * page_count
+    for i, text in zip(ocr_pages, ocr_texts):
+        merged[i] = text
+    return _document_from_pages(merged)
+
+def process_document_bytes(file_bytes: bytes, mime_type: str = "application/pdf"):
+    print(f"Processing document with Document AI, file size: {len(file_bytes)} bytes, MIME type: {mime_type}")
+    _validate_input(file_bytes, mime_type)
+
+    # Identical bytes on the same processor always OCR to the same text. The key only
+    # needs the processor name, so a hit never builds (or authenticates) a client.
+    processor_name = get_processor_name()
+    cache = get_ocr_cache()
+    cache_key = _ocr_cache_key(file_bytes, processor_name)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print("OCR cache hit, skipping Document AI")
+        return _build_document(cached["text"], cached["page_offsets"])
+
+    page_count, page_texts, ocr_pages = _plan_pages(file_bytes, mime_type)
+    if page_texts is not None and not ocr_pages:
+        document = _document_from_pages(page_texts)
+    elif _needs_page_ocr(page_count, page_texts, ocr_pages):
+        client, _ = get_documentai_client()
+        ocr_texts = _ocr_pdf_pages(client, processor_name, file_bytes, ocr_pages, _max_pages_per_request())
+        document = _merge_pages(page_count, page_texts, ocr_pages, ocr_texts)
+    else:
+        client, _ = get_documentai_client()
+        document = _process_raw(client, processor_name, file_bytes, mime_type)
+
+    cache.set(cache_key, {"text": document.text, "page_offsets": _page_offsets(document)})
+    return document
+
+def _process_raw(client, processor_name: str, file_bytes: bytes, mime_type: str):
+    """Send one synchronous ProcessRequest and map failures to DocumentAIError"""
     raw_document = documentai.RawDocument(
         content=file_bytes,
         mime_type=mime_type
     )
 
-    # Get the client and processor name
-    client, processor_name = get_documentai_client()
-    
     request = documentai.ProcessRequest(
         name=processor_name,
         raw_document=raw_document
@@ -119,3 +263,162 @@ def process_document_bytes(file_bytes: bytes, mime_type: str = "application/pdf"
         print(f"Unexpected Document AI error: {e}")
         error_code, user_message = _parse_document_ai_error(str(e))
         raise DocumentAIError(str(e), error_code, user_message)
+
+def _max_pages_per_request() -> int:
+    return int(os.getenv("DOC_AI_MAX_PAGES_PER_REQUEST", "30"))
+
+def _pdf_page_count(file_bytes: bytes) -> int | None:
+    """Count PDF pages locally; None if pypdf is missing or the file can't be parsed"""
+    if not PYPDF_AVAILABLE:
+        return None
+    try:
+        return len(PdfReader(io.BytesIO(file_bytes)).pages)
+    except Exception as e:
+        print(f"Could not read PDF page count: {e}")
+        return None
+
+def _split_pdf(file_bytes: bytes, page_groups: list[list[int]]) -> list[bytes]:
+    """Write each group of page indices out as its own PDF"""
+    reader = PdfReader(io.BytesIO(file_bytes))
+    shards = []
+    for group in page_groups:
+        writer = PdfWriter()
+        for i in group:
+            writer.add_page(reader.pages[i])
+        buf = io.BytesIO()
+        writer.write(buf)
+        shards.append(buf.getvalue())
+    return shards
+
+def _page_texts(document) -> list[str]:
+    return [document.text[start:end] for start, end in _page_offsets(document)]
+
+def _document_from_pages(page_texts: list[str]) -> "documentai.Document":
+    """Join per-page texts in order into one Document with matching page offsets"""
+    text_parts = []
+    page_offsets = []
+    base = 0
+    for text in page_texts:
+        if text and not text.endswith("\n"):
+            text += "\n"
+        text_parts.append(text)
+        page_offsets.append([base, base + len(text)])
+        base += len(text)
+    return _build_document("".join(text_parts), page_offsets)
+
+def _ocr_pdf_pages(client, processor_name: str, file_bytes: bytes, page_indices: list[int], shard_pages: int) -> list[str]:
+    """OCR the given PDF pages as concurrent shards within the per-request page limit.
+
+    Returns one text per requested page, in the order of page_indices.
+    """
+    groups = [page_indices[i:i + shard_pages] for i in range(0, len(page_indices), shard_pages)]
+    shards = _split_pdf(file_bytes, groups)
+    workers = max(1, min(len(shards), int(os.getenv("DOC_AI_SHARD_WORKERS", "4"))))
+    print(f"OCR'ing {len(page_indices)} pages as {len(shards)} shards with {workers} workers")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map() preserves input order, so results line up with groups
+        documents = list(pool.map(
+            lambda shard: _process_raw(client, processor_name, shard, "application/pdf"),
+            shards,
+        ))
+
+    texts = []
+    for group, document in zip(groups, documents):
+        shard_texts = _page_texts(document)
+        # Pad/trim in case Document AI reported a different page count for the shard
+        shard_texts = (shard_texts + [""] * len(group))[:len(group)]
+        texts.extend(shard_texts)
+    return texts
+
+def _get_ocr_semaphore() -> asyncio.Semaphore:
+    """Global gate on concurrent Document AI calls across all requests in this process"""
+    global _ocr_semaphore
+    if _ocr_semaphore is None:
+        _ocr_semaphore = asyncio.Semaphore(int(os.getenv("DOC_AI_MAX_CONCURRENCY", "8")))
+    return _ocr_semaphore
+
+def get_ocr_gate_stats() -> dict:
+    """Queue-wait and concurrency metrics for the async OCR gate"""
+    stats = dict(_ocr_gate_stats)
+    requests = stats["requests"]
+    stats["averageWaitSeconds"] = (stats["totalWaitSeconds"] / requests) if requests else 0.0
+    stats["maxConcurrency"] = int(os.getenv("DOC_AI_MAX_CONCURRENCY", "8"))
+    return stats
+
+async def _process_raw_async(client, processor_name: str, file_bytes: bytes, mime_type: str):
+    """Async ProcessRequest behind the concurrency gate, with the same error mapping as _process_raw"""
+    request = documentai.ProcessRequest(
+        name=processor_name,
+        raw_document=documentai.RawDocument(content=file_bytes, mime_type=mime_type)
+    )
+
+    queued_at = time.monotonic()
+    _ocr_gate_stats["waiting"] += 1
+    async with _get_ocr_semaphore():
+        waited = time.monotonic() - queued_at
+        _ocr_gate_stats["waiting"] -= 1
+        _ocr_gate_stats["inFlight"] += 1
+        _ocr_gate_stats["requests"] += 1
+        _ocr_gate_stats["totalWaitSeconds"] += waited
+        _ocr_gate_stats["maxWaitSeconds"] = max(_ocr_gate_stats["maxWaitSeconds"], waited)
+        try:
+            print(f"Sending async request to Document AI (queued {waited:.3f}s)...")
+            result = await client.process_document(request=request)
+            print("Document AI processing completed successfully")
+            return result.document
+        except gcp_exceptions.GoogleAPIError as e:
+            print(f"Google API error: {e}")
+            error_code, user_message = _parse_document_ai_error(str(e))
+            raise DocumentAIError(str(e), error_code, user_message)
+        except Exception as e:
+            print(f"Unexpected Document AI error: {e}")
+            error_code, user_message = _parse_document_ai_error(str(e))
+            raise DocumentAIError(str(e), error_code, user_message)
+        finally:
+            _ocr_gate_stats["inFlight"] -= 1
+
+async def _ocr_pdf_pages_async(client, processor_name: str, file_bytes: bytes, page_indices: list[int], shard_pages: int) -> list[str]:
+    """Async counterpart of _ocr_pdf_pages; shard concurrency is bounded by the global gate"""
+    groups = [page_indices[i:i + shard_pages] for i in range(0, len(page_indices), shard_pages)]
+    shards = await asyncio.to_thread(_split_pdf, file_bytes, groups)
+    print(f"OCR'ing {len(page_indices)} pages as {len(shards)} async shards")
+
+    documents = await asyncio.gather(*[
+        _process_raw_async(client, processor_name, shard, "application/pdf") for shard in shards
+    ])
+
+    texts = []
+    for group, document in zip(groups, documents):
+        shard_texts = _page_texts(document)
+        shard_texts = (shard_texts + [""] * len(group))[:len(group)]
+        texts.extend(shard_texts)
+    return texts
+
+async def process_document_bytes_async(file_bytes: bytes, mime_type: str = "application/pdf"):
+    """asyncio-native process_document_bytes: no worker thread is held during the OCR call"""
+    print(f"Processing document with async Document AI, file size: {len(file_bytes)} bytes, MIME type: {mime_type}")
+    _validate_input(file_bytes, mime_type)
+
+    processor_name = get_processor_name()
+    cache = get_ocr_cache()
+    cache_key = _ocr_cache_key(file_bytes, processor_name)
+    cached = await asyncio.to_thread(cache.get, cache_key)
+    if cached is not None:
+        print("OCR cache hit, skipping Document AI")
+        return _build_document(cached["text"], cached["page_offsets"])
+
+    # PDF parsing is CPU-bound; keep it off the event loop
+    page_count, page_texts, ocr_pages = await asyncio.to_thread(_plan_pages, file_bytes, mime_type)
+    if page_texts is not None and not ocr_pages:
+        document = _document_from_pages(page_texts)
+    elif _needs_page_ocr(page_count, page_texts, ocr_pages):
+        client, _ = get_documentai_async_client()
+        ocr_texts = await _ocr_pdf_pages_async(client, processor_name, file_bytes, ocr_pages, _max_pages_per_request())
+        document = _merge_pages(page_count, page_texts, ocr_pages, ocr_texts)
+    else:
+        client, _ = get_documentai_async_client()
+        document = await _process_raw_async(client, processor_name, file_bytes, mime_type)
+
+    await asyncio.to_thread(cache.set, cache_key, {"text": document.text, "page_offsets": _page_offsets(document)})
+    return document
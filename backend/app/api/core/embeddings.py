@@ -0,0 +1,182 @@
+import os
+import re
+import hashlib
+from typing import Optional
+
+import numpy as np
+
+from app.api.core.model_router import ModelRouter, router_settings
+from app.api.core.gemini import VERTEX_AI_AVAILABLE, build_in_location, vertex_locations
+from app.api.core.vector_cache import VectorCache, content_key
+
+try:
+    from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
+except ImportError:
+    TextEmbeddingInput = None
+    TextEmbeddingModel = None
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+
+# Task types whose vectors are worth keeping: document chunks recur across
+# reprocessing and re-uploads, questions rarely repeat verbatim
+_CACHED_TASK_TYPES = {"RETRIEVAL_DOCUMENT"}
+
+
+class VertexEmbeddings:
+    """Vertex AI text embeddings, routed across locations with the same breaker as Gemini calls"""
+
+    def __init__(self, model_name: str, dim: Optional[int] = None):
+        self.name = model_name
+        # Learned from the first response (or the cache) unless configured
+        self.dim = dim
+        self._router: Optional[ModelRouter] = None
+
+    def _build(self, location: str, model_name: str):
+        return build_in_location(location, lambda: TextEmbeddingModel.from_pretrained(model_name))
+
+    def router(self) -> ModelRouter:
+        if self._router is None:
+            self._router = ModelRouter(vertex_locations(), [self.name], self._build, **router_settings())
+        return self._router
+
+    def embed(self, texts: list[str], task_type: str) -> np.ndarray:
+        if not VERTEX_AI_AVAILABLE or TextEmbeddingModel is None:
+            raise RuntimeError("Vertex AI embeddings are not available")
+        batch = [TextEmbeddingInput(text, task_type) for text in texts]
+        embeddings = self.router().call(lambda model: model.get_embeddings(batch))
+        vectors = np.asarray([e.values for e in embeddings], dtype=np.float32)
+        self.dim = vectors.shape[1]
+        return vectors
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbeddings:
+    """Deterministic offline embeddings: signed feature hashing of word unigrams and bigrams.
+
+    No model, no network, identical output on every machine - for tests and
+    local development (EMBEDDING_BACKEND=local). Similarity is lexical, not
+    semantic, but ranking behaves sensibly for keyword-heavy questions.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"local-hash-{dim}"
+
+    def _features(self, text: str) -> list[str]:
+        words = _TOKEN.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: list[str], task_type: str) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        return out
+
+
+_backend = None
+_cache: Optional[VectorCache] = None
+
+
+def get_embedding_backend():
+    """Get or create the configured embedding backend (EMBEDDING_BACKEND=vertex|local)"""
+    global _backend
+    if _backend is None:
+        if os.getenv("EMBEDDING_BACKEND", "vertex").lower() == "local":
+            _backend = HashingEmbeddings(int(os.getenv("LOCAL_EMBEDDING_DIM", "256")))
+        else:
+            configured_dim = os.getenv("EMBEDDING_DIM")
+            _backend = VertexEmbeddings(EMBEDDING_MODEL, int(configured_dim) if configured_dim else None)
+        print(f"Embedding backend: {_backend.name}")
+    return _backend
+
+
+def set_embedding_backend(backend) -> None:
+    """Swap the backend (any object with `name`, `dim` and `embed(texts, task_type)`), e.g. in tests"""
+    global _backend, _cache
+    _backend = backend
+    _cache = None
+
+
+def embedding_model_name() -> str:
+    return get_embedding_backend().name
+
+
+def embedding_dim() -> Optional[int]:
+    """Vector width of the current backend, or None before it has produced (or cached) any vector"""
+    backend = get_embedding_backend()
+    if backend.dim is None:
+        backend.dim = get_embedding_cache().stored_dim()
+    return backend.dim
+
+
+def get_embedding_cache() -> VectorCache:
+    """Get or create the on-disk embedding cache for the current backend (EMBEDDING_CACHE_DIR)"""
+    global _cache
+    if _cache is None:
+        root = os.getenv("EMBEDDING_CACHE_DIR", "/tmp/legal-ai/embeddings")
+        # One store per model: dimensions and vector spaces differ between models
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", embedding_model_name())
+        _cache = VectorCache(os.path.join(root, safe_name))
+    return _cache
+
+
+def _batch_size() -> int:
+    # Vertex allows up to 250 inputs / 20k tokens per request; ~2k-char chunks fit 32 comfortably
+    return int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _embed_uncached(texts: list[str], task_type: str) -> np.ndarray:
+    backend = get_embedding_backend()
+    size = _batch_size()
+    blocks = [backend.embed(texts[i:i + size], task_type) for i in range(0, len(texts), size)]
+    return _normalize(np.concatenate(blocks).astype(np.float32))
+
+
+def embed_texts(texts: list[str], task_type: str = "RETRIEVAL_DOCUMENT") -> np.ndarray:
+    """Embed texts, sending only texts not seen before to the backend.
+
+    Returns a contiguous (len(texts), dim) float32 matrix of unit-length rows,
+    so a dot product is the cosine similarity. Document vectors are cached by
+    a hash of (model, task type, text); duplicate texts in one call are
+    embedded once. Fresh vectors are rounded through float16 like cached ones,
+    so results do not depend on cache state. No texts give a (0, dim) matrix
+    (dim 0 only while the backend's width is still unknown).
+    """
+    if not texts:
+        return np.zeros((0, embedding_dim() or 0), dtype=np.float32)
+    if task_type not in _CACHED_TASK_TYPES:
+        return np.ascontiguousarray(_embed_uncached(texts, task_type))
+
+    cache = get_embedding_cache()
+    model = embedding_model_name()
+    keys = [content_key(model, task_type, text) for text in texts]
+    cached, missing = cache.get_many(keys)
+    if not missing:
+        return np.ascontiguousarray(_normalize(cached))
+
+    unique: dict[bytes, str] = {}
+    for i in missing:
+        unique.setdefault(keys[i], texts[i])
+    fresh = _embed_uncached(list(unique.values()), task_type).astype(np.float16).astype(np.float32)
+    cache.put_many(list(unique), fresh)
+    print(f"Embedded {len(unique)} new chunks ({len(texts) - len(missing)} cached)")
+
+    rows = dict(zip(unique, fresh))
+    out = cached if cached is not None else np.zeros((len(texts), fresh.shape[1]), dtype=np.float32)
+    for i in missing:
+        out[i] = rows[keys[i]]
+    return np.ascontiguousarray(_normalize(out))
+
+
+def embed_query(text: str) -> np.ndarray:
+    return embed_texts([text], task_type="RETRIEVAL_QUERY")[0]
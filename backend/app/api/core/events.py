@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from typing import Optional
+
+
+class EventBus:
+    """In-process pub/sub: every subscriber of a channel gets its own bounded queue.
+
+    Slow subscribers drop their oldest events rather than blocking publishers.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[channel]
+
+    def _fan_out(self, channel: str, event: dict) -> None:
+        for queue in list(self._subscribers.get(channel, ())):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+            self.delivered += 1
+
+    async def publish(self, channel: str, event: dict) -> None:
+        self.published += 1
+        self._fan_out(channel, event)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+class SQLiteEventBus(EventBus):
+    """EventBus whose publishes go through a shared SQLite table.
+
+    Stand-in for a real broker (Redis/PubSub) when several instances share a
+    volume: every instance polls rows newer than the last one it saw and fans
+    them out to its local subscribers, including events it published itself.
+    """
+
+    def __init__(self, path: str, poll_seconds: float = 0.5, retention_seconds: float = 3600,
+                 max_queue: int = 100):
+        super().__init__(max_queue=max_queue)
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _insert(self, channel: str, event: dict) -> None:
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT INTO events (channel, payload, created_at) VALUES (?, ?, ?)",
+                (channel, json.dumps(event), time.time()),
+            )
+            conn.commit()
+
+    def _read_new(self) -> list[tuple[int, str, str]]:
+        with self._lock:
+            conn = self._get_conn()
+            rows = conn.execute(
+                "SELECT id, channel, payload FROM events WHERE id > ? ORDER BY id", (self._last_id,)
+            ).fetchall()
+            conn.execute("DELETE FROM events WHERE created_at < ?", (time.time() - self.retention_seconds,))
+            conn.commit()
+        return rows
+
+    def _latest_id(self) -> int:
+        with self._lock:
+            return self._get_conn().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    async def publish(self, channel: str, event: dict) -> None:
+        self.published += 1
+        await asyncio.to_thread(self._insert, channel, event)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        # Only deliver events published after this instance came up
+        self._last_id = await asyncio.to_thread(self._latest_id)
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                for row_id, channel, payload in await asyncio.to_thread(self._read_new):
+                    self._last_id = row_id
+                    self._fan_out(channel, json.loads(payload))
+            except Exception as e:
+                print(f"Event broker poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+
+_bus = None
+
+
+def get_event_bus() -> EventBus:
+    """Get or create the process-wide event bus (EVENT_BROKER=memory|sqlite)"""
+    global _bus
+    if _bus is None:
+        if os.getenv("EVENT_BROKER", "memory").lower() == "sqlite":
+            _bus = SQLiteEventBus(
+                os.getenv("EVENT_BROKER_PATH", "/tmp/legal-ai/events.sqlite3"),
+                poll_seconds=float(os.getenv("EVENT_BROKER_POLL_SECONDS", "0.5")),
+            )
+        else:
+            _bus = EventBus()
+    return _bus
+
+
+def user_channel(user_id: str) -> str:
+    return f"user:{user_id}"
@@ -1,8 +1,11 @@
 import os
+import time
+import threading
 import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi import HTTPException
 import json
+from app.api.core.token_cache import VerifiedTokenCache
 
 # Initialize once
 if not firebase_admin._apps:
@@ -22,12 +25,78 @@ if not firebase_admin._apps:
         # Initialize with default if all else fails
         firebase_admin.initialize_app()
 
+# Verified-token cache: repeat requests with the same ID token skip signature verification.
+# FIREBASE_CHECK_REVOKED=true also checks revocation, re-verifying cached tokens every
+# FIREBASE_REVOCATION_RECHECK_SECONDS.
+_check_revoked = os.getenv("FIREBASE_CHECK_REVOKED", "false").lower() == "true"
+_token_cache = VerifiedTokenCache(
+    max_entries=int(os.getenv("FIREBASE_TOKEN_CACHE_SIZE", "1024")),
+    skew_seconds=float(os.getenv("FIREBASE_TOKEN_CACHE_SKEW_SECONDS", "30")),
+    recheck_seconds=float(os.getenv("FIREBASE_REVOCATION_RECHECK_SECONDS", "300")) if _check_revoked else None,
+)
+
+# Where Firebase publishes the ID token signing certificates
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+_cert_refresher: threading.Thread | None = None
+
+
+def _verify(token: str) -> dict:
+    return auth.verify_id_token(token, check_revoked=_check_revoked)
+
+
+def verify_id_token_cached(token: str) -> dict:
+    """Verify a Firebase ID token, reusing the result for repeat requests until it expires"""
+    return _token_cache.verify(token, _verify)
+
+
+def get_token_cache_stats() -> dict:
+    return _token_cache.stats()
+
+
+def _refresh_signing_certs() -> bool:
+    """Re-fetch the signing certs through the verifier's own (cache-control) HTTP session.
+
+    Forcing no-cache replaces the cached copy before it goes stale, so token
+    verification on a request path never waits on the certificate download.
+    Returns False if this firebase_admin version doesn't expose the session.
+    """
+    try:
+        client = auth._get_client(firebase_admin.get_app())
+        request = client._token_verifier.request
+    except Exception as e:
+        print(f"Signing cert refresh unavailable: {e}")
+        return False
+    try:
+        response = request(ID_TOKEN_CERT_URI, method="GET", headers={"Cache-Control": "no-cache"})
+        if response.status != 200:
+            print(f"Signing cert refresh returned HTTP {response.status}")
+    except Exception as e:
+        print(f"Signing cert refresh failed: {e}")
+    return True
+
+
+def start_cert_refresher() -> None:
+    """Refresh the signing certs in the background every FIREBASE_CERT_REFRESH_SECONDS"""
+    global _cert_refresher
+    interval = float(os.getenv("FIREBASE_CERT_REFRESH_SECONDS", "1800"))
+    if _cert_refresher is not None or interval <= 0:
+        return
+
+    def run():
+        while _refresh_signing_certs():
+            time.sleep(interval)
+
+    _cert_refresher = threading.Thread(target=run, name="firebase-cert-refresh", daemon=True)
+    _cert_refresher.start()
+
+
 def get_current_user_from_auth_header(authorization: str | None):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
     token = authorization.split(" ").pop()
     try:
-        decoded = auth.verify_id_token(token)
+        decoded = verify_id_token_cached(token)
         return decoded  # contains uid, email, etc.
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid ID token")
\ No newline at end of file
@@ -1,6 +1,13 @@
 import os
 import json
-from typing import Optional, Dict, Any
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Iterator
+
+from app.api.core.cache import TieredCache
+from app.api.core.chunking import split_text
+from app.api.core.model_router import ModelRouter, router_settings
 
 try:
     # Try importing from google.cloud.aiplatform first, then vertexai
@@ -100,37 +107,279 @@ def _ensure_vertex_init(location: str) -> None:
     vertexai.init(project=_PROJECT_ID, location=location)
 
 
-def _parse_gemini_response(response_text: str) -> Dict[str, Any]:
-    """Parse the Gemini response and extract structured data"""
+_router = None
+_llm_cache = None
+_init_lock = threading.Lock()
+
+
+def build_in_location(location: str, factory):
+    """Construct a Vertex AI handle bound to location.
+
+    Vertex models bind the location configured at construction time, so init and
+    construct under one lock to keep another thread from switching regions in between.
+    """
+    with _init_lock:
+        _ensure_vertex_init(location)
+        return factory()
+
+
+def vertex_locations() -> list[str]:
+    """Ordered Vertex AI locations to try (configured location first)"""
+    return list(_LOCATION_CANDIDATES)
+
+
+def _build_model(location: str, model_name: str):
+    return build_in_location(location, lambda: GenerativeModel(model_name))
+
+
+def get_llm_cache() -> TieredCache:
+    """Get or create the Gemini response cache (memory LRU, optional SQLite tier, TTL)"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = TieredCache(
+            "LLM",
+            os.getenv("LLM_CACHE_PATH") or None,
+            max_memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256")),
+            max_disk_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(128 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        )
+    return _llm_cache
+
+
+def _llm_cache_key(prompt: str, config_params: Dict[str, Any]) -> str:
+    # Whitespace-only differences in the prompt don't change the answer
+    normalized = " ".join(prompt.split())
+    prompt_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    # The router may serve any candidate, so the candidate list stands in for "the model"
+    models = ",".join(_MODEL_CANDIDATES)
+    config = json.dumps(config_params, sort_keys=True)
+    return hashlib.sha256(f"{prompt_hash}|{models}|{config}".encode("utf-8")).hexdigest()
+
+
+def _cached_response(cache: TieredCache, key: str, validate: Optional[Callable[[str], bool]]) -> Optional[str]:
+    cached = cache.get(key)
+    if cached is None:
+        return None
+    if validate is not None and not validate(cached):
+        # Written before responses were validated; regenerate instead of serving it for the whole TTL
+        cache.delete(key)
+        return None
+    print("LLM cache hit, skipping Gemini call")
+    return cached
+
+
+def _cacheable(text: str, finish_reason: Optional[str], validate: Optional[Callable[[str], bool]]) -> bool:
+    """Only complete answers are cached: a truncated or malformed one would be replayed for days"""
+    if not text:
+        return False
+    if finish_reason != "STOP":
+        print(f"Not caching Gemini response (finish reason {finish_reason})")
+        return False
+    if validate is not None and not validate(text):
+        print("Not caching Gemini response that failed validation")
+        return False
+    return True
+
+
+def _generate_text(prompt: str, validate: Optional[Callable[[str], bool]] = None, **config_params) -> str:
+    """Generate text through the router, answering repeats of the same request from cache.
+
+    A response is cached only if generation stopped normally and, when given,
+    validate(text) accepts it.
+    """
+    cache = get_llm_cache()
+    key = _llm_cache_key(prompt, config_params)
+    cached = _cached_response(cache, key, validate)
+    if cached is not None:
+        return cached
+
+    config = GenerationConfig(**config_params)
+
+    def generate(model):
+        resp = model.generate_content(prompt, generation_config=config)
+        return _response_text(resp), _finish_reason(resp)
+
+    text, finish_reason = get_gemini_router().call(generate)
+    if _cacheable(text, finish_reason, validate):
+        cache.set(key, text)
+    return text or ""
+
+
+def get_gemini_router() -> ModelRouter:
+    """Get or create the (location, model) router shared by all Gemini calls"""
+    global _router
+    if _router is None:
+        _router = ModelRouter(_LOCATION_CANDIDATES, _MODEL_CANDIDATES, _build_model, **router_settings())
+    return _router
+
+
+# Response schema for the single-call structured analysis (OpenAPI subset accepted by Vertex AI)
+_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "detailedExplanation": {"type": "string"},
+        "summary": {"type": "string"},
+        "documentType": {
+            "type": "string",
+            "enum": ["Contract", "Agreement", "Policy", "Legal Brief", "Court Document", "Other"],
+        },
+        "complexity": {"type": "string", "enum": ["Simple", "Moderate", "Complex"]},
+        "riskLevel": {"type": "string", "enum": ["Low", "Medium", "High"]},
+        "riskFactors": {"type": "array", "items": {"type": "string"}},
+        "keyParties": {"type": "array", "items": {"type": "string"}},
+        "pageCount": {"type": "integer"},
+    },
+    "required": ["detailedExplanation", "summary", "documentType", "complexity", "riskLevel",
+                 "riskFactors", "keyParties"],
+}
+
+_ANALYSIS_PROMPT = """You are a legal document analyzer. Analyze the document below for a layperson.
+
+- detailedExplanation: a 5-7 bullet point analysis covering the executive summary, key obligations
+  and responsibilities, important terms and conditions, potential risks and red flags,
+  termination/renewal/penalty clauses (if present) and any other critical information.
+- summary: a concise 2-3 sentence summary.
+- riskFactors and keyParties: at most 3 entries each, empty if not applicable.
+- pageCount: estimated from the content length.
+
+Do not repeat the document text in your answer.
+
+DOCUMENT:
+"""
+
+
+def default_metadata(document_text: str) -> Dict[str, Any]:
+    """Metadata used when no model analysis is available"""
+    return {
+        'documentType': None,
+        'complexity': None,
+        'riskLevel': None,
+        'riskFactors': [],
+        'keyParties': [],
+        'wordCount': len(document_text.split()),
+        'pageCount': None
+    }
+
+
+def _response_text(resp) -> str:
+    """Extract generated text; the response shape differs between SDK versions"""
+    text = getattr(resp, "text", None)
+    if text and text.strip():
+        return text.strip()
+
     try:
-        # Clean the response text
-        cleaned_text = response_text.strip()
-        if cleaned_text.startswith('```json'):
-            cleaned_text = cleaned_text[7:]
-        if cleaned_text.endswith('```'):
-            cleaned_text = cleaned_text[:-3]
-        
-        # Parse JSON
-        data = json.loads(cleaned_text)
-        
-        return {
-            'document_type': data.get('documentType'),
-            'complexity': data.get('complexity'),
-            'risk_level': data.get('riskLevel'),
-            'risk_factors': data.get('riskFactors', []),
-            'key_parties': data.get('keyParties', []),
-            'summary': data.get('summary'),
-            'extracted_text': data.get('extractedText'),
-            'word_count': data.get('wordCount'),
-            'page_count': data.get('pageCount')
-        }
-    except Exception as e:
-        print(f"Error parsing Gemini response: {e}")
-        # Fallback to original response
-        return {
-            'summary': response_text,
-            'extracted_text': None
-        }
+        candidates = getattr(resp, "candidates", None) or []
+        for c in candidates:
+            content = getattr(c, "content", None)
+            if not content:
+                continue
+            parts = getattr(content, "parts", None) or []
+            chunk = "".join([getattr(p, "text", "") for p in parts])
+            if chunk.strip():
+                return chunk.strip()
+    except Exception:
+        pass
+    return ""
+
+
+def _finish_reason(resp) -> Optional[str]:
+    """Finish reason of the first candidate (STOP, MAX_TOKENS, SAFETY, ...), None if not reported"""
+    try:
+        reason = resp.candidates[0].finish_reason
+    except Exception:
+        return None
+    if reason is None:
+        return None
+    return getattr(reason, "name", str(reason))
+
+
+def _parse_gemini_response(response_text: str, document_text: str) -> Dict[str, Any]:
+    """Parse the schema-constrained JSON analysis into explanation, summary and metadata"""
+    cleaned_text = response_text.strip()
+    # JSON mime type should make fences impossible, but older models still add them
+    if cleaned_text.startswith('```json'):
+        cleaned_text = cleaned_text[7:]
+    if cleaned_text.endswith('```'):
+        cleaned_text = cleaned_text[:-3]
+
+    data = json.loads(cleaned_text)
+
+    metadata = default_metadata(document_text)
+    metadata.update({
+        'documentType': data.get('documentType'),
+        'complexity': data.get('complexity'),
+        'riskLevel': data.get('riskLevel'),
+        'riskFactors': (data.get('riskFactors') or [])[:3],
+        'keyParties': (data.get('keyParties') or [])[:3],
+        'pageCount': data.get('pageCount'),
+    })
+    return {
+        'detailed_explanation': (data.get('detailedExplanation') or '').strip(),
+        'summary': (data.get('summary') or '').strip(),
+        'metadata': metadata,
+    }
+
+
+_MAP_PROMPT = """You are a legal document analyzer. The text below is section {index} of {total} of a longer legal document.
+Write compact notes on this section only: parties, obligations, payment terms, dates and deadlines,
+termination/renewal/penalty clauses, and any risks or red flags. Keep clause numbers and defined terms.
+Do not repeat the text verbatim.
+
+SECTION:
+"""
+
+
+def _max_direct_chars() -> int:
+    return int(os.getenv("GEMINI_MAX_DIRECT_CHARS", "120000"))
+
+
+def _map_sections(text: str) -> str:
+    """Map step: note each chunk in parallel and join the notes in document order"""
+    chunk_chars = int(os.getenv("GEMINI_MAP_CHUNK_CHARS", "60000"))
+    workers = int(os.getenv("GEMINI_MAP_CONCURRENCY", "4"))
+    chunks = split_text(text, max_chars=chunk_chars)
+    total = len(chunks)
+    print(f"Map-reduce: noting {total} sections with {min(workers, total)} workers")
+
+    def note(indexed):
+        index, chunk = indexed
+        prompt = _MAP_PROMPT.format(index=index, total=total) + chunk
+        return _generate_text(prompt, temperature=0.2, max_output_tokens=1024)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, total))) as pool:
+        notes = list(pool.map(note, enumerate(chunks, start=1)))
+    return "\n\n".join(f"[Section {i} of {total}]\n{n}" for i, n in enumerate(notes, start=1))
+
+
+def _condense_for_prompt(document_text: str) -> tuple[str, bool]:
+    """Return text that fits one prompt, map-reducing long documents instead of truncating.
+
+    The second value tells the caller whether the text was replaced by section notes.
+    Notes are noted again, level by level, until they fit; they are never cut, so
+    the end of the document always reaches the model. Raises RuntimeError if a
+    level stops shrinking the text.
+    """
+    limit = _max_direct_chars()
+    if len(document_text) <= limit:
+        return document_text, False
+
+    text = document_text
+    level = 0
+    # Each level shrinks the text by roughly chunk size / note size, so this ends after a few levels
+    while len(text) > limit:
+        level += 1
+        notes = _map_sections(text)
+        if len(notes) >= len(text):
+            raise RuntimeError(
+                f"Map-reduce level {level} did not shrink the text ({len(text)} -> {len(notes)} chars); "
+                f"cannot fit it into {limit} chars"
+            )
+        text = notes
+    return text, True
+
+
+_NOTES_PREAMBLE = ("The document was too long to send in full. Below are section-by-section notes "
+                   "covering the whole document, in order. Base your answer on all sections.\n\n")
 
 
 def summarize_with_gemini(document_text: str, max_tokens: int = 800) -> str:
@@ -155,191 +404,141 @@ def summarize_with_gemini(document_text: str, max_tokens: int = 800) -> str:
                f"AI analysis is currently unavailable, but the document has been successfully processed and stored. "
                f"You can view the full extracted text in the chat interface.")
 
-    # Try candidates (location x model) until one succeeds
-    last_err: Exception | None = None
-    for loc in _LOCATION_CANDIDATES:
-        try:
-            _ensure_vertex_init(loc)
-        except Exception as e:
-            last_err = e
-            continue
-        for model_name in _MODEL_CANDIDATES:
-            try:
-                model = GenerativeModel(model_name)
-                prompt = (
+    text, condensed = _condense_for_prompt(document_text)
+    prompt = (
         "You are a legal explainer. Summarize the following extracted contract text for a layperson.\n"
         "Return:\n"
         "- 5 bullet executive summary\n"
         "- Key obligations of the user\n"
         "- Key risks and red flags\n"
         "- Termination / renewal / penalty clauses (if present)\n\n"
-        "Text:\n" + document_text[:120000]
-                )
-
-                resp = model.generate_content(
-                    prompt,
-                    generation_config=GenerationConfig(
-                        temperature=0.2,
-                        max_output_tokens=max_tokens,
-                    ),
-                )
-
-                # Try multiple response shapes depending on SDK version
-                text = getattr(resp, "text", None)
-                if text and text.strip():
-                    return text.strip()
-
-                try:
-                    candidates = getattr(resp, "candidates", None) or []
-                    for c in candidates:
-                        content = getattr(c, "content", None)
-                        if not content:
-                            continue
-                        parts = getattr(content, "parts", None) or []
-                        chunk = "".join([getattr(p, "text", "") for p in parts])
-                        if chunk.strip():
-                            return chunk.strip()
-                except Exception:
-                    pass
-            except Exception as e:
-                last_err = e
-                continue
+        "Text:\n" + (_NOTES_PREAMBLE + text if condensed else text)
+    )
+    return _generate_text(prompt, temperature=0.2, max_output_tokens=max_tokens)
+
+
+def _analysis_request(document_text: str, max_tokens: int) -> tuple[str, Dict[str, Any]]:
+    """Prompt and generation config for the structured analysis"""
+    text, condensed = _condense_for_prompt(document_text)
+    prompt = _ANALYSIS_PROMPT + (_NOTES_PREAMBLE + text if condensed else text)
+    return prompt, {
+        "temperature": 0.2,
+        "max_output_tokens": max_tokens,
+        "response_mime_type": "application/json",
+        "response_schema": _ANALYSIS_SCHEMA,
+    }
 
-    # Exhausted attempts
-    if last_err:
-        raise last_err
-    return ""
 
+def analyze_document_with_gemini(document_text: str, max_tokens: int = 2048) -> Dict[str, Any]:
+    """Analyze a document in one schema-constrained Gemini call.
 
-def analyze_document_with_gemini(document_text: str, max_tokens: int = 1200) -> Dict[str, Any]:
-    """Analyze document with enhanced structured response using Gemini.
+    The document is sent once and the model is not asked to echo it back;
+    the JSON response schema replaces free-text section parsing.
 
     Args:
         document_text: Raw extracted text to analyze.
         max_tokens: Upper bound for response length.
 
     Returns:
-        A dictionary containing structured analysis data.
+        A dict with 'detailed_explanation', 'summary' and 'metadata'
+        (the camelCase shape stored in documents.document_metadata).
     """
     if not document_text:
-        return {'summary': '', 'extracted_text': document_text}
+        return {'detailed_explanation': '', 'summary': '', 'metadata': default_metadata('')}
     
     if not VERTEX_AI_AVAILABLE:
+        metadata = default_metadata(document_text)
+        metadata['riskFactors'] = ['Vertex AI not configured for analysis']
         return {
+            'detailed_explanation': '',
             'summary': f"Analysis not available (Vertex AI not configured). Document contains {len(document_text.split())} words.",
-            'extracted_text': document_text,
-            'document_type': 'Unknown',
-            'complexity': 'Unknown',
-            'risk_level': 'Unknown',
-            'risk_factors': ['Vertex AI not configured for analysis'],
-            'key_parties': [],
-            'word_count': len(document_text.split()),
-            'page_count': 'Unknown'
+            'metadata': metadata,
         }
 
-    # Try candidates (location x model) until one succeeds
-    last_err: Exception | None = None
-    for loc in _LOCATION_CANDIDATES:
-        try:
-            _ensure_vertex_init(loc)
-        except Exception as e:
-            last_err = e
-            continue
-        for model_name in _MODEL_CANDIDATES:
-            try:
-                model = GenerativeModel(model_name)
-                
-                # Enhanced prompt for structured analysis
-                prompt = f"""
-Analyze this legal document and provide a structured response in the following JSON format:
-
-{{
-  "documentType": "Contract/Agreement/Policy/Legal Brief/Court Document/Other",
-  "complexity": "Simple/Moderate/Complex",
-  "riskLevel": "Low/Medium/High",
-  "riskFactors": ["Risk factor 1", "Risk factor 2", "Risk factor 3"],
-  "keyParties": ["Party 1", "Party 2", "Party 3"],
-  "summary": "2-3 sentence overview of the document",
-  "extractedText": "{document_text[:120000]}",
-  "wordCount": {len(document_text.split())},
-  "pageCount": "Estimated based on content length"
-}}
-
-Document to analyze:
-{document_text[:120000]}
-
-Please analyze this document and return ONLY the JSON response. Do not include any other text or explanations.
-"""
+    prompt, config_params = _analysis_request(document_text, max_tokens)
+    text = _generate_text(prompt, validate=is_valid_analysis, **config_params)
+    if text:
+        return _parse_gemini_response(text, document_text)
+    return {'detailed_explanation': '', 'summary': '', 'metadata': default_metadata(document_text)}
 
-                resp = model.generate_content(
-                    prompt,
-                    generation_config=GenerationConfig(
-                        temperature=0.2,
-                        max_output_tokens=max_tokens,
-                    ),
-                )
-
-                # Try multiple response shapes depending on SDK version
-                text = getattr(resp, "text", None)
-                if text and text.strip():
-                    return _parse_gemini_response(text.strip())
-
-                try:
-                    candidates = getattr(resp, "candidates", None) or []
-                    for c in candidates:
-                        content = getattr(c, "content", None)
-                        if not content:
-                            continue
-                        parts = getattr(content, "parts", None) or []
-                        chunk = "".join([getattr(p, "text", "") for p in parts])
-                        if chunk.strip():
-                            return _parse_gemini_response(chunk.strip())
-                except Exception:
-                    pass
-            except Exception as e:
-                last_err = e
-                continue
 
-    # Exhausted attempts - fallback to original summary
-    if last_err:
-        print(f"Enhanced analysis failed: {last_err}")
-        # Fallback to original summary
-        try:
-            summary = summarize_with_gemini(document_text, max_tokens)
-            return {
-                'summary': summary,
-                'extracted_text': document_text,
-                'document_type': None,
-                'complexity': None,
-                'risk_level': None,
-                'risk_factors': [],
-                'key_parties': [],
-                'word_count': len(document_text.split()),
-                'page_count': None
-            }
-        except Exception:
-            return {
-                'summary': '',
-                'extracted_text': document_text,
-                'document_type': None,
-                'complexity': None,
-                'risk_level': None,
-                'risk_factors': [],
-                'key_parties': [],
-                'word_count': len(document_text.split()),
-                'page_count': None
-            }
-    
-    return {
-        'summary': '',
-        'extracted_text': document_text,
-        'document_type': None,
-        'complexity': None,
-        'risk_level': None,
-        'risk_factors': [],
-        'key_parties': [],
-        'word_count': len(document_text.split()),
-        'page_count': None
-    }
+def parse_analysis_response(response_text: str, document_text: str) -> Dict[str, Any]:
+    """Parse a complete structured-analysis response (e.g. assembled from a stream)"""
+    return _parse_gemini_response(response_text, document_text)
 
 
+def is_valid_analysis(response_text: str) -> bool:
+    """Whether a structured-analysis response parses (truncated JSON does not)"""
+    try:
+        _parse_gemini_response(response_text, "")
+        return True
+    except Exception:
+        return False
+
+
+def stream_document_analysis(document_text: str, max_tokens: int = 2048) -> Iterator[str]:
+    """Yield the structured analysis JSON as text deltas while Gemini generates it.
+
+    A cached response is yielded in one piece. The pair is chosen through the
+    router; failing over is only possible before the first delta is produced.
+    Raises RuntimeError when Vertex AI is not available.
+    """
+    if not VERTEX_AI_AVAILABLE:
+        raise RuntimeError("Vertex AI not available")
+
+    prompt, config_params = _analysis_request(document_text, max_tokens)
+    yield from _stream_generate(prompt, config_params, validate=is_valid_analysis)
+
+
+def stream_text(prompt: str, max_tokens: int = 1024, temperature: float = 0.2) -> Iterator[str]:
+    """Yield a free-text Gemini response as text deltas (cached like every other call).
+
+    Raises RuntimeError when Vertex AI is not available.
+    """
+    if not VERTEX_AI_AVAILABLE:
+        raise RuntimeError("Vertex AI not available")
+    yield from _stream_generate(prompt, {"temperature": temperature, "max_output_tokens": max_tokens})
+
+
+def _stream_generate(prompt: str, config_params: Dict[str, Any],
+                     validate: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+    cache = get_llm_cache()
+    key = _llm_cache_key(prompt, config_params)
+    cached = _cached_response(cache, key, validate)
+    if cached is not None:
+        yield cached
+        return
+
+    config = GenerationConfig(**config_params)
+
+    def start(model):
+        # Pull the first chunk inside the router call so connection/model errors fail over
+        stream = iter(model.generate_content(prompt, generation_config=config, stream=True))
+        for chunk in stream:
+            text = _response_text(chunk)
+            if text:
+                return text, _finish_reason(chunk), stream
+        return None
+
+    started = get_gemini_router().call(start)
+    if not started:
+        return
+
+    first, finish_reason, stream = started
+    parts = [first]
+    yield first
+    for chunk in stream:
+        # Only the last chunk normally reports why generation ended
+        finish_reason = _finish_reason(chunk) or finish_reason
+        # Streaming chunks are not stripped: whitespace between deltas matters
+        try:
+            text = chunk.text or ""
+        except Exception:
+            # The final chunk may carry only a finish reason and no text part
+            text = ""
+        if text:
+            parts.append(text)
+            yield text
+    text = "".join(parts).strip()
+    if _cacheable(text, finish_reason, validate):
+        cache.set(key, text)
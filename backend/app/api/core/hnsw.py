@@ -0,0 +1,204 @@
+import math
+import heapq
+import random
+from typing import Optional
+
+import numpy as np
+
+
+class HNSWIndex:
+    """Hierarchical Navigable Small World graph over unit vectors (inner-product similarity).
+
+    Nodes are inserted incrementally (Malkov & Yashunin, with the neighbour
+    selection heuristic). Removal is a tombstone: deleted nodes still route
+    searches but are never returned, and `compact()` rebuilds the graph once
+    they pile up. Each node expansion scores all of its neighbours with one
+    matrix-vector product.
+    """
+
+    def __init__(self, dim: int, m: int = 16, ef_construction: int = 100, ef_search: int = 64, seed: int = 0):
+        self.dim = dim
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1 / math.log(m)
+        self._rng = random.Random(seed)
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.deleted = np.zeros(16, dtype=bool)
+        self.count = 0
+        self.live = 0
+        # node -> level -> neighbour ids
+        self.links: list[list[list[int]]] = []
+        self.entry = -1
+        self.max_level = -1
+
+    def __len__(self) -> int:
+        return self.live
+
+    def _reserve(self, size: int) -> None:
+        if size <= len(self.vectors):
+            return
+        capacity = max(size, 2 * len(self.vectors))
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self.count] = self.vectors[:self.count]
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[:self.count] = self.deleted[:self.count]
+        self.vectors, self.deleted = vectors, deleted
+
+    def _search_layer(self, query: np.ndarray, entry_points: list[int], ef: int, level: int) -> list[tuple[float, int]]:
+        """Best ef (score, node) pairs reachable from entry_points on level, best first"""
+        visited = set(entry_points)
+        scores = (self.vectors[entry_points] @ query).tolist()
+        candidates = [(-s, node) for s, node in zip(scores, entry_points)]
+        heapq.heapify(candidates)
+        best = [(s, node) for s, node in zip(scores, entry_points)]
+        heapq.heapify(best)
+        while len(best) > ef:
+            heapq.heappop(best)
+
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if -negative < best[0][0] and len(best) >= ef:
+                break
+            fresh = [n for n in self.links[node][level] if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for s, n in zip((self.vectors[fresh] @ query).tolist(), fresh):
+                if len(best) < ef or s > best[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(best, (s, n))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return sorted(best, reverse=True)
+
+    def _select(self, candidates: list[tuple[float, int]], m: int) -> list[int]:
+        """Pick up to m neighbours from (score, node) candidates sorted best first.
+
+        A candidate closer to an already chosen neighbour than to the base node
+        is skipped, which spreads links across clusters; skipped candidates top
+        the list up if fewer than m survive.
+        """
+        if len(candidates) <= 1:
+            return [node for _, node in candidates]
+        nodes = [node for _, node in candidates]
+        candidate_vectors = self.vectors[nodes]
+        # One matrix for all candidate pairs; row i updates "closest chosen neighbour" when i is picked
+        pairwise = candidate_vectors @ candidate_vectors.T
+        closest = np.full(len(nodes), -np.inf, dtype=np.float32)
+        selected: list[int] = []
+        skipped: list[int] = []
+        for i, (score, node) in enumerate(candidates):
+            if len(selected) >= m:
+                break
+            if closest[i] > score:
+                skipped.append(node)
+            else:
+                selected.append(node)
+                np.maximum(closest, pairwise[i], out=closest)
+        return selected + skipped[:m - len(selected)]
+
+    def _descend(self, query: np.ndarray, level: int) -> list[int]:
+        """Greedy walk from the entry point down to (but not into) level"""
+        entry = [self.entry]
+        for current in range(self.max_level, level, -1):
+            entry = [self._search_layer(query, entry, 1, current)[0][1]]
+        return entry
+
+    def add(self, vector: np.ndarray) -> int:
+        """Insert a vector and return its node id"""
+        node = self.count
+        self._reserve(node + 1)
+        self.vectors[node] = vector
+        self.count += 1
+        self.live += 1
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        self.links.append([[] for _ in range(level + 1)])
+        if self.entry < 0:
+            self.entry, self.max_level = node, level
+            return node
+
+        query = self.vectors[node]
+        entry = self._descend(query, level)
+        for current in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(query, entry, self.ef_construction, current)
+            neighbours = self._select(found, self.m)
+            self.links[node][current] = neighbours
+            limit = self.m0 if current == 0 else self.m
+            for neighbour in neighbours:
+                links = self.links[neighbour][current]
+                links.append(node)
+                if len(links) > limit:
+                    scores = (self.vectors[links] @ self.vectors[neighbour]).tolist()
+                    self.links[neighbour][current] = self._select(sorted(zip(scores, links), reverse=True), limit)
+            entry = [n for _, n in found]
+
+        if level > self.max_level:
+            self.entry, self.max_level = node, level
+        return node
+
+    def remove(self, node: int) -> None:
+        if not self.deleted[node]:
+            self.deleted[node] = True
+            self.live -= 1
+
+    def search(self, query: np.ndarray, k: int, ef: Optional[int] = None) -> list[tuple[float, int]]:
+        """Up to k live (score, node) pairs most similar to query, best first"""
+        if self.live == 0:
+            return []
+        ef = max(ef or self.ef_search, k)
+        entry = self._descend(query, 0)
+        while True:
+            found = self._search_layer(query, entry, ef, 0)
+            hits = [(s, n) for s, n in found if not self.deleted[n]]
+            # Tombstones take result slots; widen the beam until k live nodes come back
+            if len(hits) >= k or ef >= self.count:
+                return hits[:k]
+            ef *= 2
+
+    def compact(self) -> list[int]:
+        """Rebuild from live nodes only; returns the old id of each new node"""
+        kept = [node for node in range(self.count) if not self.deleted[node]]
+        rebuilt = HNSWIndex(self.dim, self.m, self.ef_construction, self.ef_search, seed=self._rng.randrange(2 ** 31))
+        for node in kept:
+            rebuilt.add(self.vectors[node])
+        self.__dict__.update(rebuilt.__dict__)
+        return kept
+
+    def to_arrays(self) -> dict:
+        """Flat arrays for np.savez; links are stored as per-(node, level) lengths plus one id array"""
+        lengths = [len(level) for node in self.links for level in node]
+        flat = [n for node in self.links for level in node for n in level]
+        return {
+            "params": np.array([self.dim, self.m, self.ef_construction, self.ef_search, self.entry, self.max_level]),
+            "vectors": self.vectors[:self.count].astype(np.float16),
+            "deleted": self.deleted[:self.count],
+            "levels": np.array([len(node) - 1 for node in self.links], dtype=np.int32),
+            "link_lengths": np.array(lengths, dtype=np.int32),
+            "links": np.array(flat, dtype=np.int32),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "HNSWIndex":
+        dim, m, ef_construction, ef_search, entry, max_level = (int(x) for x in arrays["params"])
+        index = cls(dim, m, ef_construction, ef_search, seed=len(arrays["levels"]))
+        count = len(arrays["levels"])
+        index._reserve(count)
+        index.vectors[:count] = arrays["vectors"]
+        index.deleted[:count] = arrays["deleted"]
+        index.count = count
+        index.live = count - int(np.count_nonzero(arrays["deleted"]))
+        index.entry, index.max_level = entry, max_level
+
+        lengths = arrays["link_lengths"].tolist()
+        flat = arrays["links"].tolist()
+        position, slot = 0, 0
+        for level in arrays["levels"].tolist():
+            node_links = []
+            for _ in range(level + 1):
+                node_links.append(flat[position:position + lengths[slot]])
+                position += lengths[slot]
+                slot += 1
+            index.links.append(node_links)
+        return index
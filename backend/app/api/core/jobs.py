@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+# A stage receives the job row and its accumulated context and returns context updates
+Stage = Callable[[dict, dict], Awaitable[dict]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class PermanentJobError(Exception):
+    """Raised by a stage when retrying cannot help (bad input, not found, ...)"""
+    def __init__(self, message: str, details: Any = None):
+        self.message = message
+        self.details = details
+        super().__init__(message)
+
+
+class JobStore:
+    """SQLite-backed job state, so queued and interrupted work survives a restart"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, stage_index INTEGER NOT NULL DEFAULT 0, stage TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_run_at REAL NOT NULL, "
+                "context TEXT NOT NULL DEFAULT '{}', last_error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, next_run_at)")
+            self._conn.commit()
+
+    def _row(self, row: Optional[sqlite3.Row]) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["context"] = json.loads(job["context"])
+        return job
+
+    def create(self, kind: str, payload: dict) -> dict:
+        now = time.time()
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, now, now, now),
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def find_active(self, kind: str, key: str, value: str) -> Optional[dict]:
+        """Latest queued/running job of this kind whose payload[key] == value"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE kind = ? AND status IN (?, ?) ORDER BY created_at DESC",
+                (kind, QUEUED, RUNNING),
+            ).fetchall()
+        for row in rows:
+            job = self._row(row)
+            if job["payload"].get(key) == value:
+                return job
+        return None
+
+    def claim_due(self) -> Optional[dict]:
+        """Atomically move the oldest due queued job to running"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND next_run_at <= ? ORDER BY next_run_at LIMIT 1",
+                (QUEUED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, now, row["id"], QUEUED),
+            )
+            self._conn.commit()
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        return self._row(job)
+
+    def update(self, job_id: str, **fields) -> None:
+        if "context" in fields:
+            fields["context"] = json.dumps(fields["context"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def requeue_interrupted(self) -> int:
+        """Jobs left running by a crashed/stopped process resume at their current stage"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, next_run_at = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, time.time(), time.time(), RUNNING),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class JobQueue:
+    """Worker pool running multi-stage jobs from a JobStore.
+
+    Each job kind is a list of named stages. Progress is saved after every
+    stage, so a retry (or a restart) resumes at the failed stage rather than
+    from scratch. A failing stage is retried with exponential backoff up to
+    max_attempts times; PermanentJobError fails the job immediately.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 2, max_attempts: int = 4,
+                 base_backoff_seconds: float = 2.0, max_backoff_seconds: float = 300.0,
+                 poll_seconds: float = 1.0):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_seconds = poll_seconds
+        self._kinds: dict[str, tuple[list[tuple[str, Stage]], Optional[Callable]]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, kind: str, stages: list[tuple[str, Stage]],
+                 on_failure: Optional[Callable[[dict, str], Awaitable[None]]] = None) -> None:
+        self._kinds[kind] = (stages, on_failure)
+
+    async def enqueue(self, kind: str, payload: dict) -> dict:
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = await asyncio.to_thread(self.store.create, kind, payload)
+        # Back on the event loop: asyncio.Event is not thread-safe, so never set it from a worker thread
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        resumed = await asyncio.to_thread(self.store.requeue_interrupted)
+        if resumed:
+            print(f"Requeued {resumed} interrupted jobs")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"Job queue started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** (attempts - 1)))
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim_due)
+            except Exception as e:
+                print(f"Job worker {index} failed to claim a job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict) -> None:
+        stages, on_failure = self._kinds[job["kind"]]
+        context = job["context"]
+        stage_index = job["stage_index"]
+        attempts = job["attempts"]
+
+        while stage_index < len(stages):
+            name, stage = stages[stage_index]
+            await asyncio.to_thread(self.store.update, job["id"], stage=name)
+            try:
+                print(f"Job {job['id']}: running stage '{name}' (attempt {attempts + 1})")
+                context.update(await stage(job, context) or {})
+            except Exception as e:
+                attempts += 1
+                error = e.message if isinstance(e, PermanentJobError) else f"{type(e).__name__}: {e}"
+                if isinstance(e, PermanentJobError) or attempts >= self.max_attempts:
+                    print(f"Job {job['id']} failed at stage '{name}': {error}")
+                    await asyncio.to_thread(
+                        self.store.update, job["id"], status=FAILED, attempts=attempts,
+                        last_error=error, context=context,
+                    )
+                    if on_failure is not None:
+                        try:
+                            await on_failure(job, error)
+                        except Exception as hook_error:
+                            print(f"Job {job['id']} failure hook error: {hook_error}")
+                    await asyncio.to_thread(remove_spool, job["id"])
+                    return
+                delay = self._backoff(attempts)
+                print(f"Job {job['id']} stage '{name}' failed ({error}), retrying in {delay:.0f}s")
+                await asyncio.to_thread(
+                    self.store.update, job["id"], status=QUEUED, attempts=attempts,
+                    next_run_at=time.time() + delay, last_error=error, context=context,
+                )
+                return
+
+            # Stage done: persist progress so a retry/restart resumes after it
+            stage_index += 1
+            attempts = 0
+            await asyncio.to_thread(
+                self.store.update, job["id"], stage_index=stage_index, attempts=0, context=context,
+            )
+
+        await asyncio.to_thread(self.store.update, job["id"], status=SUCCEEDED, stage=None)
+        await asyncio.to_thread(remove_spool, job["id"])
+        print(f"Job {job['id']} succeeded")
+
+
+def _spool_dir(job_id: str) -> str:
+    return os.path.join(os.getenv("JOB_SPOOL_DIR", "/tmp/legal-ai/jobs"), job_id)
+
+
+def spool_path(job_id: str, name: str) -> str:
+    """Path for large stage outputs (e.g. downloaded file bytes) kept outside the job row.
+
+    The job's spool directory is removed once the job succeeds or fails for good;
+    retries keep it, so a resumed stage still finds its inputs.
+    """
+    directory = _spool_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def remove_spool(job_id: str) -> None:
+    shutil.rmtree(_spool_dir(job_id), ignore_errors=True)
+
+
+_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """Get or create the process-wide job queue"""
+    global _queue
+    if _queue is None:
+        store = JobStore(os.getenv("JOB_DB_PATH", "/tmp/legal-ai/jobs.sqlite3"))
+        _queue = JobQueue(
+            store,
+            workers=int(os.getenv("JOB_WORKERS", "2")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "4")),
+            base_backoff_seconds=float(os.getenv("JOB_BACKOFF_SECONDS", "2")),
+        )
+    return _queue
+
+
+def public_job(job: dict) -> dict:
+    """Job fields safe to return to clients (context can hold the full document text)"""
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "attempts": job["attempts"],
+        "lastError": job["last_error"],
+        "createdAt": job["created_at"],
+        "updatedAt": job["updated_at"],
+        "documentId": job["payload"].get("doc_id"),
+    }
@@ -0,0 +1,155 @@
+import os
+import time
+import threading
+from typing import Any, Callable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors that will not go away by retrying the same pair (e.g. a retired model name)
+_PERMANENT_ERRORS = {"NotFound", "PermissionDenied"}
+
+
+class _PairHealth:
+    def __init__(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.successes = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.last_error: Optional[str] = None
+
+
+class ModelRouter:
+    """Routes calls across (location, model) pairs with a circuit breaker per pair.
+
+    The pair that last succeeded is tried first; the rest follow in configured
+    order. A pair that fails `failure_threshold` times in a row (or hits a
+    permanent error) is skipped for `cooldown_seconds`, after which a single
+    half-open probe decides whether it closes again. Model handles are built
+    once per pair via `factory(location, model)` and reused.
+    """
+
+    def __init__(self, locations: list[str], models: list[str], factory: Callable[[str, str], Any],
+                 failure_threshold: int = 3, cooldown_seconds: float = 60.0):
+        self.pairs = [(loc, model) for loc in locations for model in models]
+        self.factory = factory
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._health = {pair: _PairHealth() for pair in self.pairs}
+        self._handles: dict = {}
+        self._preferred: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def _ordered_pairs(self) -> list[tuple]:
+        ordered = list(self.pairs)
+        preferred = self._preferred
+        if preferred in self._health:
+            ordered.remove(preferred)
+            ordered.insert(0, preferred)
+        return ordered
+
+    def _acquire(self, pair: tuple) -> bool:
+        """Whether pair may be tried now; claims the single probe slot of a half-open pair"""
+        with self._lock:
+            health = self._health[pair]
+            if health.state == OPEN:
+                if time.monotonic() - health.opened_at < self.cooldown_seconds:
+                    return False
+                health.state = HALF_OPEN
+                health.probing = False
+            if health.state == HALF_OPEN:
+                if health.probing:
+                    return False
+                health.probing = True
+            return True
+
+    def _handle(self, pair: tuple):
+        with self._lock:
+            handle = self._handles.get(pair)
+        if handle is None:
+            handle = self.factory(*pair)
+            with self._lock:
+                self._handles[pair] = handle
+        return handle
+
+    def _record_success(self, pair: tuple, latency: float) -> None:
+        with self._lock:
+            health = self._health[pair]
+            health.state = CLOSED
+            health.probing = False
+            health.consecutive_failures = 0
+            health.successes += 1
+            health.total_latency += latency
+            self._preferred = pair
+
+    def _record_failure(self, pair: tuple, error: Exception, latency: float) -> None:
+        with self._lock:
+            health = self._health[pair]
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.total_latency += latency
+            health.last_error = f"{type(error).__name__}: {error}"[:300]
+            health.probing = False
+            if (health.state == HALF_OPEN
+                    or health.consecutive_failures >= self.failure_threshold
+                    or type(error).__name__ in _PERMANENT_ERRORS):
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+            if self._preferred == pair:
+                self._preferred = None
+
+    def call(self, fn: Callable[[Any], Any]):
+        """Run fn(model_handle) on the healthiest pair until one returns a non-empty result.
+
+        An empty result (None or "") moves on to the next pair without counting
+        as a failure. Raises the last error if every pair failed.
+        """
+        last_err: Exception | None = None
+        for pair in self._ordered_pairs():
+            if not self._acquire(pair):
+                continue
+            started = time.monotonic()
+            try:
+                result = fn(self._handle(pair))
+            except Exception as e:
+                self._record_failure(pair, e, time.monotonic() - started)
+                last_err = e
+                continue
+            if result:
+                self._record_success(pair, time.monotonic() - started)
+                return result
+            with self._lock:
+                self._health[pair].probing = False
+
+        if last_err:
+            raise last_err
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            pairs = []
+            for (loc, model), health in self._health.items():
+                calls = health.successes + health.failures
+                pairs.append({
+                    "location": loc,
+                    "model": model,
+                    "state": health.state,
+                    "successes": health.successes,
+                    "failures": health.failures,
+                    "consecutiveFailures": health.consecutive_failures,
+                    "averageLatencySeconds": (health.total_latency / calls) if calls else None,
+                    "lastError": health.last_error,
+                })
+            preferred = {"location": self._preferred[0], "model": self._preferred[1]} if self._preferred else None
+            return {"preferred": preferred, "pairs": pairs}
+
+
+def router_settings() -> dict:
+    return {
+        "failure_threshold": int(os.getenv("GEMINI_BREAKER_FAILURES", "3")),
+        "cooldown_seconds": float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "60")),
+    }
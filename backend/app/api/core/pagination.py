@@ -0,0 +1,50 @@
+import json
+import uuid
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque keyset cursor for the sort-key values of the last row on a page"""
+    raw = json.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list[str]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [str(v) for v in values]
+
+
+def decode_created_at_cursor(cursor: str) -> tuple[str, str]:
+    """(created_at, id) from a cursor, rejected unless they are an ISO timestamp and a UUID.
+
+    The values end up inside a PostgREST or= expression, so anything that
+    could carry quotes, commas or parentheses must never get that far.
+    """
+    created_at, row_id = decode_cursor(cursor, 2)
+    try:
+        # Validated, not normalized: the SQLite store compares timestamps as stored strings
+        datetime.fromisoformat(created_at)
+        row_id = str(uuid.UUID(row_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, row_id
+
+
+def created_at_filter(created_at: str, row_id: str) -> str:
+    """PostgREST or= filter selecting rows after (created_at, id) in DESC order"""
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+
+
+def after_created_at(cursor: str) -> str:
+    return created_at_filter(*decode_created_at_cursor(cursor))
+
+
+def created_at_cursor(row: dict) -> str:
+    return encode_cursor([row["created_at"], row["id"]])
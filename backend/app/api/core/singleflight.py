@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+class SingleFlight:
+    """Collapse concurrent work on the same key into one in-flight run.
+
+    The first caller for a key runs the work; callers arriving while it is
+    still running await the same result (or exception). The shared run is
+    shielded, so one caller disconnecting does not cancel it for the others.
+    Scope is this process/event loop.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def running(self, key: str) -> Optional[asyncio.Future]:
+        return self._flights.get(key)
+
+    def claim(self, key: str) -> Optional[asyncio.Future]:
+        """Register the caller as owner of key. None if another run already owns it."""
+        if key in self._flights:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting; don't let an unobserved failure log a warning
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = future
+        return future
+
+    def resolve(self, key: str, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Publish the owner's outcome to attached callers and release the key"""
+        future = self._flights.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Start fn as the run for key (or join the one in flight) without waiting for it.
+
+        The run is a task of its own, so it finishes even if every caller goes
+        away; the returned future carries its result or exception.
+        """
+        existing = self.running(key)
+        if existing is not None:
+            print(f"Attaching to in-flight run for {key}")
+            return existing
+
+        flight = self.claim(key)
+
+        async def run():
+            try:
+                result = await fn()
+            except BaseException as e:
+                self.resolve(key, error=e)
+                return
+            self.resolve(key, result)
+
+        task = asyncio.ensure_future(run())
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return flight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await asyncio.shield(self.start(key, fn))
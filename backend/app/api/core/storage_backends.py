@@ -0,0 +1,404 @@
+import os
+import json
+import uuid
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional
+
+# (created_at, id) of the last row on the previous page; see core/pagination
+After = tuple[str, str]
+
+
+class DocumentStore(ABC):
+    """Persistence for `documents` rows. Rows are plain dicts with the Supabase column names."""
+
+    @abstractmethod
+    async def get(self, doc_id: str, columns: str = "*") -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def list_for_user(self, user_id: str, columns: str, limit: Optional[int] = None,
+                            status: Optional[str] = None, metadata: Optional[dict] = None,
+                            after: Optional[After] = None) -> list[dict]:
+        """Newest first ((created_at, id) DESC); metadata matches by JSON containment"""
+
+    @abstractmethod
+    async def list_for_users(self, user_ids: list[str], columns: str) -> list[dict]:
+        """Every document of the given users, newest first"""
+
+    @abstractmethod
+    async def list_all(self, columns: str, limit: int, status: Optional[str] = None,
+                       user_id: Optional[str] = None, after: Optional[After] = None) -> list[dict]:
+        """A page of all users' documents, newest first ((created_at, id) DESC)"""
+
+    @abstractmethod
+    async def find_by_file_name(self, user_id: str, file_name: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def insert(self, row: dict) -> dict:
+        """Insert a row; id and created_at are assigned by the store if missing"""
+
+    @abstractmethod
+    async def update(self, doc_id: str, fields: dict) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def delete(self, doc_id: str) -> None:
+        ...
+
+
+class BlobStore(ABC):
+    """Storage for the uploaded files, addressed by bucket-relative path"""
+
+    @abstractmethod
+    async def upload(self, path: str, data: bytes, content_type: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def download(self, path: str) -> bytes:
+        """Raises FileNotFoundError if the object does not exist"""
+
+    @abstractmethod
+    async def delete(self, path: str) -> None:
+        ...
+
+    @abstractmethod
+    async def signed_url(self, path: str, expires_in: int) -> str:
+        ...
+
+
+class ActivityStore(ABC):
+    """Persistence for `user_activity` rows (user_id, email, last_login, login_count)"""
+
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def insert(self, row: dict) -> dict:
+        ...
+
+    @abstractmethod
+    async def update(self, user_id: str, fields: dict) -> list[dict]:
+        ...
+
+
+def _project(row: dict, columns: str) -> dict:
+    if columns.strip() == "*":
+        return dict(row)
+    return {name: row.get(name) for name in (c.strip() for c in columns.split(","))}
+
+
+def _contains(value, expected) -> bool:
+    # Same semantics as Postgres jsonb @> for the shapes we store
+    if isinstance(expected, dict):
+        return isinstance(value, dict) and all(k in value and _contains(value[k], v) for k, v in expected.items())
+    if isinstance(expected, list):
+        return isinstance(value, list) and all(any(_contains(v, e) for v in value) for e in expected)
+    return value == expected
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """Local document store: one SQLite table, the full row kept as JSON.
+
+    The columns used for filtering and ordering are stored alongside so list
+    queries use an index, as they do on Postgres, and so SQLiteAdminAggregates
+    can run over the same file.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, status TEXT, "
+                "created_at TEXT NOT NULL, size_bytes INTEGER, data TEXT NOT NULL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+            if "size_bytes" not in columns:
+                # Databases created before the admin aggregates read this table
+                self._conn.execute("ALTER TABLE documents ADD COLUMN size_bytes INTEGER")
+                self._conn.execute("UPDATE documents SET size_bytes = json_extract(data, '$.size_bytes')")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_user_created ON documents (user_id, created_at DESC, id DESC)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_created ON documents (created_at DESC, id DESC)"
+            )
+            self._conn.commit()
+
+    def _get(self, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _list(self, user_ids: Optional[list[str]], status: Optional[str], after: Optional[After],
+              limit: Optional[int] = None) -> list[dict]:
+        clauses, params = [], []
+        if user_ids is not None:
+            clauses.append(f"user_id IN ({', '.join('?' * len(user_ids))})")
+            params += user_ids
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if after:
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params += [after[0], after[0], after[1]]
+        sql = "SELECT data FROM documents"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _write(self, row: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (id, user_id, status, created_at, size_bytes, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (row["id"], row["user_id"], row.get("status"), row["created_at"], row.get("size_bytes"),
+                 json.dumps(row)),
+            )
+            self._conn.commit()
+
+    def _delete(self, doc_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self._conn.commit()
+
+    async def get(self, doc_id: str, columns: str = "*") -> Optional[dict]:
+        row = await asyncio.to_thread(self._get, doc_id)
+        return _project(row, columns) if row is not None else None
+
+    async def list_for_user(self, user_id: str, columns: str, limit: Optional[int] = None,
+                            status: Optional[str] = None, metadata: Optional[dict] = None,
+                            after: Optional[After] = None) -> list[dict]:
+        rows = await asyncio.to_thread(self._list, [user_id], status, after)
+        if metadata:
+            rows = [row for row in rows if _contains(row.get("document_metadata"), metadata)]
+        if limit is not None:
+            rows = rows[:limit]
+        return [_project(row, columns) for row in rows]
+
+    async def list_for_users(self, user_ids: list[str], columns: str) -> list[dict]:
+        if not user_ids:
+            return []
+        rows = await asyncio.to_thread(self._list, user_ids, None, None)
+        return [_project(row, columns) for row in rows]
+
+    async def list_all(self, columns: str, limit: int, status: Optional[str] = None,
+                       user_id: Optional[str] = None, after: Optional[After] = None) -> list[dict]:
+        rows = await asyncio.to_thread(self._list, [user_id] if user_id else None, status, after, limit)
+        return [_project(row, columns) for row in rows]
+
+    async def find_by_file_name(self, user_id: str, file_name: str) -> Optional[dict]:
+        rows = await asyncio.to_thread(self._list, [user_id], None, None)
+        return next((row for row in rows if row.get("file_name") == file_name), None)
+
+    async def insert(self, row: dict) -> dict:
+        row = {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            **row,
+        }
+        await asyncio.to_thread(self._write, row)
+        return row
+
+    async def update(self, doc_id: str, fields: dict) -> list[dict]:
+        row = await asyncio.to_thread(self._get, doc_id)
+        if row is None:
+            return []
+        row.update(fields)
+        await asyncio.to_thread(self._write, row)
+        return [row]
+
+    async def delete(self, doc_id: str) -> None:
+        await asyncio.to_thread(self._delete, doc_id)
+
+
+class SQLiteActivityStore(ActivityStore):
+    """Local `user_activity` table, plain columns so the admin aggregates can join it"""
+
+    _COLUMNS = ("user_id", "email", "last_login", "login_count")
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_activity ("
+                "user_id TEXT PRIMARY KEY, email TEXT, last_login TEXT, login_count INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.commit()
+
+    def _get(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM user_activity WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return dict(zip(self._COLUMNS, row)) if row else None
+
+    def _write(self, row: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO user_activity ({', '.join(self._COLUMNS)}) VALUES (?, ?, ?, ?)",
+                tuple(row.get(name) for name in self._COLUMNS),
+            )
+            self._conn.commit()
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, user_id)
+
+    async def insert(self, row: dict) -> dict:
+        row = {"login_count": 0, **{name: row[name] for name in self._COLUMNS if name in row}}
+        await asyncio.to_thread(self._write, row)
+        return row
+
+    async def update(self, user_id: str, fields: dict) -> list[dict]:
+        row = await asyncio.to_thread(self._get, user_id)
+        if row is None:
+            return []
+        row.update({name: fields[name] for name in self._COLUMNS if name in fields and name != "user_id"})
+        await asyncio.to_thread(self._write, row)
+        return [row]
+
+
+class LocalBlobStore(BlobStore):
+    """Files under a local directory, at the same relative paths as in the bucket"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise ValueError(f"Path escapes blob root: {path}")
+        return full
+
+    def _write(self, path: str, data: bytes) -> None:
+        full = self._path(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        tmp = f"{full}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, full)
+
+    def _read(self, path: str) -> bytes:
+        with open(self._path(path), "rb") as f:
+            return f.read()
+
+    async def upload(self, path: str, data: bytes, content_type: Optional[str] = None) -> None:
+        await asyncio.to_thread(self._write, path, data)
+
+    async def download(self, path: str) -> bytes:
+        return await asyncio.to_thread(self._read, path)
+
+    async def delete(self, path: str) -> None:
+        try:
+            await asyncio.to_thread(os.remove, self._path(path))
+        except FileNotFoundError:
+            pass
+
+    async def signed_url(self, path: str, expires_in: int) -> str:
+        return f"file://{self._path(path)}"
+
+
+class SupabaseBlobStore(BlobStore):
+    """Supabase Storage bucket (sync SDK calls run off the event loop)"""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def _bucket(self):
+        from app.api.core.supabase import supabase
+        return supabase.storage.from_(self.bucket)
+
+    async def upload(self, path: str, data: bytes, content_type: Optional[str] = None) -> None:
+        options = {"content-type": content_type} if content_type else None
+        await asyncio.to_thread(self._bucket().upload, path=path, file=data, file_options=options)
+
+    async def download(self, path: str) -> bytes:
+        try:
+            data = await asyncio.to_thread(self._bucket().download, path)
+        except Exception as e:
+            if "not found" in str(e).lower():
+                raise FileNotFoundError(path) from e
+            raise
+        if not data:
+            raise FileNotFoundError(path)
+        return bytes(data)
+
+    async def delete(self, path: str) -> None:
+        await asyncio.to_thread(self._bucket().remove, [path])
+
+    async def signed_url(self, path: str, expires_in: int) -> str:
+        signed = await asyncio.to_thread(self._bucket().create_signed_url, path, expires_in)
+        if isinstance(signed, dict):
+            return signed.get("signed_url") or signed.get("signedURL")
+        return signed
+
+
+_document_store: Optional[DocumentStore] = None
+_blob_store: Optional[BlobStore] = None
+_activity_store: Optional[ActivityStore] = None
+
+
+def storage_backend() -> str:
+    return os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+
+def local_database_path() -> str:
+    """SQLite file holding the local `documents` and `user_activity` tables"""
+    return os.path.join(os.getenv("LOCAL_STORAGE_DIR", "/tmp/legal-ai/storage"), "documents.sqlite3")
+
+
+def get_document_store() -> DocumentStore:
+    """Document rows: Supabase, or SQLite under LOCAL_STORAGE_DIR with STORAGE_BACKEND=local"""
+    global _document_store
+    if _document_store is None:
+        if storage_backend() == "local":
+            _document_store = SQLiteDocumentStore(local_database_path())
+        else:
+            from app.api.core.supabase_async import documents_repo
+            _document_store = documents_repo()
+    return _document_store
+
+
+def get_blob_store() -> BlobStore:
+    """Uploaded files: the SUPABASE_BUCKET bucket, or LOCAL_STORAGE_DIR/blobs with STORAGE_BACKEND=local"""
+    global _blob_store
+    if _blob_store is None:
+        if storage_backend() == "local":
+            root = os.getenv("LOCAL_STORAGE_DIR", "/tmp/legal-ai/storage")
+            _blob_store = LocalBlobStore(os.path.join(root, "blobs"))
+        else:
+            _blob_store = SupabaseBlobStore(os.getenv("SUPABASE_BUCKET", "uploads"))
+    return _blob_store
+
+
+def get_activity_store() -> ActivityStore:
+    """Login activity: Supabase, or the local SQLite database with STORAGE_BACKEND=local"""
+    global _activity_store
+    if _activity_store is None:
+        if storage_backend() == "local":
+            _activity_store = SQLiteActivityStore(local_database_path())
+        else:
+            from app.api.core.supabase_async import user_activity_repo
+            _activity_store = user_activity_repo()
+    return _activity_store
@@ -0,0 +1,81 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from typing import Optional
+from fastapi import HTTPException
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class StreamTickets:
+    """Short-lived, single-use tickets that open one kind of event stream for one user.
+
+    EventSource cannot send an Authorization header, and a Firebase ID token in
+    the URL would land in access logs, proxies and browser history while still
+    valid for an hour against every endpoint. A ticket is minted by an
+    authenticated POST instead: it names its purpose, expires after ttl_seconds
+    and is HMAC-signed, so any instance sharing the secret can check it.
+    Redeemed tickets are remembered until they expire, so each opens one
+    stream (per process).
+    """
+
+    def __init__(self, secret: bytes, ttl_seconds: float = 60.0):
+        self._secret = secret
+        self.ttl_seconds = ttl_seconds
+        self._redeemed: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _sign(self, body: str) -> str:
+        return _b64(hmac.new(self._secret, body.encode("ascii"), hashlib.sha256).digest())
+
+    def mint(self, uid: str, purpose: str) -> str:
+        claims = {"uid": uid, "purpose": purpose, "exp": time.time() + self.ttl_seconds,
+                  "nonce": secrets.token_urlsafe(12)}
+        body = _b64(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{body}.{self._sign(body)}"
+
+    def redeem(self, ticket: str, purpose: str) -> str:
+        """uid the ticket was minted for; 401 if it is forged, expired, reused or for another purpose"""
+        try:
+            body, signature = ticket.split(".")
+            valid = hmac.compare_digest(signature, self._sign(body))
+            claims = json.loads(_unb64(body)) if valid else None
+        except Exception:
+            claims = None
+        now = time.time()
+        if not claims or claims.get("purpose") != purpose or claims.get("exp", 0) < now:
+            raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+
+        with self._lock:
+            self._redeemed = {nonce: exp for nonce, exp in self._redeemed.items() if exp >= now}
+            if claims["nonce"] in self._redeemed:
+                raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+            self._redeemed[claims["nonce"]] = claims["exp"]
+        return claims["uid"]
+
+
+_tickets: Optional[StreamTickets] = None
+
+
+def get_stream_tickets() -> StreamTickets:
+    """Process-wide ticket issuer (STREAM_TICKET_SECRET, STREAM_TICKET_TTL_SECONDS)"""
+    global _tickets
+    if _tickets is None:
+        secret = os.getenv("STREAM_TICKET_SECRET")
+        if not secret:
+            # Fine for one instance; behind a load balancer every instance needs the same secret
+            print("STREAM_TICKET_SECRET not set; stream tickets only work on the instance that minted them")
+            secret = secrets.token_hex(32)
+        _tickets = StreamTickets(secret.encode("utf-8"), float(os.getenv("STREAM_TICKET_TTL_SECONDS", "60")))
+    return _tickets
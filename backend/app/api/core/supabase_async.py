@@ -0,0 +1,228 @@
+import os
+import json
+from typing import Any, Optional
+import httpx
+from app.api.core.pagination import created_at_filter
+from app.api.core.storage_backends import ActivityStore, After, DocumentStore
+
+# httpx only speaks HTTP/2 when the h2 package is installed
+try:
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# PostgREST query params: (column, "op.value") pairs, e.g. ("id", "eq.123")
+Filters = list[tuple[str, str]]
+
+# Rows asked for per request when reading an unbounded result; at most PostgREST's max-rows
+LIST_PAGE_ROWS = int(os.getenv("SUPABASE_LIST_PAGE_ROWS", "1000"))
+
+
+class AsyncSupabaseError(Exception):
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.message = message
+        super().__init__(f"Supabase request failed ({status_code}): {message}")
+
+
+class AsyncPostgrest:
+    """Minimal async PostgREST client on one pooled, keep-alive httpx connection pool.
+
+    Unlike the sync supabase client (which blocks a threadpool worker per call),
+    requests here are awaited on the event loop, and connections are reused
+    across requests. HTTP/2 is used when `h2` is installed and enabled.
+    """
+
+    def __init__(self, url: str, key: str, pool_size: int = 20, keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30.0, timeout_seconds: float = 10.0,
+                 connect_timeout_seconds: float = 5.0, http2: bool = True):
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds),
+        )
+
+    async def _request(self, method: str, path: str, params: Optional[Filters] = None,
+                       body: Any = None, prefer: Optional[str] = None) -> Any:
+        headers = {"Prefer": prefer} if prefer else {}
+        response = await self._client.request(method, path, params=params, json=body, headers=headers)
+        if response.status_code >= 400:
+            raise AsyncSupabaseError(response.status_code, response.text[:500])
+        if not response.content:
+            return None
+        return response.json()
+
+    async def select(self, table: str, columns: str = "*", filters: Optional[Filters] = None,
+                     order: Optional[str] = None, limit: Optional[int] = None) -> list[dict]:
+        params: Filters = [("select", columns), *(filters or [])]
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        return await self._request("GET", f"/{table}", params=params) or []
+
+    async def insert(self, table: str, row: dict) -> list[dict]:
+        return await self._request("POST", f"/{table}", body=row, prefer="return=representation") or []
+
+    async def update(self, table: str, fields: dict, filters: Filters) -> list[dict]:
+        return await self._request("PATCH", f"/{table}", params=filters, body=fields,
+                                   prefer="return=representation") or []
+
+    async def delete(self, table: str, filters: Filters) -> None:
+        await self._request("DELETE", f"/{table}", params=filters)
+
+    async def rpc(self, function: str, params: dict) -> Any:
+        return await self._request("POST", f"/rpc/{function}", body=params)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class DocumentsRepository(DocumentStore):
+    """Async access to the `documents` table (the Supabase DocumentStore)"""
+
+    table = "documents"
+
+    def __init__(self, db: AsyncPostgrest):
+        self.db = db
+
+    async def get(self, doc_id: str, columns: str = "*") -> Optional[dict]:
+        rows = await self.db.select(self.table, columns, [("id", f"eq.{doc_id}")], limit=1)
+        return rows[0] if rows else None
+
+    async def _newest_first(self, columns: str, filters: Filters, limit: Optional[int],
+                            after: Optional[After] = None) -> list[dict]:
+        """Rows matching filters in (created_at, id) DESC order, starting after `after`.
+
+        Without a limit the rows are read in keyset pages: PostgREST silently caps
+        one response (1000 rows by default).
+        """
+        if limit is not None:
+            if after:
+                filters = [*filters, ("or", f"({created_at_filter(*after)})")]
+            return await self.db.select(self.table, columns, filters, order="created_at.desc,id.desc", limit=limit)
+
+        requested = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        select = columns if requested is None else ",".join(dict.fromkeys(requested + ["created_at", "id"]))
+        rows = []
+        while True:
+            page_filters = filters if not after else [*filters, ("or", f"({created_at_filter(*after)})")]
+            page = await self.db.select(self.table, select, page_filters, order="created_at.desc,id.desc",
+                                        limit=LIST_PAGE_ROWS)
+            # Only an empty page ends the scan; a short one may just be the server's cap
+            if not page:
+                break
+            rows += page
+            after = (page[-1]["created_at"], page[-1]["id"])
+        if requested is not None:
+            rows = [{name: row.get(name) for name in requested} for row in rows]
+        return rows
+
+    async def list_for_user(self, user_id: str, columns: str, limit: Optional[int] = None,
+                            status: Optional[str] = None, metadata: Optional[dict] = None,
+                            after: Optional[After] = None) -> list[dict]:
+        filters: Filters = [("user_id", f"eq.{user_id}")]
+        if status:
+            filters.append(("status", f"eq.{status}"))
+        if metadata:
+            filters.append(("document_metadata", f"cs.{json.dumps(metadata)}"))
+        return await self._newest_first(columns, filters, limit, after)
+
+    async def list_for_users(self, user_ids: list[str], columns: str) -> list[dict]:
+        if not user_ids:
+            return []
+        quoted = ",".join(f'"{user_id}"' for user_id in user_ids)
+        return await self._newest_first(columns, [("user_id", f"in.({quoted})")], None)
+
+    async def list_all(self, columns: str, limit: int, status: Optional[str] = None,
+                       user_id: Optional[str] = None, after: Optional[After] = None) -> list[dict]:
+        filters: Filters = []
+        if status:
+            filters.append(("status", f"eq.{status}"))
+        if user_id:
+            filters.append(("user_id", f"eq.{user_id}"))
+        if after:
+            filters.append(("or", f"({created_at_filter(*after)})"))
+        return await self.db.select(self.table, columns, filters, order="created_at.desc,id.desc", limit=limit)
+
+    async def find_by_file_name(self, user_id: str, file_name: str) -> Optional[dict]:
+        rows = await self.db.select(
+            self.table, "*", [("user_id", f"eq.{user_id}"), ("file_name", f"eq.{file_name}")], limit=1,
+        )
+        return rows[0] if rows else None
+
+    async def insert(self, row: dict) -> dict:
+        return (await self.db.insert(self.table, row))[0]
+
+    async def update(self, doc_id: str, fields: dict) -> list[dict]:
+        return await self.db.update(self.table, fields, [("id", f"eq.{doc_id}")])
+
+    async def delete(self, doc_id: str) -> None:
+        await self.db.delete(self.table, [("id", f"eq.{doc_id}")])
+
+
+class UserActivityRepository(ActivityStore):
+    """Async access to the `user_activity` table (the Supabase ActivityStore)"""
+
+    table = "user_activity"
+
+    def __init__(self, db: AsyncPostgrest):
+        self.db = db
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        rows = await self.db.select(self.table, "*", [("user_id", f"eq.{user_id}")], limit=1)
+        return rows[0] if rows else None
+
+    async def insert(self, row: dict) -> dict:
+        return (await self.db.insert(self.table, row))[0]
+
+    async def update(self, user_id: str, fields: dict) -> list[dict]:
+        return await self.db.update(self.table, fields, [("user_id", f"eq.{user_id}")])
+
+
+_db: Optional[AsyncPostgrest] = None
+
+
+def get_async_postgrest() -> AsyncPostgrest:
+    """Get or create the process-wide async PostgREST client (SUPABASE_POOL_* / SUPABASE_*_TIMEOUT_SECONDS)"""
+    global _db
+    if _db is None:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in environment")
+        _db = AsyncPostgrest(
+            url,
+            key,
+            pool_size=int(os.getenv("SUPABASE_POOL_SIZE", "20")),
+            keepalive_connections=int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY_SECONDS", "30")),
+            timeout_seconds=float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10")),
+            connect_timeout_seconds=float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "5")),
+            http2=os.getenv("SUPABASE_HTTP2", "true").lower() == "true",
+        )
+        print(f"Async Supabase client initialized (http2={_db.http2})")
+    return _db
+
+
+def documents_repo() -> DocumentsRepository:
+    return DocumentsRepository(get_async_postgrest())
+
+
+def user_activity_repo() -> UserActivityRepository:
+    return UserActivityRepository(get_async_postgrest())
+
+
+async def close_async_postgrest() -> None:
+    global _db
+    if _db is not None:
+        await _db.aclose()
+        _db = None
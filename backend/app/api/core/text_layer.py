@@ -0,0 +1,54 @@
+import io
+import os
+import unicodedata
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+    PdfReader = None
+
+
+def text_layer_enabled() -> bool:
+    return PYPDF_AVAILABLE and os.getenv("PDF_TEXT_LAYER_FAST_PATH", "true").lower() in ("1", "true", "yes")
+
+
+def extract_pdf_pages(file_bytes: bytes) -> list[str] | None:
+    """Extract the embedded text layer of each PDF page. None if the PDF can't be read."""
+    if not PYPDF_AVAILABLE:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(file_bytes))
+        pages = []
+        for page in reader.pages:
+            try:
+                pages.append(page.extract_text() or "")
+            except Exception as e:
+                print(f"Text layer extraction failed for a page: {e}")
+                pages.append("")
+        return pages
+    except Exception as e:
+        print(f"Could not read PDF text layer: {e}")
+        return None
+
+
+def _is_garbage(ch: str) -> bool:
+    if ch in "\n\r\t":
+        return False
+    if ch == "\ufffd":
+        return True
+    # Control, private-use, surrogate and unassigned code points come from broken font maps
+    return unicodedata.category(ch) in ("Cc", "Co", "Cs", "Cn")
+
+
+def page_has_usable_text(text: str) -> bool:
+    """Heuristic: enough characters and few garbage glyphs means OCR isn't needed"""
+    min_chars = int(os.getenv("PDF_TEXT_MIN_CHARS_PER_PAGE", "100"))
+    max_garbage = float(os.getenv("PDF_TEXT_MAX_GARBAGE_RATIO", "0.1"))
+
+    stripped = text.strip()
+    if len(stripped) < min_chars:
+        return False
+    garbage = sum(1 for ch in stripped if _is_garbage(ch))
+    return garbage / len(stripped) <= max_garbage
@@ -0,0 +1,84 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class VerifiedTokenCache:
+    """LRU of already-verified ID tokens, keyed by the token's SHA-256.
+
+    A decoded token is reused until its `exp` minus `skew_seconds`, so a cache
+    hit never outlives the token itself. With `recheck_seconds` set (used when
+    revocation checks are on), entries are also re-verified at least that often.
+    """
+
+    def __init__(self, max_entries: int = 1024, skew_seconds: float = 30.0,
+                 recheck_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.skew_seconds = skew_seconds
+        self.recheck_seconds = recheck_seconds
+        # token hash -> (valid_until, decoded claims)
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                valid_until, decoded = entry
+                if time.time() < valid_until:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return decoded
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, token: str, decoded: dict) -> None:
+        exp = decoded.get("exp")
+        if not exp:
+            return
+        valid_until = float(exp) - self.skew_seconds
+        if self.recheck_seconds is not None:
+            valid_until = min(valid_until, time.time() + self.recheck_seconds)
+        if valid_until <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (valid_until, decoded)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def verify(self, token: str, verifier: Callable[[str], dict]) -> dict:
+        """Decoded claims for token, calling verifier only on a cache miss"""
+        decoded = self.get(token)
+        if decoded is None:
+            decoded = verifier(token)
+            self.put(token, decoded)
+        return decoded
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+                "revocationRecheckSeconds": self.recheck_seconds,
+            }
@@ -0,0 +1,190 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.api.core.hnsw import HNSWIndex
+
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", "/tmp/legal-ai/ann")
+# Rebuild the graph once tombstones outnumber this share of its nodes
+_COMPACT_RATIO = 0.3
+
+
+class UserVectorIndex:
+    """One user's chunk vectors across all their documents, in an HNSW graph.
+
+    Node i of the graph is chunk `node_chunk[i]` of document `node_doc[i]`.
+    Re-adding a document replaces its chunks; vectors from a different
+    embedding model reset the index, since they live in another space.
+    Documents without any chunks (e.g. blank scans) are recorded as indexed
+    but never touch the graph.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.model: Optional[str] = None
+        self.graph: Optional[HNSWIndex] = None
+        self.node_doc: list[str] = []
+        self.node_chunk: list[int] = []
+        self.doc_nodes: dict[str, list[int]] = {}
+
+    def documents(self, model: str) -> set[str]:
+        # Vectors from another model are as good as missing: adding them anew resets the index
+        return set(self.doc_nodes) if model == self.model else set()
+
+    def _reset(self, model: str, dim: int) -> None:
+        self.model = model
+        self.graph = HNSWIndex(
+            dim,
+            m=int(os.getenv("ANN_M", "16")),
+            ef_construction=int(os.getenv("ANN_EF_CONSTRUCTION", "100")),
+            ef_search=int(os.getenv("ANN_EF_SEARCH", "32")),
+        )
+        self.node_doc, self.node_chunk, self.doc_nodes = [], [], {}
+
+    def add_document(self, doc_id: str, vectors: np.ndarray, model: str) -> None:
+        if len(vectors) == 0:
+            # An empty matrix may not even carry the model's width, so it must not decide a reset
+            if self.model is not None and model != self.model:
+                return
+            self.model = model
+            self.remove_document(doc_id)
+            self.doc_nodes[doc_id] = []
+            return
+        if self.graph is None or model != self.model or vectors.shape[1] != self.graph.dim:
+            if self.graph is not None:
+                print(f"ANN index for user {self.user_id}: embedding model changed, starting over")
+            self._reset(model, vectors.shape[1])
+        self.remove_document(doc_id)
+        nodes = []
+        for chunk, vector in enumerate(vectors):
+            nodes.append(self.graph.add(vector))
+            self.node_doc.append(doc_id)
+            self.node_chunk.append(chunk)
+        self.doc_nodes[doc_id] = nodes
+
+    def remove_document(self, doc_id: str) -> bool:
+        nodes = self.doc_nodes.pop(doc_id, None)
+        if nodes is None:
+            return False
+        if not nodes:
+            return True
+        for node in nodes:
+            self.graph.remove(node)
+        if self.graph.count - self.graph.live > _COMPACT_RATIO * self.graph.count:
+            self._compact()
+        return True
+
+    def _compact(self) -> None:
+        kept = self.graph.compact()
+        self.node_doc = [self.node_doc[old] for old in kept]
+        self.node_chunk = [self.node_chunk[old] for old in kept]
+        self.doc_nodes = {doc_id: [] for doc_id in self._empty_documents()}
+        for node, doc_id in enumerate(self.node_doc):
+            self.doc_nodes.setdefault(doc_id, []).append(node)
+
+    def search(self, query: np.ndarray, k: int, model: str) -> list[dict]:
+        if self.graph is None or model != self.model:
+            return []
+        return [
+            {"document_id": self.node_doc[node], "chunk": self.node_chunk[node], "score": score}
+            for score, node in self.graph.search(query, k)
+        ]
+
+    def _empty_documents(self) -> list[str]:
+        return [doc_id for doc_id, nodes in self.doc_nodes.items() if not nodes]
+
+    def _path(self) -> str:
+        return os.path.join(ANN_INDEX_DIR, f"{self.user_id}.npz")
+
+    def save(self) -> None:
+        if self.model is None:
+            return
+        os.makedirs(ANN_INDEX_DIR, exist_ok=True)
+        # np.savez appends .npz unless the name already ends with it
+        tmp = self._path() + ".tmp.npz"
+        np.savez(
+            tmp,
+            model=np.array(self.model),
+            node_doc=np.array(self.node_doc, dtype=str),
+            node_chunk=np.array(self.node_chunk, dtype=np.int32),
+            empty_docs=np.array(self._empty_documents(), dtype=str),
+            **(self.graph.to_arrays() if self.graph is not None else {}),
+        )
+        os.replace(tmp, self._path())
+
+    @classmethod
+    def load(cls, user_id: str) -> "UserVectorIndex":
+        index = cls(user_id)
+        try:
+            arrays = np.load(index._path())
+        except (OSError, ValueError):
+            return index
+        with arrays:
+            index.model = str(arrays["model"])
+            if "params" in arrays.files:
+                index.graph = HNSWIndex.from_arrays(arrays)
+            index.node_doc = arrays["node_doc"].tolist()
+            index.node_chunk = arrays["node_chunk"].tolist()
+            if "empty_docs" in arrays.files:
+                index.doc_nodes = {doc_id: [] for doc_id in arrays["empty_docs"].tolist()}
+        for node, doc_id in enumerate(index.node_doc):
+            if not index.graph.deleted[node]:
+                index.doc_nodes.setdefault(doc_id, []).append(node)
+        return index
+
+
+_indexes: "OrderedDict[str, UserVectorIndex]" = OrderedDict()
+_user_locks: dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def _max_loaded_users() -> int:
+    return int(os.getenv("ANN_LOADED_USERS", "32"))
+
+
+def _user_lock(user_id: str) -> threading.Lock:
+    with _registry_lock:
+        return _user_locks.setdefault(user_id, threading.Lock())
+
+
+def _get(user_id: str) -> UserVectorIndex:
+    # Caller holds the user's lock
+    with _registry_lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+            return index
+    index = UserVectorIndex.load(user_id)
+    with _registry_lock:
+        _indexes[user_id] = index
+        while len(_indexes) > _max_loaded_users():
+            _indexes.popitem(last=False)
+    return index
+
+
+def add_to_user_index(user_id: str, doc_id: str, vectors: np.ndarray, model: str) -> None:
+    """Insert (or replace) a document's chunk vectors in its owner's index and persist it"""
+    with _user_lock(user_id):
+        index = _get(user_id)
+        index.add_document(doc_id, vectors, model)
+        index.save()
+
+
+def remove_from_user_index(user_id: str, doc_id: str) -> None:
+    with _user_lock(user_id):
+        index = _get(user_id)
+        if index.remove_document(doc_id):
+            index.save()
+
+
+def user_index_documents(user_id: str, model: str) -> set[str]:
+    with _user_lock(user_id):
+        return _get(user_id).documents(model)
+
+
+def search_user_index(user_id: str, query: np.ndarray, k: int, model: str) -> list[dict]:
+    with _user_lock(user_id):
+        return _get(user_id).search(query, k, model)
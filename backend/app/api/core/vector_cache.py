@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional
+
+import numpy as np
+
+_DIGEST_BYTES = 32
+_DTYPE = np.dtype(np.float16)
+
+
+def content_key(*parts: str) -> bytes:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).digest()
+
+
+class VectorCache:
+    """Append-only, memory-mapped store of fixed-dimension vectors keyed by content hash.
+
+    Two files grow in lockstep: `vectors.f16` holds row-major float16 rows and
+    `keys.idx` the 32-byte digest of row i at offset 32 * i. Rows are never
+    rewritten, so readers map the vector file and only remap when it grows.
+    A crash between the two appends leaves one file longer than the other;
+    opening truncates both to the rows they agree on.
+    """
+
+    def __init__(self, directory: str, dim: Optional[int] = None):
+        self.directory = directory
+        self.dim = dim
+        self._vectors_path = os.path.join(directory, "vectors.f16")
+        self._keys_path = os.path.join(directory, "keys.idx")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._rows: dict[bytes, int] = {}
+        self._count = 0
+        self._map: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._opened = False
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self) -> None:
+        if self._opened:
+            return
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                stored_dim = json.load(f)["dim"]
+            if self.dim is not None and self.dim != stored_dim:
+                raise ValueError(f"Vector cache {self.directory} holds dim {stored_dim}, not {self.dim}")
+            self.dim = stored_dim
+        if self.dim is None:
+            # Nothing stored yet and no dimension known: stay empty until the first put
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self._meta_path):
+            with open(self._meta_path, "w") as f:
+                json.dump({"dim": self.dim}, f)
+        row_bytes = self.dim * _DTYPE.itemsize
+        key_bytes = os.path.getsize(self._keys_path) if os.path.exists(self._keys_path) else 0
+        vector_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        count = min(key_bytes // _DIGEST_BYTES, vector_bytes // row_bytes)
+        for path, size in ((self._keys_path, count * _DIGEST_BYTES), (self._vectors_path, count * row_bytes)):
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+        with open(self._keys_path, "rb") as f:
+            keys = f.read()
+        self._rows = {keys[i * _DIGEST_BYTES:(i + 1) * _DIGEST_BYTES]: i for i in range(count)}
+        self._count = count
+        self._opened = True
+
+    def _mapped(self) -> np.memmap:
+        if self._map is None or len(self._map) < self._count:
+            self._map = np.memmap(self._vectors_path, dtype=_DTYPE, mode="r", shape=(self._count, self.dim))
+        return self._map
+
+    def stored_dim(self) -> Optional[int]:
+        with self._lock:
+            self._open()
+            return self.dim
+
+    def get_many(self, keys: list[bytes]) -> tuple[Optional[np.ndarray], list[int]]:
+        """Cached rows for keys as float32 (None if the cache is empty) and the positions that missed"""
+        with self._lock:
+            self._open()
+            rows = [self._rows.get(key) for key in keys]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            if self._count == 0:
+                return None, missing
+            out = np.zeros((len(keys), self.dim), dtype=np.float32)
+            found = [i for i, row in enumerate(rows) if row is not None]
+            if found:
+                out[found] = self._mapped()[[rows[i] for i in found]]
+            return out, missing
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        """Append rows for keys not already stored (vectors are stored as float16)"""
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            self._open()
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+            block = np.asarray(list(new.values()), dtype=_DTYPE)
+            # Vectors first: a row without its key is dropped on open, a key without its row would be wrong
+            with open(self._vectors_path, "ab") as f:
+                f.write(block.tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(new))
+            for key in new:
+                self._rows[key] = self._count
+                self._count += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._count,
+                "dim": self.dim,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+            }
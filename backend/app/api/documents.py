@@ -1,110 +1,44 @@
 import os
-import io
+import json
+import asyncio
 import uuid
 from datetime import datetime
-from fastapi import APIRouter, Header, HTTPException
+from typing import Callable
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from app.api.core.firebase_admin import get_current_user_from_auth_header
-from app.api.core.documentai_client import process_document_bytes, DocumentAIError
-from app.api.core.gemini import summarize_with_gemini
-from app.api.core.supabase import supabase  #wrapper we created
+from app.api.core.documentai_client import process_document_bytes_async, DocumentAIError
+from app.api.core.gemini import (
+    summarize_with_gemini,
+    analyze_document_with_gemini,
+    stream_document_analysis,
+    parse_analysis_response,
+    default_metadata,
+)
+from app.api.core.singleflight import SingleFlight
+from app.api.core.jobs import JobQueue, PermanentJobError, get_job_queue, public_job, spool_path
+from app.api.core.events import get_event_bus, user_channel
+from app.api.core.document_status import publish_status, set_stage
+from app.api.core.document_access import get_owned_document
+from app.api.core.stream_tickets import get_stream_tickets
+from app.api.core.pagination import created_at_cursor, decode_created_at_cursor
+from app.api.core.storage_backends import get_blob_store, get_document_store
+from app.api.ingest import ingest_document
+from app.api.core.doc_versions import (
+    VERSION_COLUMNS,
+    etag_matches,
+    get_version_cache,
+    invalidate_document_version,
+    remember_version,
+)
 
 router = APIRouter()
 
-
-def _parse_enhanced_response(response_text: str, extracted_text: str) -> tuple[str, str, dict]:
-    """Parse the enhanced Gemini response to extract detailed explanation, summary and metadata"""
-    try:
-        # Split response into sections
-        if "DETAILED EXPLANATION:" in response_text and "SUMMARY:" in response_text and "METADATA:" in response_text:
-            # Split by sections
-            parts = response_text.split("SUMMARY:")
-            detailed_part = parts[0].replace("DETAILED EXPLANATION:", "").strip()
-            
-            remaining = parts[1] if len(parts) > 1 else ""
-            summary_metadata_parts = remaining.split("METADATA:")
-            summary_part = summary_metadata_parts[0].strip()
-            metadata_part = summary_metadata_parts[1].strip() if len(summary_metadata_parts) > 1 else ""
-            
-            # Extract detailed explanation and summary
-            detailed_explanation = detailed_part.strip()
-            summary = summary_part.strip()
-        elif "SUMMARY:" in response_text and "METADATA:" in response_text:
-            # Fallback for old format (without detailed explanation)
-            parts = response_text.split("METADATA:")
-            summary_part = parts[0].replace("SUMMARY:", "").strip()
-            metadata_part = parts[1].strip() if len(parts) > 1 else ""
-            
-            # Extract summary (no detailed explanation)
-            detailed_explanation = ""
-            summary = summary_part.strip()
-        else:
-            # Fallback: treat entire response as summary
-            detailed_explanation = ""
-            summary = response_text.strip()
-            metadata_part = ""
-        
-        # Parse metadata
-        metadata = {}
-        if metadata_part:
-            lines = metadata_part.split('\n')
-            for line in lines:
-                line = line.strip()
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip().lower().replace(' ', '')
-                    value = value.strip()
-                    
-                    if key == 'documenttype':
-                        metadata['documentType'] = value
-                    elif key == 'complexity':
-                        metadata['complexity'] = value
-                    elif key == 'risklevel':
-                        metadata['riskLevel'] = value
-                    elif key == 'riskfactors':
-                        if value.lower() == 'none':
-                            metadata['riskFactors'] = []
-                        else:
-                            # Split by comma and clean up
-                            factors = [f.strip() for f in value.split(',')]
-                            metadata['riskFactors'] = factors[:3]  # Limit to 3
-                    elif key == 'keyparties':
-                        if value.lower() == 'none':
-                            metadata['keyParties'] = []
-                        else:
-                            # Split by comma and clean up
-                            parties = [p.strip() for p in value.split(',')]
-                            metadata['keyParties'] = parties[:3]  # Limit to 3
-                    elif key == 'wordcount':
-                        try:
-                            metadata['wordCount'] = int(value)
-                        except:
-                            metadata['wordCount'] = len(extracted_text.split())
-                    elif key == 'pagecount':
-                        metadata['pageCount'] = value
-        
-        # Set defaults for missing fields
-        metadata.setdefault('documentType', None)
-        metadata.setdefault('complexity', None)
-        metadata.setdefault('riskLevel', None)
-        metadata.setdefault('riskFactors', [])
-        metadata.setdefault('keyParties', [])
-        metadata.setdefault('wordCount', len(extracted_text.split()))
-        metadata.setdefault('pageCount', None)
-        
-        return detailed_explanation, summary, metadata
-    except Exception as e:
-        print(f"Error parsing enhanced response: {e}")
-        # Fallback: treat entire response as summary
-        return "", response_text.strip(), {
-            'documentType': None,
-            'complexity': None,
-            'riskLevel': None,
-            'riskFactors': [],
-            'keyParties': [],
-            'wordCount': len(extracted_text.split()),
-            'pageCount': None
-        }
+# Browsers may keep the body but must revalidate it (If-None-Match) on every read
+_DOCUMENT_CACHE_CONTROL = "private, no-cache"
 
 
 # ---------------------------
@@ -122,13 +56,13 @@ class DocumentCreate(BaseModel):
 # Routes
 # ---------------------------
 @router.post("/", status_code=201)
-def create_document(payload: DocumentCreate, authorization: str | None = Header(None)):
-    """Insert document metadata into Supabase table"""
+async def create_document(payload: DocumentCreate, authorization: str | None = Header(None)):
+    """Insert document metadata into the document store"""
     try:
         print(f"Creating document: {payload.file_name}")
         print(f"Bucket path: {payload.bucket_path}")
         
-        user = get_current_user_from_auth_header(authorization)
+        user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
         uid = user.get("uid")
         if not uid:
             print("No UID found in user data")
@@ -190,31 +124,20 @@ def create_document(payload: DocumentCreate, authorization: str | None = Header(
         print(f"Inserting row: {row}")
         
         # First, check if user already has a document with this filename (smart duplicate detection)
-        # Check if unique_file_key column exists in the database
+        store = get_document_store()
         try:
-            existing_res = supabase.table("documents").select("*").eq("unique_file_key", unique_file_key).execute()
-            if existing_res.data:
-                existing_doc = existing_res.data[0]
+            existing_doc = await store.find_by_file_name(uid, payload.file_name)
+            if existing_doc:
                 print(f"User {uid} already has document with filename '{payload.file_name}', returning existing document: {existing_doc['id']}")
                 return {"document": existing_doc, "isExisting": True}
         except Exception as check_error:
             print(f"Error checking for existing document: {check_error}")
-            # If unique_file_key column doesn't exist, fall back to checking by user_id and file_name
-            try:
-                print("Falling back to user_id + file_name duplicate check")
-                fallback_res = supabase.table("documents").select("*").eq("user_id", uid).eq("file_name", payload.file_name).execute()
-                if fallback_res.data:
-                    existing_doc = fallback_res.data[0]
-                    print(f"User {uid} already has document with filename '{payload.file_name}' (fallback check), returning existing document: {existing_doc['id']}")
-                    return {"document": existing_doc, "isExisting": True}
-            except Exception as fallback_error:
-                print(f"Fallback duplicate check also failed: {fallback_error}")
             # Continue with insert attempt even if check fails
         
         try:
-            res = supabase.table("documents").insert(row).execute()
-            print(f"Document created successfully: {res.data[0]['id']}")
-            return {"document": res.data[0], "isExisting": False}
+            document = await store.insert(row)
+            print(f"Document created successfully: {document['id']}")
+            return {"document": document, "isExisting": False}
         except Exception as e:
             error_str = str(e)
             print(f"Supabase insert failed: {error_str}")
@@ -223,9 +146,8 @@ def create_document(payload: DocumentCreate, authorization: str | None = Header(
             if "duplicate key value violates unique constraint" in error_str:
                 # Try to find the existing document and return it
                 try:
-                    existing_res = supabase.table("documents").select("*").eq("unique_file_key", unique_file_key).execute()
-                    if existing_res.data:
-                        existing_doc = existing_res.data[0]
+                    existing_doc = await store.find_by_file_name(uid, payload.file_name)
+                    if existing_doc:
                         print(f"Returning existing document after duplicate error: {existing_doc['id']}")
                         return {"document": existing_doc, "isExisting": True}
                 except Exception as fetch_error:
@@ -246,279 +168,642 @@ def create_document(payload: DocumentCreate, authorization: str | None = Header(
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
 
+# Columns needed to render a document list; never the (potentially huge) text fields
+LIST_COLUMNS = "id,file_name,status,created_at,processed_at,content_type,size_bytes,pages,document_metadata"
+MAX_LIST_LIMIT = 200
+
+
 @router.get("/")
-def list_documents(authorization: str | None = Header(None)):
-    """List all documents belonging to current user"""
-    user = get_current_user_from_auth_header(authorization)
+async def list_documents(
+    limit: int = Query(50, ge=1, le=MAX_LIST_LIMIT),
+    cursor: str | None = None,
+    status: str | None = None,
+    risk_level: str | None = None,
+    document_type: str | None = None,
+    file_name: str | None = None,
+    authorization: str | None = Header(None),
+):
+    """List the current user's documents, newest first, one page at a time.
+
+    Only LIST_COLUMNS are returned; fetch GET /{doc_id} for the text and analysis.
+    Pages are keyset-paginated on (created_at, id): pass the returned next_cursor
+    to get the following page. risk_level and document_type filter on
+    document_metadata using JSON containment, which the GIN index serves.
+    file_name looks up the (at most one) document with that name directly,
+    however far back it was uploaded.
+    """
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     uid = user.get("uid")
 
+    if file_name is not None:
+        try:
+            row = await get_document_store().find_by_file_name(uid, file_name)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Supabase query failed: {str(e)}")
+        documents = [{column: row.get(column) for column in LIST_COLUMNS.split(",")}] if row else []
+        return {"documents": documents, "next_cursor": None}
+
+    metadata_filter = {}
+    if risk_level:
+        metadata_filter["riskLevel"] = risk_level
+    if document_type:
+        metadata_filter["documentType"] = document_type
+    after = decode_created_at_cursor(cursor) if cursor else None
+
     try:
-        res = (
-            supabase.table("documents")
-            .select("*")
-            .eq("user_id", uid)
-            .order("created_at", desc=True)
-            .execute()
+        # One extra row tells whether another page exists
+        rows = await get_document_store().list_for_user(
+            uid, LIST_COLUMNS, limit=limit + 1, status=status, metadata=metadata_filter, after=after,
         )
-        return {"documents": res.data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Supabase query failed: {str(e)}")
 
+    documents = rows[:limit]
+    next_cursor = created_at_cursor(documents[-1]) if len(rows) > limit else None
+    return {"documents": documents, "next_cursor": next_cursor}
+
+
+_EVENTS_TICKET_PURPOSE = "document-events"
+
+
+@router.post("/events/ticket")
+async def document_events_ticket(authorization: str | None = Header(None)):
+    """Mint a short-lived, single-use ticket for opening GET /events with EventSource"""
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+    tickets = get_stream_tickets()
+    return {
+        "ticket": tickets.mint(user.get("uid"), _EVENTS_TICKET_PURPOSE),
+        "expires_in": tickets.ttl_seconds,
+    }
+
+
+@router.get("/events")
+async def document_events(request: Request, ticket: str | None = None, authorization: str | None = Header(None)):
+    """Server-Sent Events stream of status changes for the current user's documents.
+
+    Replaces polling GET /{doc_id}: a `snapshot` event with every document's
+    current status is sent first, then a `status` event whenever a document
+    moves stage. EventSource cannot set headers, so browsers pass a ticket from
+    POST /events/ticket as ?ticket= instead of the ID token.
+    """
+    if authorization or not ticket:
+        user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+        uid = user.get("uid")
+    else:
+        uid = get_stream_tickets().redeem(ticket, _EVENTS_TICKET_PURPOSE)
+    bus = get_event_bus()
+    channel = user_channel(uid)
+    keepalive_seconds = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+
+    async def events():
+        # Subscribe before the snapshot so no transition in between is lost
+        queue = bus.subscribe(channel)
+        try:
+            rows = await get_document_store().list_for_user(uid, "id,status")
+            yield _sse("snapshot", {"documents": [
+                {"document_id": row["id"], "status": row["status"]} for row in rows
+            ]})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse("status", event)
+        except Exception as e:
+            print(f"Document event stream error: {e}")
+            yield _sse("error", {"status_code": 500, "detail": "Event stream failed"})
+        finally:
+            bus.unsubscribe(channel, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/{doc_id}")
-def get_document(doc_id: str, authorization: str | None = Header(None)):
-    """Get a single document by ID, ensuring ownership. Returns extracted_text and summary for frontend polling."""
-    user = get_current_user_from_auth_header(authorization)
+async def get_document(doc_id: str, authorization: str | None = Header(None), if_none_match: str | None = Header(None)):
+    """Get a single document by ID, ensuring ownership. Returns extracted_text and summary for frontend polling.
+
+    Responses carry an ETag derived from status and processed_at. A request whose
+    If-None-Match still matches gets 304 Not Modified, answered from the version
+    cache (or a narrow id/user/status select) without fetching the full row.
+    """
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     uid = user.get("uid")
 
-    res = supabase.table("documents").select("*").eq("id", doc_id).execute()
-    if not res.data:
+    if if_none_match:
+        version = get_version_cache().get(doc_id)
+        if version is None:
+            light = await get_document_store().get(doc_id, VERSION_COLUMNS)
+            if light is None:
+                raise HTTPException(status_code=404, detail="Document not found")
+            version = {"user_id": light["user_id"], "etag": remember_version(light)}
+        if version["user_id"] != uid:
+            raise HTTPException(status_code=403, detail="Not owner")
+        if etag_matches(if_none_match, version["etag"]):
+            return Response(status_code=304, headers={"ETag": version["etag"], "Cache-Control": _DOCUMENT_CACHE_CONTROL})
+
+    doc = await get_document_store().get(doc_id)
+    if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    doc = res.data[0]
     if doc["user_id"] != uid:
         raise HTTPException(status_code=403, detail="Not owner")
 
     # Ensure extracted_text and summary are always present in response
+    etag = remember_version(doc)
+    return JSONResponse(
+        content=jsonable_encoder({
+            "document": {
+                **doc,
+                "extracted_text": doc.get("extracted_text", ""),
+                "summary": doc.get("summary", ""),
+            }
+        }),
+        headers={"ETag": etag, "Cache-Control": _DOCUMENT_CACHE_CONTROL},
+    )
+
+
+# ---------------------------
+# Processing pipeline helpers
+# ---------------------------
+async def _download_file(doc: dict) -> bytes:
+    """Download the document's file from blob storage"""
+    blobs = get_blob_store()
+    clean_path = doc["bucket_path"]  # ✅ already relative to bucket
+    print(f"Path used for download: {clean_path}")
+
+    try:
+        print("Downloading file from storage...")
+        file_response = await blobs.download(clean_path)
+    except Exception as e:
+        print(f"Storage download failed: {e}")
+        # Try with different path variations
+        try:
+            print("Trying download without user-files prefix...")
+            filename_only = clean_path.replace("user-files/", "")
+            file_response = await blobs.download(filename_only)
+            print(f"Download successful with filename only: {filename_only}")
+        except Exception as e2:
+            print(f"Alternative download also failed: {e2}")
+            raise HTTPException(status_code=500, detail=f"Storage download failed. File may not exist or incorrect permissions. Original error: {e}")
+
+    if not file_response:
+        print("Empty file response from storage")
+        raise HTTPException(status_code=500, detail="Failed to download file")
+    
+    file_bytes = bytes(file_response)
+    print(f"File downloaded successfully, size: {len(file_bytes)} bytes")
+    return file_bytes
+
+
+async def _mark_failed(doc_id: str, uid: str) -> None:
+    # Update document status to failed (only using existing columns)
+    try:
+        await get_document_store().update(doc_id, {
+            "status": "failed",
+            "processed_at": datetime.utcnow().isoformat()
+        })
+    except Exception as update_error:
+        print(f"Failed to update document status: {update_error}")
+        return
+    invalidate_document_version(doc_id)
+    await publish_status(doc_id, uid, "failed")
+
+
+async def _extract_text(doc_id: str, doc: dict, file_bytes: bytes) -> str:
+    """Run OCR, raising HTTPException on errors"""
+    try:
+        print("Processing with Document AI...")
+        result = await process_document_bytes_async(file_bytes, doc["content_type"])
+        print("Document AI processing completed")
+    except DocumentAIError as e:
+        print(f"Document AI error: {e.message}")
+        # Return user-friendly error message
+        raise HTTPException(
+            status_code=400 if e.error_code in ["PAGE_LIMIT_EXCEEDED", "FILE_SIZE_EXCEEDED", "INVALID_DOCUMENT"] else 500,
+            detail=e.user_message
+        )
+    except Exception as e:
+        print(f"Unexpected Document AI error: {e}")
+        raise HTTPException(status_code=500, detail="Document processing failed. Please try again or contact support.")
+
+    extracted_text = result.text
+    print(f"Extracted text length: {len(extracted_text)} characters")
+    return extracted_text
+
+
+def _log_analysis(detailed_explanation: str, summary: str | None, metadata: dict) -> None:
+    if summary is not None and not summary.strip():
+        print("Gemini returned empty summary")
+    else:
+        print(f"Gemini analysis completed, summary length: {len(summary) if summary else 0}")
+        print(f"Detailed explanation length: {len(detailed_explanation) if detailed_explanation else 0}")
+        print(f"Document type: {metadata.get('documentType')}")
+        print(f"Risk level: {metadata.get('riskLevel')}")
+        print(f"Complexity: {metadata.get('complexity')}")
+
+
+async def _fallback_analysis(extracted_text: str) -> tuple[str, str, dict]:
+    """Plain summary (or a text-only note) when the structured analysis fails"""
+    try:
+        # Try basic Gemini summary first
+        summary = await run_in_threadpool(summarize_with_gemini, extracted_text)
+    except Exception as fallback_error:
+        print(f"Fallback summary also failed: {fallback_error}")
+        # Ultimate fallback - create basic text-based summary
+        word_count = len(extracted_text.split())
+        char_count = len(extracted_text)
+        summary = (f"Document processed successfully. Contains {word_count} words and {char_count} characters. "
+                  f"AI analysis is temporarily unavailable, but you can review the full document text below.")
+    return "", summary, default_metadata(extracted_text)
+
+
+async def _save_results(doc_id: str, uid: str, summary: str | None, detailed_explanation: str, metadata: dict) -> None:
+    # extracted_text was already written at the ocr_done stage
+    print("Updating database with results...")
+    await set_stage(
+        doc_id,
+        uid,
+        "processed",
+        summary=summary,
+        detailed_explanation=detailed_explanation,
+        document_metadata=metadata,
+        processed_at=datetime.utcnow().isoformat(),
+    )
+
+
+async def _ingest(doc_id: str, uid: str, extracted_text: str) -> None:
+    # Q&A falls back to indexing lazily, so a failed ingest must not fail processing
+    try:
+        await ingest_document(doc_id, uid, extracted_text)
+    except Exception as e:
+        print(f"Ingest failed for document {doc_id}: {e}")
+
+
+def _start_ingest(doc_id: str, uid: str, extracted_text: str) -> asyncio.Task:
+    """Chunk and embed for retrieval while the analysis runs; both only need the text"""
+    return asyncio.create_task(_ingest(doc_id, uid, extracted_text))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _processing_result(message: str, extracted_text: str, summary: str | None,
+                       detailed_explanation: str | None, metadata: dict | None) -> dict:
     return {
-        "document": {
-            **doc,
-            "extracted_text": doc.get("extracted_text", ""),
-            "summary": doc.get("summary", ""),
-        }
+        "message": message,
+        "extracted_text": extracted_text or "",
+        "summary": (summary or ""),
+        "detailed_explanation": (detailed_explanation or ""),
+        "document_metadata": metadata,
     }
 
 
+def _already_processed(doc: dict) -> dict:
+    return _processing_result(
+        "Already processed", doc.get("extracted_text"), doc.get("summary"),
+        doc.get("detailed_explanation"), doc.get("document_metadata"),
+    )
+
+
+# Progress callback for streaming callers: (SSE event name, data)
+Progress = Callable[[str, dict], None]
+
+
+def _no_progress(event: str, data: dict) -> None:
+    pass
+
+
+async def _analyze(extracted_text: str, progress: Progress) -> tuple[str, str | None, dict]:
+    """Structured analysis, streamed as `token` progress events when someone is listening"""
+    try:
+        print("Starting Gemini structured analysis...")
+        if progress is _no_progress:
+            analysis = await run_in_threadpool(analyze_document_with_gemini, extracted_text)
+        else:
+            parts = []
+            async for delta in iterate_in_threadpool(stream_document_analysis(extracted_text)):
+                parts.append(delta)
+                progress("token", {"text": delta})
+            analysis = parse_analysis_response("".join(parts), extracted_text)
+        _log_analysis(analysis["detailed_explanation"], analysis["summary"], analysis["metadata"])
+        return analysis["detailed_explanation"], analysis["summary"] or None, analysis["metadata"]
+    except Exception as e:
+        print(f"Gemini structured analysis error: {e}")
+        return await _fallback_analysis(extracted_text)
+
+
+async def _run_pipeline(doc_id: str, doc: dict, progress: Progress = _no_progress) -> dict:
+    """Process a document end to end; any failure leaves it marked failed, never mid-stage"""
+    ingest = None
+    try:
+        await set_stage(doc_id, doc["user_id"], "processing")
+
+        # 2. Download file from Supabase storage
+        file_bytes = await _download_file(doc)
+        progress("stage", {"stage": "downloaded", "size_bytes": len(file_bytes)})
+
+        # 3. Process with Document AI; the text is readable by clients from here on
+        extracted_text = await _extract_text(doc_id, doc, file_bytes)
+        await set_stage(doc_id, doc["user_id"], "ocr_done", extracted_text=extracted_text)
+        progress("stage", {"stage": "ocr_done", "characters": len(extracted_text)})
+        progress("text", {"extracted_text": extracted_text})
+        ingest = _start_ingest(doc_id, doc["user_id"], extracted_text)
+
+        # 4. Analyze with Gemini (Vertex) - one schema-constrained JSON call
+        await set_stage(doc_id, doc["user_id"], "analyzing")
+        progress("stage", {"stage": "analyzing"})
+        detailed_explanation, summary, metadata = await _analyze(extracted_text, progress)
+
+        # 5. Update DB with the analysis once the document is also searchable
+        await ingest
+        await _save_results(doc_id, doc["user_id"], summary, detailed_explanation, metadata)
+    except BaseException:
+        if ingest is not None:
+            ingest.cancel()
+        await asyncio.shield(_mark_failed(doc_id, doc["user_id"]))
+        raise
+
+    print("Processing completed successfully")
+    return _processing_result("Processing complete", extracted_text, summary, detailed_explanation, metadata)
+
+
+# One in-flight processing run per document in this process
+_process_flights = SingleFlight()
+
+# Statuses a run passes through; a document in one is being processed (maybe by another instance)
+_IN_FLIGHT_STATUSES = ("processing", "ocr_done", "analyzing")
+
+
+async def _active_run_response(doc_id: str, doc: dict, force: bool) -> JSONResponse | None:
+    """202 describing the run already processing doc, or None if a new run may start.
+
+    Looks at in-process runs, queued or running background jobs and, unless
+    force=true (to recover a document left mid-stage by a crash), the
+    document's own status.
+    """
+    if _process_flights.running(doc_id) is not None:
+        return JSONResponse(status_code=202, content={"job": None, "document_status": doc.get("status")})
+    job = await run_in_threadpool(get_job_queue().store.find_active, PROCESS_JOB, "doc_id", doc_id)
+    if job is not None:
+        return JSONResponse(status_code=202, content={
+            "job": public_job(job),
+            "status_url": f"/api/documents/jobs/{job['id']}",
+            "document_status": doc.get("status"),
+        })
+    if doc.get("status") in _IN_FLIGHT_STATUSES and not force:
+        return JSONResponse(status_code=202, content={"job": None, "document_status": doc["status"]})
+    return None
+
+
 @router.post("/{doc_id}/process")
-def process_file(doc_id: str, authorization: str | None = Header(None)):
-    """Download file from storage, process with Document AI, update DB"""
+async def process_file(doc_id: str, force: bool = False, authorization: str | None = Header(None)):
+    """Download file from storage, process with Document AI, update DB.
+
+    Async so the long OCR call does not hold a threadpool worker; the remaining
+    blocking SDK calls (Supabase, Gemini) are pushed to the threadpool individually.
+    Concurrent calls for the same document share one run, and documents that are
+    already processed are returned as-is unless force=true. If a background job
+    (or another instance) is processing the document, answers 202 with that job
+    instead of starting a second run.
+    """
     try:
         print(f"Starting processing for document {doc_id}")
-        user = get_current_user_from_auth_header(authorization)
+        user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
         uid = user.get("uid")
         print(f"User authenticated: {uid}")
 
         # 1. Get document metadata
-        print("Fetching document metadata...")
-        res = supabase.table("documents").select("*").eq("id", doc_id).execute()
-        if not res.data:
-            print("Document not found in database")
-            raise HTTPException(status_code=404, detail="Document not found")
-        doc = res.data[0]
-        if doc["user_id"] != uid:
-            print("User not authorized for this document")
-            raise HTTPException(status_code=403, detail="Not owner")
-        print(f"Document found: {doc['file_name']}")
-
-        # 2. Download file from Supabase storage
-        bucket = os.getenv("SUPABASE_BUCKET", "uploads")
-        clean_path = doc["bucket_path"]  # ✅ already relative to bucket
-        print(f"Bucket: {bucket}")
-        print(f"Path used for download: {clean_path}")
-
-        # Debug: List files in the bucket to see what's actually there
-        try:
-            print("Listing files in bucket to debug...")
-            files_list = supabase.storage.from_(bucket).list()
-            print(f"Files in bucket root: {files_list}")
-            
-            # Also try to list files in user-files folder
-            try:
-                user_files = supabase.storage.from_(bucket).list("user-files")
-                print(f"Files in user-files folder: {user_files}")
-            except Exception as list_err:
-                print(f"Could not list user-files folder: {list_err}")
-                
-        except Exception as debug_err:
-            print(f"Could not list bucket contents: {debug_err}")
+        doc = await get_owned_document(doc_id, uid)
+        if _process_flights.running(doc_id) is None:
+            if doc.get("status") == "processed" and not force:
+                print("Document already processed, skipping (use force=true to reprocess)")
+                return _already_processed(doc)
+            busy = await _active_run_response(doc_id, doc, force)
+            if busy is not None:
+                print(f"Document {doc_id} is already being processed, not starting another run")
+                return busy
+
+        return await _process_flights.do(doc_id, lambda: _run_pipeline(doc_id, doc))
+    except HTTPException:
+        # Re-raise HTTP exceptions as-is
+        raise
+    except Exception as e:
+        print(f"Unexpected error in process_file: {e}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
-        try:
-            print("Downloading file from storage...")
-            file_response = supabase.storage.from_(bucket).download(clean_path)
-            print(f"File response type: {type(file_response)}")
-        except Exception as e:
-            print(f"Storage download failed: {e}")
-            # Try with different path variations
-            try:
-                print("Trying download without user-files prefix...")
-                filename_only = clean_path.replace("user-files/", "")
-                file_response = supabase.storage.from_(bucket).download(filename_only)
-                print(f"Download successful with filename only: {filename_only}")
-            except Exception as e2:
-                print(f"Alternative download also failed: {e2}")
-                raise HTTPException(status_code=500, detail=f"Storage download failed. File may not exist or incorrect permissions. Original error: {e}")
-
-        if not file_response:
-            print("Empty file response from storage")
-            raise HTTPException(status_code=500, detail="Failed to download file")
-        
-        file_bytes = io.BytesIO(file_response).read()
-        print(f"File downloaded successfully, size: {len(file_bytes)} bytes")
 
-        # 3. Process with Document AI
+@router.post("/{doc_id}/process/stream")
+async def process_file_stream(doc_id: str, force: bool = False, authorization: str | None = Header(None)):
+    """Same pipeline as process_file, delivered as Server-Sent Events.
+
+    Emits `stage` events (downloaded, ocr_done), a `text` event with the
+    extracted text, `token` events with raw analysis JSON deltas as Gemini
+    generates them, and a final `result` (or `error`) event once the results
+    are persisted. If the document is already processed (and not forced), or
+    another run for it is in flight, only the `text` and `result` events are sent.
+
+    The run itself is a task of its own (shared through _process_flights); this
+    stream only relays its progress, so a client disconnecting does not stop it.
+    """
+    # Auth and ownership are checked before the stream starts so they map to real status codes
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+    doc = await get_owned_document(doc_id, user.get("uid"))
+    if _process_flights.running(doc_id) is None and (doc.get("status") != "processed" or force):
+        busy = await _active_run_response(doc_id, doc, force)
+        if busy is not None:
+            return busy
+
+    async def events():
+        getter = None
         try:
-            print("Processing with Document AI...")
-            result = process_document_bytes(file_bytes, doc["content_type"])
-            print("Document AI processing completed")
-        except DocumentAIError as e:
-            print(f"Document AI error: {e.message}")
-            # Update document status to failed (only using existing columns)
-            try:
-                supabase.table("documents").update({
-                    "status": "failed",
-                    "processed_at": datetime.utcnow().isoformat()
-                }).eq("id", doc_id).execute()
-            except Exception as update_error:
-                print(f"Failed to update document status: {update_error}")
-            
-            # Return user-friendly error message
-            raise HTTPException(
-                status_code=400 if e.error_code in ["PAGE_LIMIT_EXCEEDED", "FILE_SIZE_EXCEEDED", "INVALID_DOCUMENT"] else 500,
-                detail=e.user_message
+            if _process_flights.running(doc_id) is None and doc.get("status") == "processed" and not force:
+                result = _already_processed(doc)
+                yield _sse("text", {"extracted_text": result["extracted_text"]})
+                yield _sse("result", {k: v for k, v in result.items() if k != "extracted_text"})
+                return
+
+            progress: asyncio.Queue = asyncio.Queue()
+            attached = _process_flights.running(doc_id) is not None
+            run = _process_flights.start(
+                doc_id, lambda: _run_pipeline(doc_id, doc, lambda event, data: progress.put_nowait((event, data))),
             )
+            if attached:
+                yield _sse("stage", {"stage": "attached"})
+
+            while True:
+                getter = asyncio.ensure_future(progress.get())
+                await asyncio.wait({getter, run}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                event, data = getter.result()
+                yield _sse(event, data)
+            while not progress.empty():
+                event, data = progress.get_nowait()
+                yield _sse(event, data)
+
+            result = run.result()
+            if attached:
+                yield _sse("text", {"extracted_text": result["extracted_text"]})
+            yield _sse("result", {k: v for k, v in result.items() if k != "extracted_text"})
+        except HTTPException as e:
+            yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
         except Exception as e:
-            print(f"Unexpected Document AI error: {e}")
-            # Update document status to failed (only using existing columns)
-            try:
-                supabase.table("documents").update({
-                    "status": "failed",
-                    "processed_at": datetime.utcnow().isoformat()
-                }).eq("id", doc_id).execute()
-            except Exception as update_error:
-                print(f"Failed to update document status: {update_error}")
-            raise HTTPException(status_code=500, detail="Document processing failed. Please try again or contact support.")
-
-        # 4. Update DB with extracted text
-        extracted_text = result.text
-        print(f"Extracted text length: {len(extracted_text)} characters")
-        
-        # 5. Summarize with Gemini (Vertex) - Enhanced with structured data
-        try:
-            print("Starting Gemini enhanced analysis...")
-            
-            # Use enhanced prompt that includes structured data request
-            enhanced_prompt = f"""
-You are a legal document analyzer. Analyze this document and provide a detailed explanation, summary, and structured metadata.
-
-DOCUMENT ANALYSIS:
-{extracted_text[:120000]}
-
-Please provide your response in this exact format:
-
-DETAILED EXPLANATION:
-[Provide a comprehensive 5-7 bullet point analysis covering:
-- Executive summary of the document
-- Key obligations and responsibilities
-- Important terms and conditions
-- Potential risks and red flags
-- Termination/renewal/penalty clauses (if present)
-- Any other critical information]
-
-SUMMARY:
-[Provide a concise 2-3 sentence summary of the document]
-
-METADATA:
-Document Type: [Contract/Agreement/Policy/Legal Brief/Court Document/Other]
-Complexity: [Simple/Moderate/Complex]
-Risk Level: [Low/Medium/High]
-Risk Factors: [List up to 3 key risk factors, or "None" if no significant risks]
-Key Parties: [List up to 3 key parties involved, or "None" if not applicable]
-Word Count: {len(extracted_text.split())}
-Page Count: [Estimated based on content length]
-"""
-
-            # Get enhanced response from Gemini
-            enhanced_response = summarize_with_gemini(enhanced_prompt, max_tokens=1200)
-            
-            # Parse the structured response
-            detailed_explanation, summary, metadata = _parse_enhanced_response(enhanced_response, extracted_text)
-            
-            if summary is not None and not summary.strip():
-                print("Gemini returned empty summary")
-                summary = None
-            else:
-                print(f"Gemini analysis completed, summary length: {len(summary) if summary else 0}")
-                print(f"Detailed explanation length: {len(detailed_explanation) if detailed_explanation else 0}")
-                print(f"Document type: {metadata.get('documentType')}")
-                print(f"Risk level: {metadata.get('riskLevel')}")
-                print(f"Complexity: {metadata.get('complexity')}")
-                
-        except Exception as e:
-            print(f"Gemini enhanced analysis error: {e}")
-            # Provide a comprehensive fallback summary
-            try:
-                # Try basic Gemini summary first
-                summary = summarize_with_gemini(extracted_text)
-                detailed_explanation = ""
-                metadata = {
-                    'documentType': None,
-                    'complexity': None,
-                    'riskLevel': None,
-                    'riskFactors': [],
-                    'keyParties': [],
-                    'wordCount': len(extracted_text.split()),
-                    'pageCount': None
-                }
-            except Exception as fallback_error:
-                print(f"Fallback summary also failed: {fallback_error}")
-                # Ultimate fallback - create basic text-based summary
-                word_count = len(extracted_text.split())
-                char_count = len(extracted_text)
-                summary = (f"Document processed successfully. Contains {word_count} words and {char_count} characters. "
-                          f"AI analysis is temporarily unavailable, but you can review the full document text below.")
-                detailed_explanation = ""
-                metadata = {
-                    'documentType': None,
-                    'complexity': None,
-                    'riskLevel': None,
-                    'riskFactors': [],
-                    'keyParties': [],
-                    'wordCount': word_count,
-                    'pageCount': None
-                }
-
-        print("Updating database with results...")
-        supabase.table("documents").update({
-            "status": "processed",
-            "extracted_text": extracted_text,
-            "summary": summary,
-            "detailed_explanation": detailed_explanation,
-            "document_metadata": metadata,
-            "processed_at": datetime.utcnow().isoformat()
-        }).eq("id", doc_id).execute()
-
-        print("Processing completed successfully")
-        return {
-            "message": "Processing complete",
-            "extracted_text": extracted_text,
-            "summary": (summary or ""),
-            "detailed_explanation": (detailed_explanation or "")
-        }
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
+            print(f"Unexpected error in process_file_stream: {e}")
+            yield _sse("error", {"status_code": 500, "detail": f"Unexpected error: {e}"})
+        finally:
+            if getter is not None and not getter.done():
+                getter.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------------------------
+# Background processing jobs
+# ---------------------------
+PROCESS_JOB = "process_document"
+
+
+async def _job_download(job: dict, context: dict) -> dict:
+    try:
+        doc = await get_owned_document(job["payload"]["doc_id"], job["payload"]["user_id"])
+        await set_stage(doc["id"], doc["user_id"], "processing")
+        file_bytes = await _download_file(doc)
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise PermanentJobError(str(e.detail))
+        raise RuntimeError(e.detail)
+
+    path = spool_path(job["id"], "source")
+    await run_in_threadpool(_write_bytes, path, file_bytes)
+    return {"file_path": path, "content_type": doc["content_type"]}
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _job_ocr(job: dict, context: dict) -> dict:
+    file_bytes = await run_in_threadpool(_read_bytes, context["file_path"])
+    try:
+        result = await process_document_bytes_async(file_bytes, context["content_type"])
+    except DocumentAIError as e:
+        if e.error_code in ["PAGE_LIMIT_EXCEEDED", "FILE_SIZE_EXCEEDED", "INVALID_DOCUMENT", "EMPTY_FILE", "CORRUPTED_DOCUMENT"]:
+            raise PermanentJobError(e.user_message)
         raise
+    await set_stage(job["payload"]["doc_id"], job["payload"]["user_id"], "ocr_done", extracted_text=result.text)
+    try:
+        os.remove(context["file_path"])
+    except OSError:
+        pass
+    return {"extracted_text": result.text}
+
+
+async def _job_ingest(job: dict, context: dict) -> dict:
+    await _ingest(job["payload"]["doc_id"], job["payload"]["user_id"], context["extracted_text"])
+    return {}
+
+
+async def _job_analyze(job: dict, context: dict) -> dict:
+    extracted_text = context["extracted_text"]
+    await set_stage(job["payload"]["doc_id"], job["payload"]["user_id"], "analyzing")
+    try:
+        analysis = await run_in_threadpool(analyze_document_with_gemini, extracted_text)
+        detailed_explanation = analysis["detailed_explanation"]
+        summary = analysis["summary"] or None
+        metadata = analysis["metadata"]
+        _log_analysis(detailed_explanation, analysis["summary"], metadata)
     except Exception as e:
-        print(f"Unexpected error in process_file: {e}")
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
+        print(f"Gemini structured analysis error: {e}")
+        detailed_explanation, summary, metadata = await _fallback_analysis(extracted_text)
+    return {"summary": summary, "detailed_explanation": detailed_explanation, "metadata": metadata}
 
 
-@router.get("/{doc_id}/signed-url")
-def create_signed_url(doc_id: str, expires_in: int = 3600, authorization: str | None = Header(None)):
-    """Generate signed URL for accessing a file in Supabase storage"""
+async def _job_save(job: dict, context: dict) -> dict:
+    await _save_results(
+        job["payload"]["doc_id"], job["payload"]["user_id"], context["summary"], context["detailed_explanation"], context["metadata"],
+    )
+    return {}
+
+
+async def _job_failed(job: dict, error: str) -> None:
+    await _mark_failed(job["payload"]["doc_id"], job["payload"]["user_id"])
+
+
+def register_jobs(queue: JobQueue) -> None:
+    """Register the document processing pipeline as a staged background job"""
+    queue.register(PROCESS_JOB, [
+        ("download", _job_download),
+        ("ocr", _job_ocr),
+        ("ingest", _job_ingest),
+        ("analyze", _job_analyze),
+        ("save", _job_save),
+    ], on_failure=_job_failed)
+
+
+@router.post("/{doc_id}/jobs", status_code=202)
+async def enqueue_processing(doc_id: str, force: bool = False, authorization: str | None = Header(None)):
+    """Queue background processing of a document and return immediately with the job.
+
+    Documents that are already processed are not queued again unless force=true.
+    If the document is already being processed (a pending job, a /process run
+    or a mid-stage status), the running job (if any) is returned instead.
+    """
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+    uid = user.get("uid")
+    doc = await get_owned_document(doc_id, uid)
+    if doc.get("status") == "processed" and not force and _process_flights.running(doc_id) is None:
+        return JSONResponse(status_code=200, content={"job": None, "document_status": "processed"})
+
+    busy = await _active_run_response(doc_id, doc, force)
+    if busy is not None:
+        return busy
+
+    job = await get_job_queue().enqueue(PROCESS_JOB, {"doc_id": doc_id, "user_id": uid})
+    print(f"Queued processing job {job['id']} for document {doc_id}")
+    return {"job": public_job(job), "status_url": f"/api/documents/jobs/{job['id']}"}
+
+
+@router.get("/jobs/{job_id}")
+def get_job_status(job_id: str, authorization: str | None = Header(None)):
+    """Status of a background processing job, ensuring ownership"""
     user = get_current_user_from_auth_header(authorization)
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["payload"].get("user_id") != user.get("uid"):
+        raise HTTPException(status_code=403, detail="Not owner")
+    return {"job": public_job(job)}
+
+
+@router.get("/{doc_id}/signed-url")
+async def create_signed_url(doc_id: str, expires_in: int = 3600, authorization: str | None = Header(None)):
+    """Generate signed URL for accessing a file in storage"""
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     uid = user.get("uid")
 
-    res = supabase.table("documents").select("*").eq("id", doc_id).execute()
-    if not res.data:
+    doc = await get_document_store().get(doc_id)
+    if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    doc = res.data[0]
     if doc["user_id"] != uid:
         raise HTTPException(status_code=403, detail="Not owner")
 
-    bucket_name = os.getenv("SUPABASE_BUCKET", "uploads")
-    path = doc["bucket_path"]
-
-    signed = supabase.storage.from_(bucket_name).create_signed_url(path, expires_in)
-    signed_url = signed.get("signed_url") if isinstance(signed, dict) else signed
+    signed_url = await get_blob_store().signed_url(doc["bucket_path"], expires_in)
     return {"signed_url": signed_url}
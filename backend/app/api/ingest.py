@@ -0,0 +1,222 @@
+import os
+import json
+import shutil
+import hashlib
+import asyncio
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.api.core.bm25 import InvertedIndex
+from app.api.core.chunking import split_spans
+from app.api.core.embeddings import embed_texts, embedding_model_name
+from app.api.core.user_index import add_to_user_index, remove_from_user_index, user_index_documents
+
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "/tmp/legal-ai/rag")
+# Small enough that top-k chunks fit a fixed prompt budget, large enough to keep a clause together
+RAG_CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "1500"))
+# float16 halves disk and page cache per vector; scores are computed in float32 after loading
+RAG_VECTOR_DTYPE = np.dtype(os.getenv("RAG_VECTOR_DTYPE", "float16"))
+
+_VECTORS_FILE = "vectors.npy"
+_MANIFEST_FILE = "chunks.json"
+_TERMS_FILE = "terms.npz"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_dir(doc_id: str) -> str:
+    return os.path.join(RAG_INDEX_DIR, doc_id)
+
+
+def _publish(directory: str, name: str, write) -> None:
+    """Write a file through a uniquely named temp file and rename it into place.
+
+    Concurrent writers of the same index (another process, say) each get their
+    own temp file, so a rename can never publish someone else's half-written one.
+    """
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, os.path.join(directory, name))
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class DocumentIndex:
+    """Chunk spans of one document's extracted text plus their embeddings and BM25 index.
+
+    `vectors` is a contiguous (n_chunks, dim) float32 matrix of unit rows, and
+    `spans` an (n_chunks, 2) array of [start, end) offsets into the extracted
+    text, so row i of one lines up with row i of the other. `lexical` scores
+    the same chunks by term matches; passage i is chunk i.
+    """
+
+    def __init__(self, doc_id: str, spans: np.ndarray, vectors: np.ndarray, model: str, source_hash: str,
+                 lexical: Optional[InvertedIndex] = None):
+        self.doc_id = doc_id
+        self.spans = spans
+        self.vectors = vectors
+        self.model = model
+        self.source_hash = source_hash
+        self.lexical = lexical
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def save(self) -> None:
+        """Write vectors, terms, then manifest, each via rename, so a reader never sees a half-written index"""
+        directory = index_dir(self.doc_id)
+        os.makedirs(directory, exist_ok=True)
+        _publish(directory, _VECTORS_FILE, lambda f: np.save(f, self.vectors.astype(RAG_VECTOR_DTYPE)))
+        if self.lexical is not None:
+            arrays = self.lexical.to_arrays()
+            _publish(directory, _TERMS_FILE, lambda f: np.savez(f, **arrays))
+        manifest = json.dumps({
+            "model": self.model,
+            "source_hash": self.source_hash,
+            "spans": self.spans.tolist(),
+        })
+        _publish(directory, _MANIFEST_FILE, lambda f: f.write(manifest.encode("utf-8")))
+
+    @classmethod
+    def load(cls, doc_id: str) -> Optional["DocumentIndex"]:
+        directory = index_dir(doc_id)
+        try:
+            with open(os.path.join(directory, _MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            stored = np.load(os.path.join(directory, _VECTORS_FILE), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        spans = np.asarray(manifest["spans"], dtype=np.int64).reshape(-1, 2)
+        if len(spans) != len(stored):
+            return None
+        vectors = np.ascontiguousarray(stored, dtype=np.float32)
+        try:
+            with np.load(os.path.join(directory, _TERMS_FILE)) as arrays:
+                lexical = InvertedIndex.from_arrays(arrays)
+        except (OSError, ValueError, KeyError):
+            # Indexes written before hybrid retrieval; is_current() makes them rebuild
+            lexical = None
+        if lexical is not None and len(lexical) != len(spans):
+            lexical = None
+        return cls(doc_id, spans, vectors, manifest["model"], manifest["source_hash"], lexical)
+
+    def is_current(self, text: str) -> bool:
+        return (
+            self.lexical is not None
+            and self.model == embedding_model_name()
+            and self.source_hash == text_hash(text)
+        )
+
+
+def build_index(doc_id: str, text: str) -> DocumentIndex:
+    """Chunk, embed and term-index text (blocking: calls the embedding backend)"""
+    spans = split_spans(text, RAG_CHUNK_CHARS)
+    chunks = [text[start:end] for start, end in spans]
+    vectors = embed_texts(chunks)
+    span_array = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+    return DocumentIndex(
+        doc_id, span_array, vectors, embedding_model_name(), text_hash(text), InvertedIndex.build(chunks),
+    )
+
+
+def delete_index(doc_id: str) -> None:
+    shutil.rmtree(index_dir(doc_id), ignore_errors=True)
+
+
+_index_cache: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def _max_cached_indexes() -> int:
+    return int(os.getenv("RAG_INDEX_CACHE_ENTRIES", "64"))
+
+
+def _cache_index(index: DocumentIndex) -> None:
+    with _index_cache_lock:
+        _index_cache[index.doc_id] = index
+        _index_cache.move_to_end(index.doc_id)
+        while len(_index_cache) > _max_cached_indexes():
+            _index_cache.popitem(last=False)
+
+
+# One build of a document's index at a time in this process (pipeline ingest, lazy rebuild
+# at ask time and search backfill can otherwise overlap); entries go away with their last user
+_build_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _build_lock(doc_id: str) -> asyncio.Lock:
+    lock = _build_locks.get(doc_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _build_locks[doc_id] = lock
+    return lock
+
+
+async def _build_and_save(doc_id: str, user_id: str, text: str) -> DocumentIndex:
+    index = await asyncio.to_thread(build_index, doc_id, text)
+    await asyncio.to_thread(index.save)
+    _cache_index(index)
+    await asyncio.to_thread(add_to_user_index, user_id, doc_id, index.vectors, index.model)
+    print(f"Ingested document {doc_id}: {len(index)} chunks")
+    return index
+
+
+async def ingest_document(doc_id: str, user_id: str, text: str) -> DocumentIndex:
+    """Chunk, embed and persist the retrieval index for a document's extracted text,
+    and add its chunks to the owner's cross-document index"""
+    async with _build_lock(doc_id):
+        return await _build_and_save(doc_id, user_id, text)
+
+
+def _cached_index(doc_id: str) -> Optional[DocumentIndex]:
+    with _index_cache_lock:
+        index = _index_cache.get(doc_id)
+        if index is not None:
+            _index_cache.move_to_end(doc_id)
+    return index
+
+
+async def get_document_index(doc_id: str, user_id: str, extracted_text: str) -> DocumentIndex:
+    """Loaded index for a document, (re)building it when missing or stale.
+
+    Documents processed before ingest existed are indexed lazily on first use.
+    """
+    index = _cached_index(doc_id)
+    if index is None:
+        index = await asyncio.to_thread(DocumentIndex.load, doc_id)
+    if index is None or not index.is_current(extracted_text):
+        async with _build_lock(doc_id):
+            # Whoever held the lock may just have built it
+            index = _cached_index(doc_id)
+            if index is None or not index.is_current(extracted_text):
+                return await _build_and_save(doc_id, user_id, extracted_text)
+    _cache_index(index)
+    return index
+
+
+async def ensure_user_indexed(doc_id: str, user_id: str, extracted_text: str) -> None:
+    """Backfill a processed document into its owner's cross-document index if it is missing"""
+    index = await get_document_index(doc_id, user_id, extracted_text)
+    if doc_id not in await asyncio.to_thread(user_index_documents, user_id, index.model):
+        await asyncio.to_thread(add_to_user_index, user_id, doc_id, index.vectors, index.model)
+
+
+async def remove_document_index(doc_id: str, user_id: str) -> None:
+    """Drop a deleted document from retrieval: its own index and its owner's cross-document index"""
+    with _index_cache_lock:
+        _index_cache.pop(doc_id, None)
+    await asyncio.to_thread(delete_index, doc_id)
+    await asyncio.to_thread(remove_from_user_index, user_id, doc_id)
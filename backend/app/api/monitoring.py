@@ -1,6 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
-from app.api.core.firebase_admin import get_current_user_from_auth_header
+from app.api.core.firebase_admin import get_current_user_from_auth_header, get_token_cache_stats
 from app.api.core.supabase import supabase
+from app.api.core.documentai_client import get_ocr_gate_stats, get_ocr_cache
+from app.api.core.gemini import get_gemini_router, get_llm_cache
+from app.api.core.events import get_event_bus
+from app.api.core.embeddings import embedding_model_name, get_embedding_cache
 from typing import Dict, Any
 from datetime import datetime, timedelta
 import psutil
@@ -123,7 +127,18 @@ def get_detailed_metrics(authorization: str | None = Header(None)):
                 "requestsPerMinute": request_count,
                 "averageResponseTime": 150.0,
                 "throughput": "1.2 MB/s"
-            }
+            },
+            "ocr": {
+                "gate": get_ocr_gate_stats(),
+                "cache": get_ocr_cache().stats()
+            },
+            "gemini": {
+                "router": get_gemini_router().stats(),
+                "cache": get_llm_cache().stats()
+            },
+            "embeddings": {"model": embedding_model_name(), "cache": get_embedding_cache().stats()},
+            "events": get_event_bus().stats(),
+            "auth": {"tokenCache": get_token_cache_stats()}
         }
         
     except Exception as e:
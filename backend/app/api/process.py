@@ -1,26 +1,26 @@
 import os
-import io
 from datetime import datetime
 from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from app.api.core.firebase_admin import get_current_user_from_auth_header
-from app.api.core.documentai_client import process_document_bytes
-from app.api.core.supabase import supabase  # ✅ Supabase client wrapper
+from app.api.core.documentai_client import process_document_bytes_async
+from app.api.core.document_status import set_stage
+from app.api.core.storage_backends import get_blob_store, get_document_store
 
 router = APIRouter()
 
 @router.post("/{doc_id}/process")
-def process_file(doc_id: str, authorization: str | None = Header(None)):
-    """Download file from Supabase storage, process with Document AI, update DB"""
+async def process_file(doc_id: str, authorization: str | None = Header(None)):
+    """Download file from storage, process with Document AI, update DB"""
     # 1. Authenticate user
-    user = get_current_user_from_auth_header(authorization)
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     uid = user.get("uid")
 
-    # 2. Fetch document metadata from Supabase
-    res = supabase.table("documents").select("*").eq("id", doc_id).execute()
-    if not res.data:
+    # 2. Fetch document metadata
+    doc = await get_document_store().get(doc_id)
+    if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    doc = res.data[0]
     if doc["user_id"] != uid:
         raise HTTPException(status_code=403, detail="Not owner")
 
@@ -30,28 +30,24 @@ def process_file(doc_id: str, authorization: str | None = Header(None)):
     # Ensure we don’t duplicate bucket name in path
     clean_path = storage_path.replace(f"{bucket}/", "", 1)
 
-    # 3. Download file from Supabase storage
+    # 3. Download file from storage
     try:
-        file_response = supabase.storage.from_(bucket).download(clean_path)
-        if not file_response:
+        file_bytes = await get_blob_store().download(clean_path)
+        if not file_bytes:
             raise HTTPException(status_code=500, detail="Empty file response from storage")
-        file_bytes = io.BytesIO(file_response).read()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to download file: {e}")
 
     # 4. Send file to Google Document AI
     try:
-        result = process_document_bytes(file_bytes)
+        result = await process_document_bytes_async(file_bytes)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Document AI failed: {e}")
 
-    # 5. Store extracted text back in Supabase
+    # 5. Store extracted text back on the document
     extracted_text = result.text
-    supabase.table("documents").update({
-        "status": "processed",
-        "extracted_text": extracted_text,
-        "processed_at": datetime.utcnow().isoformat()
-    }).eq("id", doc_id).execute()
+    await set_stage(doc_id, uid, "processed", extracted_text=extracted_text,
+                    processed_at=datetime.utcnow().isoformat())
 
     # 6. Return preview
     return {
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import asyncio
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.api.core.firebase_admin import get_current_user_from_auth_header
+from app.api.core.embeddings import embed_query, embedding_model_name
+from app.api.core.storage_backends import get_document_store
+from app.api.core.user_index import remove_from_user_index, search_user_index, user_index_documents
+from app.api.core.gemini import stream_text
+from app.api.core.document_access import get_owned_document
+from app.api.ingest import DocumentIndex, ensure_user_indexed, get_document_index
+
+router = APIRouter()
+
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "6"))
+# Passages sent per question; with the question and instructions this bounds the prompt
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+RAG_ANSWER_TOKENS = int(os.getenv("RAG_ANSWER_TOKENS", "1024"))
+MAX_QUESTION_CHARS = 2000
+MAX_TOP_K = 20
+# Candidates each ranker contributes to fusion, and the RRF damping constant (60 in Cormack et al.)
+RAG_FUSION_CANDIDATES = int(os.getenv("RAG_FUSION_CANDIDATES", "50"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+MAX_SEARCH_RESULTS = 50
+# Documents processed before cross-document search existed are indexed in the background,
+# checked for at most once per interval per user; a document that failed waits out the retry delay
+ANN_BACKFILL_INTERVAL_SECONDS = float(os.getenv("ANN_BACKFILL_INTERVAL_SECONDS", "300"))
+ANN_BACKFILL_RETRY_SECONDS = float(os.getenv("ANN_BACKFILL_RETRY_SECONDS", "3600"))
+# Rough chars-per-token for English legal text; only used to budget, never to bill
+_CHARS_PER_TOKEN = 4
+
+
+def top_scores(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the k highest scores, best first.
+
+    A partial sort of only the k winners (argpartition), so ranking stays
+    linear in the chunk count with no Python-level loop.
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=scores.dtype)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return order, scores[order]
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], size: int, k: int = 60) -> np.ndarray:
+    """Fused score per item: the sum of 1 / (k + rank) over every ranking it appears in.
+
+    Only ranks are used, so cosine similarities and unbounded BM25 scores
+    combine without any score calibration.
+    """
+    fused = np.zeros(size, dtype=np.float32)
+    for ranking in rankings:
+        fused[ranking] += 1.0 / (k + np.arange(1, len(ranking) + 1, dtype=np.float32))
+    return fused
+
+
+def retrieve(index: DocumentIndex, extracted_text: str, question: str, k: Optional[int] = None) -> list[dict]:
+    """The k chunks of a document most relevant to question (blocking: embeds the question).
+
+    Dense similarity finds paraphrases; BM25 over the same chunks catches exact
+    terms (clause numbers, party names, "indemnify") that embeddings blur. The
+    two rankings are merged with reciprocal-rank fusion.
+    """
+    if len(index) == 0:
+        return []
+    candidates = max(k or RAG_TOP_K, RAG_FUSION_CANDIDATES)
+    # One matrix-vector product scores every chunk against the question
+    dense = index.vectors @ embed_query(question)
+    dense_order, _ = top_scores(dense, candidates)
+    rankings = [dense_order]
+    lexical = np.zeros(len(index), dtype=np.float32)
+    if index.lexical is not None:
+        lexical = index.lexical.scores(question)
+        lexical_order, lexical_top = top_scores(lexical, candidates)
+        # Chunks sharing no term with the question are not a lexical match at any rank
+        rankings.append(lexical_order[lexical_top > 0])
+
+    fused = reciprocal_rank_fusion(rankings, len(index), RAG_RRF_K)
+    order, scores = top_scores(fused, k or RAG_TOP_K)
+    hits = []
+    for chunk, score in zip(order.tolist(), scores.tolist()):
+        start, end = index.spans[chunk].tolist()
+        hits.append({
+            "chunk": chunk,
+            "start": start,
+            "end": end,
+            "score": score,
+            "vector_score": float(dense[chunk]),
+            "bm25_score": float(lexical[chunk]),
+            "text": extracted_text[start:end],
+        })
+    return hits
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def fit_to_budget(hits: list[dict], budget_tokens: int) -> list[dict]:
+    """Best hits that fit budget_tokens, in document order.
+
+    Hits that would overflow are skipped (a later, shorter one may still fit).
+    If not even the best hit fits, its head is kept so there is always context.
+    """
+    chosen, used = [], 0
+    for hit in hits:
+        cost = estimate_tokens(hit["text"])
+        if used + cost <= budget_tokens:
+            chosen.append(hit)
+            used += cost
+    if not chosen and hits:
+        best = dict(hits[0])
+        best["text"] = best["text"][:budget_tokens * _CHARS_PER_TOKEN]
+        best["end"] = best["start"] + len(best["text"])
+        chosen.append(best)
+    return sorted(chosen, key=lambda hit: hit["start"])
+
+
+_ANSWER_PROMPT = """You answer questions about a legal document for a layperson, using only the numbered excerpts below.
+Cite the excerpts you rely on inline as [1], [2], ... If the excerpts do not contain the answer, say so plainly instead of guessing.
+
+EXCERPTS:
+{excerpts}
+
+QUESTION: {question}
+
+ANSWER:"""
+
+
+def build_prompt(question: str, passages: list[dict]) -> str:
+    excerpts = "\n\n".join(f"[{n}] {passage['text']}" for n, passage in enumerate(passages, start=1))
+    return _ANSWER_PROMPT.format(excerpts=excerpts, question=question)
+
+
+def _citations(passages: list[dict]) -> list[dict]:
+    return [
+        {"id": n, "chunk": p["chunk"], "start": p["start"], "end": p["end"], "score": p["score"]}
+        for n, p in enumerate(passages, start=1)
+    ]
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# ---------------------------
+# Schemas
+# ---------------------------
+class AskRequest(BaseModel):
+    question: str
+    top_k: int | None = None
+
+
+class SearchRequest(BaseModel):
+    query: str
+    limit: int = 10
+
+
+# ---------------------------
+# Routes
+# ---------------------------
+@router.post("/{doc_id}/ask")
+async def ask_document(doc_id: str, payload: AskRequest, authorization: str | None = Header(None)):
+    """Answer a question about a processed document as Server-Sent Events.
+
+    Only the top-k most relevant chunks (trimmed to RAG_CONTEXT_TOKENS) are
+    sent to Gemini, so latency and cost do not grow with the document. Emits a
+    `citations` event (excerpt ids with [start, end) character offsets into
+    extracted_text), `token` events with answer deltas, then a final `result`
+    (or `error`) event.
+    """
+    question = payload.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question is required")
+    if len(question) > MAX_QUESTION_CHARS:
+        raise HTTPException(status_code=400, detail=f"Question must be at most {MAX_QUESTION_CHARS} characters")
+    k = max(1, min(payload.top_k or RAG_TOP_K, MAX_TOP_K))
+
+    # Auth and ownership are checked before the stream starts so they map to real status codes
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+    doc = await get_owned_document(doc_id, user.get("uid"))
+    extracted_text = doc.get("extracted_text") or ""
+    if not extracted_text:
+        raise HTTPException(status_code=409, detail="Document has no extracted text yet; process it first")
+
+    async def events():
+        try:
+            index = await get_document_index(doc_id, doc["user_id"], extracted_text)
+            hits = await run_in_threadpool(retrieve, index, extracted_text, question, k)
+            passages = fit_to_budget(hits, RAG_CONTEXT_TOKENS)
+            citations = _citations(passages)
+            yield _sse("citations", {"citations": citations})
+
+            parts = []
+            async for delta in iterate_in_threadpool(stream_text(build_prompt(question, passages), RAG_ANSWER_TOKENS)):
+                parts.append(delta)
+                yield _sse("token", {"text": delta})
+            yield _sse("result", {"answer": "".join(parts).strip(), "citations": citations})
+        except Exception as e:
+            print(f"Question answering failed for document {doc_id}: {e}")
+            yield _sse("error", {"status_code": 500, "detail": f"Unexpected error: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+_backfills: dict[str, asyncio.Task] = {}
+_backfill_checked: dict[str, float] = {}
+# doc_id -> monotonic time its backfill last failed (or found nothing to index)
+_backfill_failures: dict[str, float] = {}
+
+
+def _backfill_due(doc_id: str, now: float) -> bool:
+    failed_at = _backfill_failures.get(doc_id)
+    return failed_at is None or now - failed_at >= ANN_BACKFILL_RETRY_SECONDS
+
+
+async def _backfill_user_index(uid: str) -> None:
+    try:
+        store = get_document_store()
+        processed = await store.list_for_user(uid, "id", status="processed")
+        indexed = await asyncio.to_thread(user_index_documents, uid, embedding_model_name())
+        now = time.monotonic()
+        missing = [row["id"] for row in processed if row["id"] not in indexed and _backfill_due(row["id"], now)]
+        if missing:
+            print(f"Backfilling {len(missing)} documents into the search index of user {uid}")
+        for doc_id in missing:
+            try:
+                doc = await store.get(doc_id, "id,extracted_text")
+                if not doc or not doc.get("extracted_text"):
+                    raise ValueError("no extracted text")
+                await ensure_user_indexed(doc_id, uid, doc["extracted_text"])
+                _backfill_failures.pop(doc_id, None)
+            except Exception as e:
+                _backfill_failures[doc_id] = time.monotonic()
+                print(f"Backfill of document {doc_id} into search index failed: {e}")
+    except Exception as e:
+        print(f"Search index backfill for user {uid} failed: {e}")
+
+
+def _start_backfill(uid: str) -> bool:
+    """Index the user's processed documents missing from their search index, off the request path.
+
+    Returns True while a backfill for the user is running, i.e. results may be incomplete.
+    """
+    task = _backfills.get(uid)
+    if task is not None and not task.done():
+        return True
+    now = time.monotonic()
+    checked_at = _backfill_checked.get(uid)
+    if checked_at is not None and now - checked_at < ANN_BACKFILL_INTERVAL_SECONDS:
+        return False
+    _backfill_checked[uid] = now
+    task = asyncio.create_task(_backfill_user_index(uid))
+    _backfills[uid] = task
+    task.add_done_callback(lambda done: _backfills.pop(uid, None) if _backfills.get(uid) is done else None)
+    return True
+
+
+@router.post("/search")
+async def search_documents(payload: SearchRequest, authorization: str | None = Header(None)):
+    """Semantic search across all of the caller's processed documents.
+
+    Served from the caller's approximate-nearest-neighbour (HNSW) index, so
+    latency stays roughly logarithmic in the size of their library. Returns
+    the best-matching chunks with [start, end) offsets into each document's
+    extracted_text. `indexing` is true while older documents are still being
+    added to the index in the background, so results may be incomplete.
+    """
+    query = payload.query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    if len(query) > MAX_QUESTION_CHARS:
+        raise HTTPException(status_code=400, detail=f"Query must be at most {MAX_QUESTION_CHARS} characters")
+    limit = max(1, min(payload.limit, MAX_SEARCH_RESULTS))
+
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
+    uid = user.get("uid")
+    try:
+        indexing = _start_backfill(uid)
+        vector = await run_in_threadpool(embed_query, query)
+        hits = await run_in_threadpool(search_user_index, uid, vector, limit, embedding_model_name())
+
+        store = get_document_store()
+        doc_ids = list(dict.fromkeys(hit["document_id"] for hit in hits))
+        rows = await asyncio.gather(*(store.get(doc_id, "id,user_id,file_name,extracted_text") for doc_id in doc_ids))
+        docs = {}
+        for doc_id, doc in zip(doc_ids, rows):
+            if doc is None or doc["user_id"] != uid or not doc.get("extracted_text"):
+                # Deleted (or reset) behind the index's back
+                await run_in_threadpool(remove_from_user_index, uid, doc_id)
+                continue
+            docs[doc_id] = (doc, await get_document_index(doc_id, uid, doc["extracted_text"]))
+
+        results = []
+        for hit in hits:
+            if hit["document_id"] not in docs:
+                continue
+            doc, index = docs[hit["document_id"]]
+            if hit["chunk"] >= len(index):
+                continue
+            start, end = index.spans[hit["chunk"]].tolist()
+            results.append({
+                "document_id": doc["id"],
+                "file_name": doc["file_name"],
+                "chunk": hit["chunk"],
+                "start": start,
+                "end": end,
+                "score": hit["score"],
+                "text": doc["extracted_text"][start:end],
+            })
+        return {"results": results, "indexing": indexing}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Document search failed for user {uid}: {e}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {e}")
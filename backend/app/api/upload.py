@@ -1,6 +1,7 @@
 from fastapi import APIRouter, UploadFile, File, Header, HTTPException
 from app.api.core.firebase_admin import get_current_user_from_auth_header
-from app.api.core.supabase import supabase
+from fastapi.concurrency import run_in_threadpool
+from app.api.core.storage_backends import get_blob_store, get_document_store
 import os
 
 router = APIRouter()
@@ -13,7 +14,7 @@ async def upload_file(
     """Handle file upload through backend using service_role key"""
     try:
         # Authenticate user
-        user = get_current_user_from_auth_header(authorization)
+        user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
         uid = user.get("uid")
         if not uid:
             raise HTTPException(status_code=401, detail="No UID found")
@@ -49,18 +50,12 @@ async def upload_file(
         safe_filename = "".join(c if c.isalnum() or c in '._-' else '_' for c in original_filename)
         bucket_path = f"user-files/{safe_filename}"
         
-        # Upload to Supabase storage using service_role key
+        # Upload to blob storage (Supabase bucket with the service_role key, or local)
+        blobs = get_blob_store()
         try:
-            bucket = os.getenv("SUPABASE_BUCKET", "uploads")
-            print(f"Uploading file to bucket: {bucket}, path: {bucket_path}")
-            
-            # Upload file to storage
-            storage_result = supabase.storage.from_(bucket).upload(
-                path=bucket_path, 
-                file=file_content,
-                file_options={"content-type": file.content_type}
-            )
-            print(f"Storage upload result: {storage_result}")
+            print(f"Uploading file to storage path: {bucket_path}")
+            await blobs.upload(bucket_path, file_content, file.content_type)
+            print("Storage upload complete")
             
         except Exception as storage_error:
             print(f"Storage upload failed: {storage_error}")
@@ -82,8 +77,7 @@ async def upload_file(
                 "unique_file_key": unique_file_key
             }
             
-            res = supabase.table("documents").insert(row).execute()
-            document = res.data[0]
+            document = await get_document_store().insert(row)
             print(f"Document created: {document['id']}")
             
             return {
@@ -96,7 +90,7 @@ async def upload_file(
             print(f"Database insert failed: {db_error}")
             # Try to delete the uploaded file since DB insert failed
             try:
-                supabase.storage.from_(bucket).remove([bucket_path])
+                await blobs.delete(bucket_path)
             except:
                 pass
             raise HTTPException(
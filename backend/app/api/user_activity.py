@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
 from app.api.core.firebase_admin import get_current_user_from_auth_header
-from app.api.core.supabase import supabase
+from fastapi.concurrency import run_in_threadpool
+from app.api.core.storage_backends import get_activity_store
 from typing import Dict, Any
 from datetime import datetime
 
 router = APIRouter()
 
 @router.post("/track-login")
-def track_user_login(authorization: str | None = Header(None)):
+async def track_user_login(authorization: str | None = Header(None)):
     """Track user login activity"""
     import logging
     logger = logging.getLogger(__name__)
@@ -15,7 +16,7 @@ def track_user_login(authorization: str | None = Header(None)):
     try:
         logger.info(f"Track login called with auth header: {'Present' if authorization else 'Missing'}")
         
-        user = get_current_user_from_auth_header(authorization)
+        user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
         uid = user.get("uid")
         email = user.get("email", "")
         
@@ -35,21 +36,22 @@ def track_user_login(authorization: str | None = Header(None)):
         logger.info(f"Checking existing user activity for uid: {uid}")
         
         # Check if user activity record exists
-        existing = supabase.table("user_activity").select("*").eq("user_id", uid).execute()
+        activity = get_activity_store()
+        existing = await activity.get(uid)
         
         logger.info(f"Existing user activity query result: {existing}")
         
-        if existing.data and len(existing.data) > 0:
+        if existing:
             # Update existing record
             logger.info(f"Updating existing user activity record")
-            res = supabase.table("user_activity").update({
+            res = await activity.update(uid, {
                 "last_login": activity_data["last_login"],
-                "login_count": existing.data[0]["login_count"] + 1
-            }).eq("user_id", uid).execute()
+                "login_count": existing["login_count"] + 1
+            })
         else:
             # Insert new record
             logger.info(f"Inserting new user activity record")
-            res = supabase.table("user_activity").insert(activity_data).execute()
+            res = await activity.insert(activity_data)
         
         logger.info(f"Database operation result: {res}")
         
@@ -64,18 +66,16 @@ def track_user_login(authorization: str | None = Header(None)):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/activity/{user_id}")
-def get_user_activity(user_id: str, authorization: str | None = Header(None)):
+async def get_user_activity(user_id: str, authorization: str | None = Header(None)):
     """Get user activity data"""
-    user = get_current_user_from_auth_header(authorization)
+    user = await run_in_threadpool(get_current_user_from_auth_header, authorization)
     
     # Allow users to view their own activity or admin users
     if user.get("uid") != user_id and user.get("email") not in ["admin@legalai.com", "tanma@example.com"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
     try:
-        res = supabase.table("user_activity").select("*").eq("user_id", user_id).execute()
-        
-        return {"activity": res.data[0] if res.data else None}
+        return {"activity": await get_activity_store().get(user_id)}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching activity: {str(e)}")
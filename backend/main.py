@@ -16,12 +16,17 @@ from fastapi.middleware.cors import CORSMiddleware
 # Import routers
 try:
     from app.api.upload import router as upload_router
-    from app.api.documents import router as documents_router
+    from app.api.documents import router as documents_router, register_jobs as register_document_jobs
+    from app.api.rag import router as rag_router
     from app.api.admin import router as admin_router
     from app.api.user_activity import router as activity_router
     from app.api.monitoring import router as monitoring_router
     from app.api.debug import router as debug_router
     from app.api import process
+    from app.api.core.jobs import get_job_queue
+    from app.api.core.events import get_event_bus
+    from app.api.core.firebase_admin import start_cert_refresher
+    from app.api.core.supabase_async import close_async_postgrest
     logger.info("All routers imported successfully")
 except Exception as e:
     logger.error(f"Failed to import routers: {e}")
@@ -34,6 +39,7 @@ try:
     app.include_router(process.router, prefix="/process", tags=["process"])
     app.include_router(upload_router, prefix="/api", tags=["upload"])
     app.include_router(documents_router, prefix="/api/documents", tags=["documents"])
+    app.include_router(rag_router, prefix="/api/documents", tags=["rag"])
     app.include_router(admin_router, prefix="/api/admin", tags=["admin"])
     app.include_router(activity_router, prefix="/api/activity", tags=["activity"])
     app.include_router(monitoring_router, prefix="/api/monitoring", tags=["monitoring"])
@@ -58,6 +64,33 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+@app.on_event("startup")
+async def start_job_queue():
+    # Background processing needs CPU outside requests (Cloud Run: --no-cpu-throttling)
+    queue = get_job_queue()
+    register_document_jobs(queue)
+    await queue.start()
+
+@app.on_event("startup")
+async def start_event_bus():
+    await get_event_bus().start()
+
+@app.on_event("startup")
+def start_firebase_cert_refresh():
+    start_cert_refresher()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await get_job_queue().stop()
+
+@app.on_event("shutdown")
+async def stop_event_bus():
+    await get_event_bus().stop()
+
+@app.on_event("shutdown")
+async def close_supabase_pool():
+    await close_async_postgrest()
+
 @app.get("/")
 def read_root():
     return {"message": "Hello, Legal AI is running", "status": "healthy"}
@@ -0,0 +1,64 @@
+"""TieredCache hits, expiry and the disk tier surviving a fresh instance."""
+import pytest
+
+from app.api.core import cache as cache_module
+from app.api.core.cache import TieredCache
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_entries_expire_after_ttl(on_disk, tmp_path, clock):
+    cache = TieredCache("test", str(tmp_path / "cache.sqlite3") if on_disk else None, ttl_seconds=10)
+    cache.set("key", {"answer": 42})
+
+    clock.now += 5
+    assert cache.get("key") == {"answer": 42}
+
+    clock.now += 6
+    assert cache.get("key") is None
+    stats = cache.stats()
+    assert stats["expired"] == 1 and stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_expired_disk_entry_is_not_reloaded(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache("test", path, ttl_seconds=10).set("key", "value")
+
+    # A new instance has an empty memory tier, so these reads go to SQLite
+    assert TieredCache("test", path, ttl_seconds=10).get("key") == "value"
+    clock.now += 11
+    cache = TieredCache("test", path, ttl_seconds=10)
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] == 1
+    clock.now -= 11
+    assert TieredCache("test", path, ttl_seconds=10).get("key") is None, "expired rows are deleted"
+
+
+def test_without_ttl_entries_do_not_expire(tmp_path, clock):
+    cache = TieredCache("test", str(tmp_path / "cache.sqlite3"))
+    cache.set("key", [1, 2, 3])
+    clock.now += 10 * 365 * 24 * 3600
+    assert cache.get("key") == [1, 2, 3]
+
+
+def test_delete_removes_both_tiers(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TieredCache("test", path)
+    cache.set("key", "value")
+    cache.delete("key")
+    assert cache.get("key") is None
+    assert TieredCache("test", path).get("key") is None
@@ -0,0 +1,147 @@
+"""JobQueue stage execution: resuming after a retry, backoff, and permanent failures."""
+import time
+import asyncio
+
+import pytest
+
+from app.api.core.jobs import FAILED, QUEUED, SUCCEEDED, JobQueue, JobStore, PermanentJobError
+
+
+@pytest.fixture(autouse=True)
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOB_SPOOL_DIR", str(tmp_path / "spool"))
+
+
+def make_queue(tmp_path, **settings) -> JobQueue:
+    return JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), **settings)
+
+
+def run_once(queue: JobQueue, job_id: str) -> dict:
+    """Run a job's remaining stages the way a worker would after claiming it"""
+    asyncio.run(queue._run(queue.store.get(job_id)))
+    return queue.store.get(job_id)
+
+
+def test_stages_run_in_order_and_share_context(tmp_path):
+    queue = make_queue(tmp_path)
+
+    async def first(job, context):
+        return {"text": job["payload"]["value"].upper()}
+
+    async def second(job, context):
+        return {"length": len(context["text"])}
+
+    queue.register("kind", [("first", first), ("second", second)])
+    job = asyncio.run(queue.enqueue("kind", {"value": "abc"}))
+    done = run_once(queue, job["id"])
+    assert done["status"] == SUCCEEDED
+    assert done["context"] == {"text": "ABC", "length": 3}
+
+
+def test_enqueue_rejects_unknown_kind(tmp_path):
+    queue = make_queue(tmp_path)
+    with pytest.raises(ValueError):
+        asyncio.run(queue.enqueue("missing", {}))
+
+
+def test_failed_stage_is_retried_with_backoff_and_resumes_there(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=3, base_backoff_seconds=5)
+    calls = {"first": 0, "second": 0}
+
+    async def first(job, context):
+        calls["first"] += 1
+        return {"step": 1}
+
+    async def second(job, context):
+        calls["second"] += 1
+        if calls["second"] == 1:
+            raise RuntimeError("flaky")
+        return {"step": 2}
+
+    queue.register("kind", [("first", first), ("second", second)])
+    job = asyncio.run(queue.enqueue("kind", {}))
+
+    before = time.time()
+    retried = run_once(queue, job["id"])
+    assert retried["status"] == QUEUED
+    assert retried["attempts"] == 1 and retried["stage_index"] == 1
+    assert retried["last_error"] == "RuntimeError: flaky"
+    assert retried["next_run_at"] >= before + 5
+    assert retried["context"] == {"step": 1}, "progress from completed stages is kept"
+
+    done = run_once(queue, job["id"])
+    assert done["status"] == SUCCEEDED
+    assert calls == {"first": 1, "second": 2}, "the retry resumes at the failed stage"
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2, base_backoff_seconds=0)
+    failures = []
+
+    async def stage(job, context):
+        raise RuntimeError("down")
+
+    async def on_failure(job, error):
+        failures.append(error)
+
+    queue.register("kind", [("stage", stage)], on_failure)
+    job = asyncio.run(queue.enqueue("kind", {}))
+    assert run_once(queue, job["id"])["status"] == QUEUED
+    failed = run_once(queue, job["id"])
+    assert failed["status"] == FAILED and failed["attempts"] == 2
+    assert failures == ["RuntimeError: down"]
+
+
+def test_permanent_error_fails_without_retrying(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=5)
+    failures = []
+    calls = 0
+
+    async def stage(job, context):
+        nonlocal calls
+        calls += 1
+        raise PermanentJobError("Document not found")
+
+    async def on_failure(job, error):
+        failures.append(error)
+
+    queue.register("kind", [("stage", stage)], on_failure)
+    job = asyncio.run(queue.enqueue("kind", {}))
+    failed = run_once(queue, job["id"])
+    assert failed["status"] == FAILED and failed["attempts"] == 1
+    assert failed["last_error"] == "Document not found"
+    assert calls == 1 and failures == ["Document not found"]
+
+
+def test_workers_pick_up_queued_jobs(tmp_path):
+    queue = make_queue(tmp_path, workers=1, poll_seconds=0.05)
+    done = None
+
+    async def stage(job, context):
+        return {"ran": True}
+
+    queue.register("kind", [("stage", stage)])
+
+    async def main():
+        nonlocal done
+        await queue.start()
+        try:
+            job = await queue.enqueue("kind", {})
+            for _ in range(100):
+                done = queue.store.get(job["id"])
+                if done["status"] == SUCCEEDED:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+
+    asyncio.run(main())
+    assert done["status"] == SUCCEEDED and done["context"] == {"ran": True}
+
+
+def test_interrupted_jobs_are_requeued_on_start(tmp_path):
+    queue = make_queue(tmp_path)
+    job = queue.store.create("kind", {})
+    assert queue.store.claim_due()["id"] == job["id"]
+    assert queue.store.requeue_interrupted() == 1
+    assert queue.store.get(job["id"])["status"] == QUEUED
@@ -0,0 +1,136 @@
+"""ModelRouter circuit breaker: failover, opening after repeated failures, half-open probes."""
+import pytest
+
+from app.api.core import model_router
+from app.api.core.model_router import CLOSED, HALF_OPEN, OPEN, ModelRouter
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_router.time, "monotonic", clock)
+    return clock
+
+
+class NotFound(Exception):
+    pass
+
+
+def make_router(**settings) -> ModelRouter:
+    return ModelRouter(["us", "eu"], ["model"], lambda location, model: location, **settings)
+
+
+def states(router: ModelRouter) -> dict:
+    return {pair["location"]: pair["state"] for pair in router.stats()["pairs"]}
+
+
+def failing_on(*locations):
+    def call(handle):
+        if handle in locations:
+            raise RuntimeError(f"{handle} unavailable")
+        return f"answer from {handle}"
+    return call
+
+
+def test_fails_over_and_prefers_the_pair_that_worked(clock):
+    router = make_router(failure_threshold=3)
+    assert router.call(failing_on("us")) == "answer from eu"
+    assert router.stats()["preferred"] == {"location": "eu", "model": "model"}
+
+    tried = []
+    router.call(lambda handle: tried.append(handle) or "ok")
+    assert tried == ["eu"], "the last pair that succeeded goes first"
+
+
+def test_breaker_opens_after_threshold_and_skips_the_pair(clock):
+    router = make_router(failure_threshold=2, cooldown_seconds=60)
+    router.call(failing_on("us"))
+    assert states(router)["us"] == CLOSED
+    router._preferred = None
+    router.call(failing_on("us"))
+    assert states(router)["us"] == OPEN
+
+    tried = []
+    router._preferred = None
+    router.call(lambda handle: tried.append(handle) or "ok")
+    assert tried == ["eu"], "an open pair is skipped during its cooldown"
+
+
+def test_permanent_error_opens_immediately(clock):
+    router = make_router(failure_threshold=5)
+
+    def call(handle):
+        if handle == "us":
+            raise NotFound("model retired")
+        return "ok"
+
+    router.call(call)
+    assert states(router)["us"] == OPEN
+
+
+def test_half_open_probe_closes_on_success(clock):
+    router = make_router(failure_threshold=1, cooldown_seconds=60)
+    router.call(failing_on("us"))
+    assert states(router)["us"] == OPEN
+
+    clock.now += 61
+    router._preferred = None
+    seen = []
+
+    def probe(handle):
+        seen.append((handle, states(router)[handle]))
+        return "ok"
+
+    router.call(probe)
+    assert seen == [("us", HALF_OPEN)], "after the cooldown one probe is let through"
+    assert states(router)["us"] == CLOSED
+
+
+def test_half_open_probe_failure_reopens(clock):
+    router = make_router(failure_threshold=3, cooldown_seconds=60)
+    for _ in range(3):
+        router._preferred = None
+        router.call(failing_on("us"))
+    assert states(router)["us"] == OPEN
+
+    clock.now += 61
+    router._preferred = None
+    router.call(failing_on("us"))
+    assert states(router)["us"] == OPEN, "one failed probe is enough to reopen"
+
+    clock.now += 30
+    tried = []
+    router._preferred = None
+    router.call(lambda handle: tried.append(handle) or "ok")
+    assert tried == ["eu"], "the cooldown restarts from the failed probe"
+
+
+def test_half_open_admits_a_single_probe(clock):
+    router = make_router(failure_threshold=1, cooldown_seconds=60)
+    router.call(failing_on("us"))
+    clock.now += 61
+
+    pair = ("us", "model")
+    assert router._acquire(pair) is True
+    assert router._acquire(pair) is False, "a second caller must not probe concurrently"
+
+
+def test_raises_last_error_when_every_pair_fails(clock):
+    router = make_router(failure_threshold=3)
+    with pytest.raises(RuntimeError, match="eu unavailable"):
+        router.call(failing_on("us", "eu"))
+
+
+def test_empty_result_moves_on_without_counting_a_failure(clock):
+    router = make_router(failure_threshold=1)
+    assert router.call(lambda handle: "" if handle == "us" else "ok") == "ok"
+    assert states(router)["us"] == CLOSED
+    assert router.stats()["pairs"][0]["failures"] == 0
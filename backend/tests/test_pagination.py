@@ -0,0 +1,49 @@
+"""Keyset cursors: round-trips, and rejection of anything that is not (timestamp, uuid)."""
+import json
+import uuid
+import base64
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+
+from app.api.core.pagination import (
+    after_created_at, created_at_cursor, decode_created_at_cursor, decode_cursor, encode_cursor,
+)
+
+ROW = {"created_at": "2024-05-01T12:30:00.123456+00:00", "id": str(uuid.uuid4())}
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(["a", 2]), 2) == ["a", "2"]
+    assert decode_created_at_cursor(created_at_cursor(ROW)) == (ROW["created_at"], ROW["id"])
+
+
+def test_created_at_filter_uses_the_cursor_values():
+    expression = after_created_at(created_at_cursor(ROW))
+    assert f'created_at.lt."{ROW["created_at"]}"' in expression
+    assert f'id.lt."{ROW["id"]}"' in expression
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode("ascii"),
+    raw_cursor({"created_at": ROW["created_at"]}),
+    raw_cursor([ROW["created_at"]]),
+    raw_cursor([ROW["created_at"], ROW["id"], "extra"]),
+    raw_cursor(["yesterday", ROW["id"]]),
+    raw_cursor([ROW["created_at"], "not-a-uuid"]),
+    # Values that would break out of the quoted PostgREST or= expression
+    raw_cursor([ROW["created_at"] + '",id.gt."0', ROW["id"]]),
+    raw_cursor([ROW["created_at"], ROW["id"] + '"),or(id.gt."0']),
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_created_at_cursor(cursor)
+    assert raised.value.status_code == 400
@@ -0,0 +1,110 @@
+"""SingleFlight collapses concurrent runs per key and shares their outcome."""
+import asyncio
+
+import pytest
+
+from app.api.core.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    async def main():
+        flights = SingleFlight()
+        runs = 0
+        release = asyncio.Event()
+
+        async def work():
+            nonlocal runs
+            runs += 1
+            await release.wait()
+            return "result"
+
+        callers = [asyncio.create_task(flights.do("doc", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flights.running("doc") is not None
+        release.set()
+        assert await asyncio.gather(*callers) == ["result"] * 5
+        assert runs == 1
+        assert flights.running("doc") is None, "the key is released once the run finishes"
+
+        # A later call starts a fresh run
+        assert await flights.do("doc", work) == "result"
+        assert runs == 2
+
+    asyncio.run(main())
+
+
+def test_different_keys_run_independently():
+    async def main():
+        flights = SingleFlight()
+        started = []
+
+        async def work(key):
+            started.append(key)
+            await asyncio.sleep(0)
+            return key
+
+        results = await asyncio.gather(flights.do("a", lambda: work("a")), flights.do("b", lambda: work("b")))
+        assert results == ["a", "b"] and sorted(started) == ["a", "b"]
+
+    asyncio.run(main())
+
+
+def test_exception_reaches_every_caller():
+    async def main():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            raise ValueError("boom")
+
+        callers = [asyncio.create_task(flights.do("doc", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flights.running("doc") is None
+
+    asyncio.run(main())
+
+
+def test_cancelling_a_caller_does_not_cancel_the_run():
+    async def main():
+        flights = SingleFlight()
+        release = asyncio.Event()
+        finished = []
+
+        async def work():
+            await release.wait()
+            finished.append(True)
+            return "result"
+
+        first = asyncio.create_task(flights.do("doc", work))
+        second = asyncio.create_task(flights.do("doc", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        release.set()
+        assert await second == "result"
+        assert finished == [True]
+
+    asyncio.run(main())
+
+
+def test_start_runs_without_a_waiting_caller():
+    async def main():
+        flights = SingleFlight()
+        done = asyncio.Event()
+
+        async def work():
+            done.set()
+            return "result"
+
+        flight = flights.start("doc", work)
+        assert flights.start("doc", work) is flight, "a second start joins the run in flight"
+        await asyncio.wait_for(done.wait(), timeout=1)
+        assert await flight == "result"
+
+    asyncio.run(main())
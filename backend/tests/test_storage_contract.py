@@ -0,0 +1,179 @@
+"""Behaviour every DocumentStore / BlobStore / ActivityStore implementation must share.
+
+    cd backend && python -m pytest tests
+
+The local implementations run against a temporary directory. The Supabase ones
+run only when SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are set; rows and
+blobs are created under a throwaway user id / path prefix and removed again,
+so it is safe to point at a real project.
+"""
+import os
+import uuid
+import asyncio
+
+import pytest
+
+from app.api.core.storage_backends import LocalBlobStore, SQLiteActivityStore, SQLiteDocumentStore
+
+SUPABASE_CONFIGURED = bool(os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+
+BACKENDS = [
+    "local",
+    pytest.param("supabase", marks=pytest.mark.skipif(
+        not SUPABASE_CONFIGURED, reason="SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY not set",
+    )),
+]
+
+
+class Stores:
+    def __init__(self, documents, blobs, activity, close, forget_activity):
+        self.documents = documents
+        self.blobs = blobs
+        self.activity = activity
+        self.close = close
+        # ActivityStore has no delete; cleanup goes through the backend directly
+        self.forget_activity = forget_activity
+
+
+def open_stores(backend: str, root: str) -> Stores:
+    """Must be called inside the event loop the stores will be used on"""
+    if backend == "local":
+        database = os.path.join(root, "documents.sqlite3")
+
+        async def nothing(*args):
+            pass
+
+        return Stores(
+            SQLiteDocumentStore(database), LocalBlobStore(os.path.join(root, "blobs")),
+            SQLiteActivityStore(database), nothing, nothing,
+        )
+
+    from app.api.core.storage_backends import SupabaseBlobStore
+    from app.api.core.supabase_async import AsyncPostgrest, DocumentsRepository, UserActivityRepository
+
+    # A client of our own: the process-wide one is bound to whichever loop first used it
+    db = AsyncPostgrest(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
+
+    async def forget_activity(user_id: str):
+        await db.delete(UserActivityRepository.table, [("user_id", f"eq.{user_id}")])
+
+    return Stores(
+        DocumentsRepository(db), SupabaseBlobStore(os.getenv("SUPABASE_BUCKET", "uploads")),
+        UserActivityRepository(db), db.aclose, forget_activity,
+    )
+
+
+def run(backend: str, root, check) -> None:
+    async def main():
+        stores = open_stores(backend, str(root))
+        try:
+            await check(stores)
+        finally:
+            await stores.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_document_store(backend, tmp_path):
+    async def check(stores: Stores):
+        store = stores.documents
+        user_id = f"contract-{uuid.uuid4()}"
+        created = []
+        try:
+            for i, (status, risk) in enumerate([("uploaded", "Low"), ("processed", "High"), ("processed", "Low")]):
+                row = await store.insert({
+                    "user_id": user_id,
+                    "file_name": f"doc-{i}.pdf",
+                    "bucket_path": f"user-files/doc-{i}.pdf",
+                    "content_type": "application/pdf",
+                    "size_bytes": 100 + i,
+                    "status": status,
+                    "document_metadata": {"riskLevel": risk, "documentType": "Contract"},
+                })
+                assert row["id"] and row["created_at"], "insert must assign id and created_at"
+                created.append(row)
+                # Distinct created_at values keep the expected order unambiguous
+                await asyncio.sleep(0.01)
+
+            first = created[0]
+            assert (await store.get(first["id"]))["file_name"] == "doc-0.pdf"
+            assert await store.get(str(uuid.uuid4())) is None
+            assert set(await store.get(first["id"], "id,status")) == {"id", "status"}, "columns must project"
+            assert (await store.find_by_file_name(user_id, "doc-1.pdf"))["id"] == created[1]["id"]
+            assert await store.find_by_file_name(user_id, "missing.pdf") is None
+
+            newest_first = [r["id"] for r in reversed(created)]
+            listed = await store.list_for_user(user_id, "id")
+            assert [r["id"] for r in listed] == newest_first
+            page = await store.list_for_user(user_id, "id,created_at", limit=2)
+            rest = await store.list_for_user(user_id, "id", after=(page[-1]["created_at"], page[-1]["id"]))
+            assert [r["id"] for r in page + rest] == newest_first, "keyset pages must not overlap or skip"
+            assert len(await store.list_for_user(user_id, "id", status="processed")) == 2
+            high = await store.list_for_user(user_id, "id", metadata={"riskLevel": "High"})
+            assert [r["id"] for r in high] == [created[1]["id"]], "metadata filter is containment"
+
+            by_users = await store.list_for_users([user_id, f"contract-{uuid.uuid4()}"], "id,user_id")
+            assert [r["id"] for r in by_users] == newest_first
+            assert await store.list_for_users([], "id") == []
+
+            page = await store.list_all("id,created_at", 2, user_id=user_id)
+            rest = await store.list_all("id", 10, user_id=user_id, after=(page[-1]["created_at"], page[-1]["id"]))
+            assert [r["id"] for r in page + rest] == newest_first, "keyset pages must not overlap or skip"
+            processed = await store.list_all("id", 10, status="processed", user_id=user_id)
+            assert [r["id"] for r in processed] == newest_first[:2]
+
+            updated = await store.update(first["id"], {"status": "processed", "summary": "ok"})
+            assert updated and updated[0]["status"] == "processed"
+            assert (await store.get(first["id"]))["summary"] == "ok"
+            assert await store.update(str(uuid.uuid4()), {"status": "processed"}) == []
+
+            await store.delete(first["id"])
+            assert await store.get(first["id"]) is None
+        finally:
+            for row in created:
+                await store.delete(row["id"])
+
+    run(backend, tmp_path, check)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_blob_store(backend, tmp_path):
+    async def check(stores: Stores):
+        blobs = stores.blobs
+        path = f"contract/{uuid.uuid4()}.bin"
+        data = bytes(range(256)) * 64
+        try:
+            await blobs.upload(path, data, "application/octet-stream")
+            assert await blobs.download(path) == data, "download must return the uploaded bytes"
+            assert await blobs.signed_url(path, 60)
+            await blobs.delete(path)
+            with pytest.raises(FileNotFoundError):
+                await blobs.download(path)
+        finally:
+            await blobs.delete(path)
+
+    run(backend, tmp_path, check)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_activity_store(backend, tmp_path):
+    async def check(stores: Stores):
+        activity = stores.activity
+        user_id = f"contract-{uuid.uuid4()}"
+        try:
+            assert await activity.get(user_id) is None
+            assert await activity.update(user_id, {"login_count": 2}) == []
+            await activity.insert({
+                "user_id": user_id, "email": "contract@example.com",
+                "last_login": "2024-01-01T00:00:00", "login_count": 1,
+            })
+            updated = await activity.update(user_id, {"last_login": "2024-01-02T00:00:00", "login_count": 2})
+            assert updated and updated[0]["login_count"] == 2
+            row = await activity.get(user_id)
+            assert row["email"] == "contract@example.com" and row["login_count"] == 2
+            assert row["last_login"].startswith("2024-01-02")
+        finally:
+            await stores.forget_activity(user_id)
+
+    run(backend, tmp_path, check)
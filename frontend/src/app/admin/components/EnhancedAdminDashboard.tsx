@@ -127,18 +127,28 @@ export default function EnhancedAdminDashboard() {
   const fetchUsers = useCallback(async () => {
     try {
       const token = await user?.getIdToken();
-      const response = await fetch(`${API_BASE}/admin/users`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      });
-
-      if (!response.ok) {
-        throw new Error(`Users API error: ${response.status}`);
-      }
+      // Render the first page right away, then append the rest
+      let cursor: string | null = null;
+      let first = true;
+      do {
+        const params = new URLSearchParams({ limit: "100" });
+        if (cursor) params.set("cursor", cursor);
+        const response: Response = await fetch(`${API_BASE}/admin/users?${params}`, {
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+        });
+
+        if (!response.ok) {
+          throw new Error(`Users API error: ${response.status}`);
+        }
 
-      const data = await response.json();
-      setUsers(data.users || []);
+        const data = await response.json();
+        const page: User[] = data.users || [];
+        setUsers(prev => (first ? page : [...prev, ...page]));
+        first = false;
+        cursor = data.next_cursor || null;
+      } while (cursor);
     } catch (err) {
       console.error("Error fetching users:", err);
       setError("Failed to fetch users");
@@ -159,7 +169,12 @@ export default function EnhancedAdminDashboard() {
       }
 
       const data = await response.json();
-      setDocuments(data.documents || []);
+      setDocuments(
+        (data.documents || []).map((doc: Document & { file_name?: string }) => ({
+          ...doc,
+          name: doc.name ?? doc.file_name,
+        }))
+      );
     } catch (err) {
       console.error("Error fetching documents:", err);
       setError("Failed to fetch documents");
@@ -127,7 +127,7 @@ export default function ChatArea({
     );
 
     // Processing message
-    if (isProcessing || selectedDocument.status === 'processing') {
+    if (isProcessing || ['processing', 'ocr_done', 'analyzing'].includes(selectedDocument.status)) {
       messages.push(
         <MessageBubble
           key="processing"
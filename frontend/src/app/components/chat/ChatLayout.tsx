@@ -3,6 +3,7 @@
 import React, { useState, useEffect } from "react";
 import { auth } from "@/lib/firebase";
 import { API_URLS, buildApiUrl } from "@/lib/config";
+import { waitForDocumentStatus } from "@/lib/documentEvents";
 // import { getAuth } from "firebase/auth";
 import Sidebar from "./Sidebar";
 import ChatArea from "./ChatArea";
@@ -45,24 +46,51 @@ export default function ChatLayout({ user }: ChatLayoutProps) {
   const [isProcessing, setIsProcessing] = useState(false);
   const [loading, setLoading] = useState(true);
 
-  // Fetch user's documents
+  // Fetch user's documents (list fields only), page by page; the first page renders immediately
   const fetchDocuments = async () => {
     try {
       const token = await auth.currentUser?.getIdToken();
-  const response = await fetch(API_URLS.DOCUMENTS, {
+      let cursor: string | null = null;
+      let first = true;
+      do {
+        const response: Response = await fetch(API_URLS.DOCUMENTS_PAGE(cursor), {
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+        });
+        if (!response.ok) break;
+
+        const data = await response.json();
+        const page: Document[] = data.documents || [];
+        setDocuments(prev => (first ? page : [...prev, ...page]));
+        if (first) {
+          setLoading(false);
+          first = false;
+        }
+        cursor = data.next_cursor || null;
+      } while (cursor);
+    } catch (error) {
+      console.error("Error fetching documents:", error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  // The list carries no text; load the full document when it is opened
+  const loadDocumentDetails = async (documentId: string) => {
+    try {
+      const token = await auth.currentUser?.getIdToken();
+      const response = await fetch(API_URLS.GET_DOCUMENT(documentId), {
         headers: {
           Authorization: `Bearer ${token}`,
         },
       });
-
       if (response.ok) {
-        const data = await response.json();
-        setDocuments(data.documents || []);
+        const { document } = await response.json();
+        setDocuments(prev => prev.map(doc => doc.id === documentId ? { ...doc, ...document } : doc));
       }
     } catch (error) {
-      console.error("Error fetching documents:", error);
-    } finally {
-      setLoading(false);
+      console.error("Error fetching document details:", error);
     }
   };
 
@@ -72,22 +100,23 @@ export default function ChatLayout({ user }: ChatLayoutProps) {
     try {
       const token = await auth.currentUser?.getIdToken();
       
-      // Check if document already exists first
-      const existingResponse = await fetch(API_URLS.DOCUMENTS, {
+      // Check if document already exists first (looked up by name, not by scanning a page)
+      const existingResponse = await fetch(API_URLS.DOCUMENT_BY_NAME(file.name), {
         headers: { Authorization: `Bearer ${token}` },
       });
       
       if (existingResponse.ok) {
         const data = await existingResponse.json();
-        const found = data.documents?.find((d: Document) => d.file_name === file.name);
+        const found: Document | undefined = data.documents?.[0];
         if (found) {
           if (found.status === "processed") {
             setSelectedDocumentId(found.id);
+            await loadDocumentDetails(found.id);
             setIsProcessing(false);
             return;
           } else if (found.status === "uploaded") {
-            // Start processing existing document
-            const processResponse = await fetch(API_URLS.PROCESS_DOCUMENT(found.id), {
+            // Queue processing of the existing document; the job endpoint returns at once
+            const processResponse = await fetch(API_URLS.ENQUEUE_PROCESSING(found.id), {
               method: "POST",
               headers: {
                 "Content-Type": "application/json",
@@ -146,8 +175,9 @@ export default function ChatLayout({ user }: ChatLayoutProps) {
       // New document uploaded successfully - start processing
       console.log(`Starting processing for new document: ${document.file_name}`);
       
-      // Start processing the uploaded document
-      const processResponse = await fetch(API_URLS.PROCESS_DOCUMENT(document.id), {
+      // Queue processing rather than awaiting the blocking /process call, so the
+      // status stream below reports every stage as it happens
+      const processResponse = await fetch(API_URLS.ENQUEUE_PROCESSING(document.id), {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -169,8 +199,18 @@ export default function ChatLayout({ user }: ChatLayoutProps) {
     }
   };
 
-  // Poll for processing completion
+  // Wait for processing completion: pushed status events, polling as fallback
   const pollForCompletion = async (documentId: string) => {
+    try {
+      await waitForDocumentStatus(documentId, (status) =>
+        setDocuments(prev =>
+          prev.map(doc => doc.id === documentId ? { ...doc, status } : doc)
+        )
+      );
+    } catch (error) {
+      console.warn("Status stream unavailable, falling back to polling:", error);
+    }
+
     let attempts = 0;
     const maxAttempts = 60; // 2 minutes with 2-second intervals
 
@@ -216,6 +256,10 @@ export default function ChatLayout({ user }: ChatLayoutProps) {
   // Handle document selection
   const handleDocumentSelect = (documentId: string) => {
     setSelectedDocumentId(documentId);
+    const doc = documents.find(d => d.id === documentId);
+    if (doc && doc.extracted_text === undefined) {
+      loadDocumentDetails(documentId);
+    }
   };
 
   // Handle new chat
@@ -62,6 +62,8 @@ export default function Sidebar({
       case 'processed':
         return 'bg-green-100 text-green-700 dark:bg-green-900/30 dark:text-green-400';
       case 'processing':
+      case 'ocr_done':
+      case 'analyzing':
         return 'bg-yellow-100 text-yellow-700 dark:bg-yellow-900/30 dark:text-yellow-400';
       case 'failed':
         return 'bg-red-100 text-red-700 dark:bg-red-900/30 dark:text-red-400';
@@ -178,6 +180,7 @@ export default function Sidebar({
                         <span className={`text-xs px-1.5 py-0.5 rounded-full font-medium ${getStatusColor(doc.status)}`}>
                           {doc.status === 'processed' ? 'Ready' : 
                            doc.status === 'processing' ? 'Processing' :
+                           doc.status === 'ocr_done' || doc.status === 'analyzing' ? 'Analyzing' :
                            doc.status === 'failed' ? 'Failed' : 'Uploaded'}
                         </span>
                         <span className="text-xs text-gray-400">•</span>
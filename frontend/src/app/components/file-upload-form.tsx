@@ -3,6 +3,7 @@ import React, { useState } from "react";
 import { auth } from "@/lib/firebase";
 import type { Dispatch, SetStateAction } from "react";
 import { API_URLS } from "@/lib/config";
+import { waitForDocumentStatus } from "@/lib/documentEvents";
 import UploadCard from "./UploadCard";
 import { Loader2 } from "lucide-react";
 import ReactMarkdown from "react-markdown";
@@ -40,10 +41,10 @@ export default function FileUploadForm({ onSummary }: FileUploadFormProps) {
     setDocId(dbId);
     console.log("Using document ID:", dbId);
 
-    // 2. Start processing the document
+    // 2. Queue processing; the job endpoint returns at once and progress arrives on the status stream
     try {
       const token = await auth.currentUser?.getIdToken();
-  const processRes = await fetch(API_URLS.PROCESS_DOCUMENT(dbId), {
+  const processRes = await fetch(API_URLS.ENQUEUE_PROCESSING(dbId), {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -62,7 +63,12 @@ export default function FileUploadForm({ onSummary }: FileUploadFormProps) {
       return;
     }
 
-    // 3. Poll for status
+    // 3. Wait for a pushed terminal status, then fetch the results once (polling if the stream fails)
+    try {
+      await waitForDocumentStatus(dbId, () => setStatus("Processing..."));
+    } catch (error) {
+      console.warn("Status stream unavailable, falling back to polling:", error);
+    }
     const poll = async () => {
       let done = false;
       let tries = 0;
@@ -26,8 +26,17 @@ export const buildApiUrl = (endpoint: string): string => {
 export const API_URLS = {
   TRACK_LOGIN: buildApiUrl('/api/activity/track-login'),
   DOCUMENTS: buildApiUrl('/api/documents/'),
+  DOCUMENTS_PAGE: (cursor: string | null) =>
+    buildApiUrl(`/api/documents/${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`),
+  DOCUMENT_BY_NAME: (fileName: string) =>
+    buildApiUrl(`/api/documents/?file_name=${encodeURIComponent(fileName)}`),
   PROCESS_DOCUMENT: (docId: string) => buildApiUrl(`/api/documents/${docId}/process`),
+  PROCESS_DOCUMENT_STREAM: (docId: string) => buildApiUrl(`/api/documents/${docId}/process/stream`),
   GET_DOCUMENT: (docId: string) => buildApiUrl(`/api/documents/${docId}`),
+  DOCUMENT_EVENTS_TICKET: buildApiUrl('/api/documents/events/ticket'),
+  DOCUMENT_EVENTS: (ticket: string) => buildApiUrl(`/api/documents/events?ticket=${encodeURIComponent(ticket)}`),
+  ENQUEUE_PROCESSING: (docId: string) => buildApiUrl(`/api/documents/${docId}/jobs`),
+  JOB_STATUS: (jobId: string) => buildApiUrl(`/api/documents/jobs/${jobId}`),
   ADMIN_TEST: buildApiUrl('/api/admin/test'),
   ADMIN_USERS: buildApiUrl('/api/admin/users'),
 } as const
\ No newline at end of file
@@ -0,0 +1,61 @@
+import { auth } from "@/lib/firebase";
+import { API_URLS } from "@/lib/config";
+
+const TERMINAL_STATUSES = ["processed", "failed"];
+
+interface StatusEvent {
+  document_id: string;
+  status: string;
+}
+
+/**
+ * Wait for a document to reach a terminal status using the server-pushed
+ * event stream instead of polling. Resolves with "processed" or "failed".
+ * Rejects if the stream cannot be opened or drops, so callers can fall back
+ * to polling GET_DOCUMENT.
+ */
+export const waitForDocumentStatus = async (
+  documentId: string,
+  onStatus?: (status: string) => void,
+  timeoutMs = 10 * 60 * 1000
+): Promise<string> => {
+  const token = await auth.currentUser?.getIdToken();
+  if (!token || typeof EventSource === "undefined") {
+    throw new Error("Document event stream unavailable");
+  }
+
+  // EventSource cannot send headers; trade the ID token for a short-lived, single-use ticket
+  const response = await fetch(API_URLS.DOCUMENT_EVENTS_TICKET, {
+    method: "POST",
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!response.ok) {
+    throw new Error("Document event stream unavailable");
+  }
+  const { ticket } = await response.json();
+
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(API_URLS.DOCUMENT_EVENTS(ticket));
+    const timer = setTimeout(() => finish(new Error("Timed out waiting for document status")), timeoutMs);
+
+    const finish = (error: Error | null, status?: string) => {
+      clearTimeout(timer);
+      source.close();
+      if (error) reject(error);
+      else resolve(status as string);
+    };
+
+    const handle = (event: StatusEvent) => {
+      if (event.document_id !== documentId) return;
+      onStatus?.(event.status);
+      if (TERMINAL_STATUSES.includes(event.status)) finish(null, event.status);
+    };
+
+    source.addEventListener("snapshot", (e) => {
+      const { documents } = JSON.parse((e as MessageEvent).data);
+      (documents as StatusEvent[]).forEach(handle);
+    });
+    source.addEventListener("status", (e) => handle(JSON.parse((e as MessageEvent).data)));
+    source.onerror = () => finish(new Error("Document event stream closed"));
+  });
+};